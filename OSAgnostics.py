@@ -5,18 +5,51 @@ if os.name == "posix":
 
     RENAME: str = "mv"
     Q: str = "'"
-    EXIFTOOL = "/usr/bin/exiftool"
+    EXIFTOOL = os.environ.get('EXIFTOOL', "/usr/bin/exiftool")
 else:
     from nt import DirEntry
 
     RENAME: str = "move"
     Q: str = '"'
-    EXIFTOOL = "exiftool.exe"
+    EXIFTOOL = os.environ.get('EXIFTOOL', "exiftool.exe")
 
 PATH_SEP: str = os.path.sep
 EXIFTOOL_OPTS = ["-json", "-g1"]
-OMDB_URL: str = "http://www.omdbapi.com/"
+EXIFTOOL_DAEMON_OPTS = ["-json", "-g1", "-Composite:ImageSize", "-charset", "filename=utf8"]
+EXIFTOOL_BATCH_SIZE: int = 64
+PROBE_MAX_READ_BYTES: int = 512 * 1024
+OMDB_URL: str = os.environ.get('OMDB_URL', "http://www.omdbapi.com/")
 OMDB_APIKEY: str = os.environ.get('OMDB_APIKEY')
+OMDB_CONCURRENCY: int = int(os.environ.get('OMDB_CONCURRENCY', 8))
+OMDB_RATE: float = float(os.environ.get('OMDB_RATE', 10))
+OMDB_BURST: int = int(os.environ.get('OMDB_BURST', 10))
+OMDB_TIMEOUT: float = float(os.environ.get('OMDB_TIMEOUT', 10))
+OMDB_RETRIES: int = int(os.environ.get('OMDB_RETRIES', 3))
+
+CACHE_DIR: str = os.environ.get('FIX_MOVIES_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'fix_movies'))
+OMDB_CACHE: str = os.path.join(CACHE_DIR, 'omdb.sqlite3')
+OMDB_CACHE_TTL: int = int(os.environ.get('OMDB_CACHE_TTL', 30 * 24 * 3600))
+OMDB_CACHE_NEGATIVE_TTL: int = int(os.environ.get('OMDB_CACHE_NEGATIVE_TTL', 24 * 3600))
+OMDB_CACHE_MAX_ENTRIES: int = int(os.environ.get('OMDB_CACHE_MAX_ENTRIES', 200000))
+PROBE_CACHE: str = os.path.join(CACHE_DIR, 'probe.sqlite3')
+SCAN_MANIFEST: str = os.path.join(CACHE_DIR, 'manifest.sqlite3')
+CATALOG: str = os.path.join(CACHE_DIR, 'catalog.sqlite3')
+CONTENT_HASHES: str = os.path.join(CACHE_DIR, 'hashes.sqlite3')
+HASH_WORKERS: int = int(os.environ.get('HASH_WORKERS', 8))
+REPORT_DIR: str = os.path.join(CACHE_DIR, 'reports')
+RENAME_JOURNAL: str = os.environ.get('RENAME_JOURNAL', os.path.join(CACHE_DIR, 'renames.journal'))
+IMDB_INDEX: str = os.environ.get('IMDB_INDEX', os.path.join(CACHE_DIR, 'imdb.idx'))
+# a fuzzy title match is applied to a folder without [imdbid-tt...] only at or above this score,
+# and only when it beats the runner-up by the margin
+RESOLVE_THRESHOLD: float = float(os.environ.get('RESOLVE_THRESHOLD', 0.9))
+RESOLVE_MARGIN: float = float(os.environ.get('RESOLVE_MARGIN', 0.05))
+# --target moves across filesystems: concurrent file streams per device, and `sample` or `full` byte verification
+RELOCATE_STREAMS: int = int(os.environ.get('RELOCATE_STREAMS', 2))
+RELOCATE_VERIFY: str = os.environ.get('RELOCATE_VERIFY', 'sample')
+# --watch: a title is fixed once nothing under it has changed for this many seconds
+WATCH_SETTLE: float = float(os.environ.get('WATCH_SETTLE', 10))
+# --leases: a lease not refreshed for this many seconds belonged to a host that died, and is taken over
+LEASE_TTL: float = float(os.environ.get('LEASE_TTL', 300))
 
 RESOLUTIONS = [360, 480, 720, 1080, 2160]
 
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+
+AUTO: str = 'auto'
+TUNE_INTERVAL: float = 2.0
+# a step that loses less than this fraction of throughput is still taken as progress
+TOLERANCE: float = 0.05
+
+
+class AdaptiveLimit:
+    """A concurrency gate whose limit can be changed while workers are waiting on it."""
+
+    def __init__(self, limit: int, minimum: int = 1, maximum: int = None) -> None:
+        self.minimum: int = minimum
+        self.maximum: int = maximum or limit
+        self.limit: int = max(minimum, min(limit, self.maximum))
+        self.active: int = 0
+        self._cond: threading.Condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def resize(self, limit: int) -> int:
+        with self._cond:
+            self.limit = max(self.minimum, min(limit, self.maximum))
+            self._cond.notify_all()
+        return self.limit
+
+
+@dataclass
+class StageStats:
+    completed: int = 0
+    busy_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.completed += 1
+            self.busy_seconds += seconds
+
+
+@dataclass
+class _Watch:
+    name: str
+    limit: AdaptiveLimit
+    stats: StageStats
+    inbox: queue.Queue
+    completed: int = 0
+    busy_seconds: float = 0.0
+    throughput: float = None
+    direction: int = 1
+
+
+class Tuner:
+    """Hill-climbs the worker count of each watched stage towards maximum throughput.
+
+    Every interval it compares a stage's throughput with the previous interval:
+    while there is a backlog and throughput holds up it keeps stepping in the same
+    direction, otherwise it turns around; a stage with idle workers and nothing
+    queued is shrunk.
+    """
+
+    def __init__(self, interval: float = TUNE_INTERVAL) -> None:
+        self._interval: float = interval
+        self._watches: list[_Watch] = []
+        self._stop: threading.Event = threading.Event()
+        self._thread: threading.Thread = None
+
+    def watch(self, name: str, limit: AdaptiveLimit, stats: StageStats, inbox: queue.Queue) -> None:
+        self._watches.append(_Watch(name, limit, stats, inbox))
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            for watch in self._watches:
+                self._step(watch)
+
+    def _step(self, watch: _Watch) -> None:
+        completed: int = watch.stats.completed
+        busy_seconds: float = watch.stats.busy_seconds
+        done: int = completed - watch.completed
+        throughput: float = done / self._interval
+        latency: float = (busy_seconds - watch.busy_seconds) / done if done else 0.0
+        watch.completed, watch.busy_seconds = completed, busy_seconds
+        backlog: int = watch.inbox.qsize()
+        old: int = watch.limit.limit
+        step: int = max(1, old // 4)
+        if backlog == 0 and watch.limit.active < old:
+            new: int = old - 1
+        else:
+            if watch.throughput is not None and throughput < watch.throughput * (1 - TOLERANCE):
+                watch.direction = -watch.direction
+            new = old + watch.direction * step
+        watch.throughput = throughput
+        new = watch.limit.resize(new)
+        if new != old:
+            print(f'=== autotune {watch.name}: {old} -> {new} workers '
+                  f'(throughput {throughput:.1f}/s, latency {latency * 1000:.0f}ms, backlog {backlog})')
+
+
+def parse_workers(value: str) -> str | int:
+    """argparse type for --workers auto|N."""
+    if value == AUTO:
+        return AUTO
+    workers: int = int(value)
+    if workers < 1:
+        raise ValueError(f'workers must be positive: {value}')
+
+    return workers
+
+
+def default_ceiling(kind: str) -> int:
+    cpus: int = os.cpu_count() or 1
+    return cpus * 2 if kind == 'process' else 32
+
+
+def sizing(workers: str | int, kind: str, initial: int, max_workers: int = None) -> dict:
+    """Stage keyword arguments for --workers auto|N: N fixes the size, auto tunes from `initial` up to a ceiling."""
+    if workers == AUTO:
+        ceiling: int = max_workers or default_ceiling(kind)
+        return {'workers': ceiling, 'initial': min(initial, ceiling), 'autotune': True}
+
+    return {'workers': workers, 'autotune': False}
@@ -0,0 +1,163 @@
+"""Episodes parsed per second by Series._decompose, before and after the single-pass walker.
+
+    python benchmarks/bench_classifier.py --episodes 50000 [--dir DIR] [--rounds 3]
+
+Builds a synthetic tree of empty files (mixed compliant and scene-style names,
+season folders and stray non-media files) and times the previous implementation,
+kept below as legacy_decompose, against the current Series(path).
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from series import Series, Episode  # noqa: E402
+from OSAgnostics import PATH_SEP  # noqa: E402
+
+EPISODES_PER_SEASON: int = 24
+SEASONS_PER_SHOW: int = 4
+
+
+def build_tree(root: str, episodes: int) -> int:
+    shows: int = max(1, episodes // (EPISODES_PER_SEASON * SEASONS_PER_SHOW))
+    created: int = 0
+    for show in range(shows):
+        title: str = f'Show {show}'
+        show_dir: str = os.path.join(root, f'{title} [imdbid-tt{1000000 + show}]')
+        os.makedirs(show_dir)
+        for season in range(1, SEASONS_PER_SHOW + 1):
+            season_dir: str = os.path.join(show_dir, f'Season {season:02d}' if season % 2 else f'season {season}')
+            os.makedirs(season_dir)
+            for episode in range(1, EPISODES_PER_SEASON + 1):
+                name: str = (
+                    f'{title} S{season:02d}E{episode:02d}.mkv',
+                    f'show.{show}.s{season:02d}e{episode:02d}.720p.x264.mkv',
+                    f'e{episode:02d}.part1.mp4',
+                    f'{title}.S{season:02d}E{episode:02d}-E{episode + 1:02d}.avi',
+                )[episode % 4]
+                open(os.path.join(season_dir, name), 'w').close()
+                created += 1
+            open(os.path.join(season_dir, 'subs.srt'), 'w').close()
+        open(os.path.join(show_dir, 'tvshow.nfo'), 'w').close()
+
+    return created
+
+
+def legacy_decompose(path: str) -> dict[str, Episode]:
+    episodes: dict[str, Episode] = {}
+    f_entries = [
+        i for i in os.scandir(path)
+        if i.is_file() and re.match(r'^.*\.(mkv|mp4|avi|ts|wmv)$', i.name, flags=re.IGNORECASE)
+    ]
+    for f_entry in f_entries:
+        episode: Episode = Episode()
+        match = Series.EPISODE_COMPLIANT.fullmatch(f_entry.name)
+        if match:
+            groups = match.groups()
+            episode.title = groups[0]
+            episode.season_id = int(groups[1])
+            episode.episode_from_id = int(groups[2])
+            episode.episode_to_id = int(groups[4]) if groups[3] else None
+            episode.part_no = int(groups[6]) if groups[5] else None
+            episode.extension = groups[7]
+        else:
+            match = re.search(r'S(\d+)E(\d+)(-E(\d+))?', f_entry.name, flags=re.IGNORECASE)
+            if match:
+                groups = match.groups()
+                episode.season_id = int(groups[0])
+                episode.episode_from_id = int(groups[1])
+                episode.episode_to_id = int(groups[3]) if groups[2] else None
+            episode.extension = f_entry.name.split(sep='.')[-1]
+            match = re.search(r'(part|cd|disc)[ \-_]*(\d+)', f_entry.name, flags=re.IGNORECASE)
+            if match:
+                episode.part_no = int(match.groups()[1])
+        episodes[f_entry.name] = episode
+    d_entries = [
+        i for i in os.scandir(path)
+        if i.is_dir() and re.match(r'^Season \d+$', i.name, flags=re.IGNORECASE)
+    ]
+    for d_entry in d_entries:
+        this_season_id: int = int(re.match(r'^Season (\d+)$', d_entry.name, flags=re.IGNORECASE).groups()[0])
+        f_entries = [
+            i for i in os.scandir(d_entry.path)
+            if i.is_file() and re.match(r'^.*\.(mkv|mp4|avi|ts|wmv)$', i.name, flags=re.IGNORECASE)
+        ]
+        for f_entry in f_entries:
+            episode: Episode = Episode()
+            match = Series.EPISODE_COMPLIANT.fullmatch(f_entry.name)
+            if match:
+                groups = match.groups()
+                episode.title = groups[0]
+                episode.season_id = int(groups[1])
+                episode.episode_from_id = int(groups[2])
+                episode.episode_to_id = int(groups[4]) if groups[3] else None
+                episode.part_no = int(groups[6]) if groups[5] else None
+                episode.extension = groups[7]
+            else:
+                match = re.search(r'(S(\d+))?E(\d+)(-E(\d+))?', f_entry.name, flags=re.IGNORECASE)
+                if match:
+                    groups = match.groups()
+                    episode.season_id = int(groups[1]) if groups[0] else this_season_id
+                    episode.episode_from_id = int(groups[2])
+                    episode.episode_to_id = int(groups[4]) if groups[3] else None
+                episode.extension = f_entry.name.split(sep='.')[-1]
+                match = re.search(r'(part|cd|disc)[ \-_]*(\d+)', f_entry.name, flags=re.IGNORECASE)
+                if match:
+                    episode.part_no = int(match.groups()[1])
+            episodes[f'{d_entry.name}{PATH_SEP}{f_entry.name}'] = episode
+
+    return episodes
+
+
+def current_decompose(path: str) -> dict[str, Episode]:
+    return Series(path)._episodes
+
+
+def measure(decompose, show_dirs: list[str], rounds: int) -> tuple[float, dict[str, Episode]]:
+    best: float = None
+    parsed: dict[str, Episode] = {}
+    for _ in range(rounds):
+        started: float = time.perf_counter()
+        parsed = {}
+        for show_dir in show_dirs:
+            for name, episode in decompose(show_dir).items():
+                parsed[f'{show_dir}{PATH_SEP}{name}'] = episode
+        elapsed: float = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return (best, parsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, default=50000)
+    parser.add_argument("--dir", dest="dir", default=None, help="reuse or create the tree here")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    root: str = args.dir or tempfile.mkdtemp(prefix='bench_classifier_')
+    try:
+        if not os.listdir(root):
+            print(f'building {args.episodes} episodes under {root}')
+            build_tree(root, args.episodes)
+        show_dirs: list[str] = [i.path for i in os.scandir(root) if i.is_dir()]
+        (legacy, legacy_parsed) = measure(legacy_decompose, show_dirs, args.rounds)
+        (current, current_parsed) = measure(current_decompose, show_dirs, args.rounds)
+        assert legacy_parsed == current_parsed, 'current parser disagrees with the legacy one'
+        files: int = len(current_parsed)
+        print(f'files parsed: {files}')
+        print(f'legacy : {files / legacy:12.0f} files/s ({legacy:.3f}s)')
+        print(f'current: {files / current:12.0f} files/s ({current:.3f}s)')
+        print(f'speedup: {legacy / current:.2f}x')
+    finally:
+        if not args.dir:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""A local stand-in for the OMDb API with configurable latency and failures.
+
+    python benchmarks/fake_omdb.py [--port 0] [--latency-ms 50] [--jitter-ms 10] [--error-rate 0.0]
+
+Answers `?i=tt...` with the record synth_library.omdb_title() builds, over
+HTTP/1.1 keep-alive like the real service. With --port 0 it picks a free port
+and prints `listening on PORT` as its first line.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synth_library import omdb_title  # noqa: E402
+
+
+class OmdbHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency: float = 0.05
+    jitter: float = 0.01
+    error_rate: float = 0.0
+
+    def do_GET(self):
+        query: dict = parse_qs(urlsplit(self.path).query)
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            (code, body) = (503, b'{"Response":"False","Error":"Service unavailable"}')
+        elif 'i' not in query:
+            (code, body) = (200, b'{"Response":"False","Error":"Incorrect IMDb ID."}')
+        else:
+            (code, body) = (200, json.dumps(omdb_title(query['i'][0])).encode())
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", dest="latency_ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", dest="jitter_ms", type=float, default=10)
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0)
+    args = parser.parse_args()
+    OmdbHandler.latency = args.latency_ms / 1000
+    OmdbHandler.jitter = min(args.jitter_ms, args.latency_ms) / 1000
+    OmdbHandler.error_rate = args.error_rate
+    server: ThreadingHTTPServer = ThreadingHTTPServer(('127.0.0.1', args.port), OmdbHandler)
+    server.daemon_threads = True
+    print(f'listening on {server.server_address[1]}', flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
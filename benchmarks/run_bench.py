@@ -0,0 +1,158 @@
+"""End-to-end benchmark of fix_movies / fix_series against a synthetic library.
+
+    python benchmarks/run_bench.py [--movies 2000] [--series 100] [--messiness 0.5]
+        [--latency-ms 50] [--workers auto] [--modes dryrun,real] [--output bench.json]
+
+For every tool and mode it generates a fresh library with synth_library (same
+seed, so runs are comparable), starts fake_omdb.py, points EXIFTOOL at
+stub_exiftool.py and the caches at an empty directory, runs the tool with
+--stats-json and collects throughput, p50/p99 per-directory latency and peak
+RSS. The combined JSON (with the git commit) goes to --output and stdout, so
+two commits can be compared by diffing their files.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+
+HERE: str = os.path.dirname(os.path.abspath(__file__))
+REPO: str = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from synth_library import generate  # noqa: E402
+
+TOOLS: dict[str, tuple[str, str]] = {
+    'movies': ('fix_movies.py', 'movies'),
+    'series': ('fix_series.py', 'series'),
+}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_omdb(latency_ms: float, jitter_ms: float, error_rate: float) -> tuple[subprocess.Popen, int]:
+    proc: subprocess.Popen = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'fake_omdb.py'), '--latency-ms', str(latency_ms),
+         '--jitter-ms', str(jitter_ms), '--error-rate', str(error_rate)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    port: int = int(proc.stdout.readline().split()[-1])
+
+    return (proc, port)
+
+
+def run_tool(script: str, basedir: str, dryrun: bool, workers: str, env: dict, log: str) -> dict:
+    """Runs one tool to completion; returns its --stats-json plus wall time and the child's peak RSS."""
+    stats_path: str = f'{log}.stats.json'
+    args: list[str] = [sys.executable, os.path.join(REPO, script), '--basedir', basedir,
+                       '--workers', workers, '--stats-json', stats_path]
+    if dryrun:
+        args.append('--dryrun')
+    started: float = time.perf_counter()
+    with open(log, 'w') as out:
+        proc: subprocess.Popen = subprocess.Popen(args, cwd=REPO, env=env, stdout=out, stderr=subprocess.STDOUT)
+        if os.name == "posix":
+            (_, status, usage) = os.wait4(proc.pid, 0)
+            returncode: int = os.waitstatus_to_exitcode(status)
+            peak_rss_kb: int = usage.ru_maxrss
+        else:
+            returncode = proc.wait()
+            peak_rss_kb = None
+    wall: float = time.perf_counter() - started
+    result: dict = {'returncode': returncode, 'wall_seconds': round(wall, 6), 'child_peak_rss_kb': peak_rss_kb}
+    if os.path.exists(stats_path):
+        with open(stats_path, encoding='utf-8') as f:
+            result.update(json.load(f))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=2000)
+    parser.add_argument("--series", type=int, default=100)
+    parser.add_argument("--seasons", type=int, default=4)
+    parser.add_argument("--episodes", type=int, default=12)
+    parser.add_argument("--messiness", type=float, default=0.5)
+    parser.add_argument("--size-mb", dest="size_mb", type=int, default=700)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", dest="latency_ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", dest="jitter_ms", type=float, default=10)
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0)
+    parser.add_argument("--omdb-rate", dest="omdb_rate", type=float, default=1000,
+                        help="client-side OMDb rate limit; the real service needs a much lower one")
+    parser.add_argument("--workers", default='auto')
+    parser.add_argument("--tools", default='movies,series')
+    parser.add_argument("--modes", default='dryrun,real')
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--keep", action="store_true", help="keep the generated libraries and logs")
+    args = parser.parse_args()
+
+    workdir: str = tempfile.mkdtemp(prefix='fix_movies_bench_')
+    stub: str = os.path.join(HERE, 'stub_exiftool.py')
+    os.chmod(stub, 0o755)
+    (omdb, port) = start_omdb(args.latency_ms, args.jitter_ms, args.error_rate)
+    report: dict = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': vars(args),
+        'runs': [],
+    }
+    try:
+        for tool in args.tools.split(','):
+            (script, subdir) = TOOLS[tool]
+            for mode in args.modes.split(','):
+                run_dir: str = os.path.join(workdir, f'{tool}-{mode}')
+                library: dict = generate(
+                    run_dir,
+                    movies=args.movies if tool == 'movies' else 0,
+                    series=args.series if tool == 'series' else 0,
+                    seasons=args.seasons, episodes=args.episodes, messiness=args.messiness,
+                    size=args.size_mb * 1024 * 1024, seed=args.seed,
+                )
+                env: dict = dict(
+                    os.environ,
+                    OMDB_URL=f'http://127.0.0.1:{port}/',
+                    OMDB_APIKEY='bench',
+                    OMDB_RATE=str(args.omdb_rate),
+                    OMDB_BURST=str(max(1, int(args.omdb_rate))),
+                    EXIFTOOL=stub,
+                    FIX_MOVIES_CACHE=os.path.join(run_dir, 'cache'),
+                )
+                result: dict = run_tool(script, os.path.join(run_dir, subdir), mode == 'dryrun',
+                                        args.workers, env, os.path.join(run_dir, 'run.log'))
+                report['runs'].append({'tool': tool, 'mode': mode, 'library': library, **result})
+                print(f"=== {tool}/{mode}: {result.get('throughput')} dirs/s, p50={result.get('latency_p50')}, "
+                      f"p99={result.get('latency_p99')}, rss={result['child_peak_rss_kb']}KiB, "
+                      f"rc={result['returncode']}", file=sys.stderr)
+                if not args.keep:
+                    shutil.rmtree(run_dir)
+    finally:
+        omdb.terminate()
+        omdb.wait()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f'=== kept {workdir}', file=sys.stderr)
+
+    text: str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
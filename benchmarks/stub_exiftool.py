@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Answers the exiftool invocations fix_movies makes, without exiftool installed.
+
+Point EXIFTOOL at this file (it must be executable). Supports the one-shot
+`exiftool -json -g1 FILE...` form and the `-stay_open True -@ - -common_args ...`
+daemon form. The frame size is taken from a `480p`/`720p`/`1080p`/`2160p` tag in
+the file name, defaulting to 1080p.
+"""
+import re
+import sys
+import json
+
+HEIGHT: re.Pattern = re.compile(r'(480|720|1080|2160)p', flags=re.IGNORECASE)
+
+
+def describe(path: str) -> dict:
+    match: re.Match = HEIGHT.search(path)
+    height: int = int(match.groups()[0]) if match else 1080
+
+    return {'SourceFile': path, 'Composite': {'ImageSize': f'{height * 16 // 9}x{height}'}}
+
+
+def stay_open() -> None:
+    batch: list[str] = []
+    for line in sys.stdin:
+        line = line.rstrip('\n')
+        if line.startswith('-execute'):
+            sys.stdout.write(json.dumps([describe(i) for i in batch if not i.startswith('-')]) + '\n')
+            sys.stdout.write(f'{{ready{line[len("-execute"):]}}}\n')
+            sys.stdout.flush()
+            batch = []
+        elif batch == ['-stay_open'] and line == 'False':
+            return
+        else:
+            batch.append(line)
+
+
+def main():
+    args: list[str] = sys.argv[1:]
+    if '-stay_open' in args:
+        stay_open()
+        return
+    print(json.dumps([describe(i) for i in args if not i.startswith('-')]))
+
+
+if __name__ == "__main__":
+    main()
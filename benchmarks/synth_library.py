@@ -0,0 +1,183 @@
+"""Synthetic movie and series libraries for benchmarking.
+
+    python benchmarks/synth_library.py --root DIR [--movies 1000] [--series 50]
+        [--seasons 4] [--episodes 12] [--messiness 0.5] [--size-mb 700] [--seed 0]
+
+Media are sparse files: a minimal but real Matroska or MP4 header carrying the
+frame size, then a hole up to the requested size, so container_probe reads them
+like the real thing without filling the disk. `messiness` is the share of titles
+given scene-style names (no year, dots, wrong case, parts, stray files, a few
+headerless .wmv that need exiftool, some folders without an imdbid); the rest
+are already compliant. Titles and years come from omdb_title(), which the fake
+OMDb server uses too, so compliant names stay compliant after a lookup.
+"""
+import os
+import random
+import struct
+import argparse
+
+MOVIE_ID_BASE: int = 1000000
+SERIES_ID_BASE: int = 9000000
+HEIGHTS: list[int] = [480, 720, 1080, 2160]
+
+
+def omdb_title(imdbid: str) -> dict:
+    """The OMDb record the fake server returns for imdbid; series ids have a year range."""
+    number: int = int(imdbid[2:])
+    if number >= SERIES_ID_BASE:
+        first: int = 1960 + number % 60
+        return {'Title': f'Show {number - SERIES_ID_BASE}', 'Year': f'{first}–{first + 1 + number % 9}',
+                'imdbID': imdbid, 'Type': 'series', 'Response': 'True'}
+
+    return {'Title': f'Movie {number - MOVIE_ID_BASE}', 'Year': str(1940 + number % 80),
+            'imdbID': imdbid, 'Type': 'movie', 'Response': 'True'}
+
+
+def _vint(size: int) -> bytes:
+    for length in range(1, 9):
+        if size < (1 << (7 * length)) - 1:
+            return (size | (1 << (7 * length))).to_bytes(length, 'big')
+    raise ValueError(size)
+
+
+def _element(element_id: int, data: bytes) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + _vint(len(data)) + data
+
+
+def _uint(element_id: int, value: int, size: int = 2) -> bytes:
+    return _element(element_id, value.to_bytes(size, 'big'))
+
+
+def mkv_header(width: int, height: int) -> bytes:
+    ebml: bytes = _element(0x1A45DFA3, _element(0x4282, b'matroska'))
+    video: bytes = _element(0xAE, _uint(0xD7, 1, 1) + _uint(0x83, 1, 1)
+                            + _element(0xE0, _uint(0xB0, width) + _uint(0xBA, height)))
+    audio: bytes = _element(0xAE, _uint(0xD7, 2, 1) + _uint(0x83, 2, 1))
+    segment: bytes = _element(0x18538067, _element(0xEC, b'\0' * 64) + _element(0x1654AE6B, audio + video))
+
+    return ebml + segment
+
+
+def _box(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(data), kind) + data
+
+
+def mp4_header(width: int, height: int) -> bytes:
+    tkhd: bytes = _box(b'tkhd', b'\0' * 80 + struct.pack('>II', width << 16, height << 16))
+    hdlr: bytes = _box(b'hdlr', b'\0' * 8 + b'vide' + b'\0' * 12)
+    entry: bytes = struct.pack('>I4s', 86, b'avc1') + b'\0' * 24 + struct.pack('>HH', width, height) + b'\0' * 50
+    stsd: bytes = _box(b'stsd', b'\0' * 4 + struct.pack('>I', 1) + entry)
+    trak: bytes = _box(b'trak', tkhd + _box(b'mdia', hdlr + _box(b'minf', _box(b'stbl', stsd))))
+
+    return _box(b'ftyp', b'isom\0\0\0\0') + _box(b'moov', trak)
+
+
+HEADERS: dict = {'mkv': mkv_header, 'mp4': mp4_header}
+
+
+def write_medium(path: str, height: int, size: int) -> None:
+    """A sparse file of `size` bytes; mkv/mp4 start with a header of the given height, others are empty."""
+    header_for = HEADERS.get(path.rpartition('.')[2])
+    with open(path, 'wb') as f:
+        if header_for:
+            f.write(header_for(height * 16 // 9, height))
+        f.truncate(max(size, f.tell()))
+
+
+def _resolution(height: int) -> str:
+    return f'{height}p'
+
+
+def make_movie(root: str, index: int, messy: bool, rng: random.Random, size: int) -> int:
+    imdbid: str = f'tt{MOVIE_ID_BASE + index}'
+    record: dict = omdb_title(imdbid)
+    (title, year) = (record['Title'], record['Year'])
+    height: int = rng.choice(HEIGHTS)
+    if not messy:
+        folder: str = os.path.join(root, f'{title} ({year}) [imdbid-{imdbid}]')
+        os.makedirs(folder)
+        write_medium(os.path.join(folder, f'{title} ({year}) - [{_resolution(height)}].mkv'), height, size)
+        return 1
+
+    scene: str = title.lower().replace(' ', '.')
+    tag: str = f' [imdbid-{imdbid}]' if rng.random() > 0.05 else ''
+    folder = os.path.join(root, f'{scene}.{year}.{_resolution(height)}.BluRay{tag}')
+    os.makedirs(folder)
+    parts: int = 2 if rng.random() < 0.1 else 1
+    extension: str = rng.choices(['mkv', 'mp4', 'wmv'], weights=[6, 3, 1])[0]
+    for part in range(1, parts + 1):
+        suffix: str = f'.cd{part}' if parts > 1 else ''
+        write_medium(os.path.join(folder, f'{scene}.{year}.x264{suffix}.{extension}'), height, size // parts)
+    if rng.random() < 0.3:
+        open(os.path.join(folder, f'{scene}.srt'), 'w').close()
+
+    return parts
+
+
+def make_series(root: str, index: int, messy: bool, rng: random.Random, seasons: int, episodes: int, size: int) -> int:
+    imdbid: str = f'tt{SERIES_ID_BASE + index}'
+    record: dict = omdb_title(imdbid)
+    title: str = record['Title']
+    year: str = record['Year'].replace('–', '-')
+    height: int = rng.choice(HEIGHTS)
+    if messy:
+        tag: str = f' [imdbid-{imdbid}]' if rng.random() > 0.05 else ''
+        folder: str = os.path.join(root, f'{title.lower().replace(" ", ".")}.complete{tag}')
+    else:
+        folder = os.path.join(root, f'{title} ({year}) [imdbid-{imdbid}]')
+    os.makedirs(folder)
+    created: int = 0
+    for season in range(1, seasons + 1):
+        season_dir: str = os.path.join(folder, f'season {season}' if messy else f'Season {season:02d}')
+        os.makedirs(season_dir)
+        for episode in range(1, episodes + 1):
+            if messy:
+                name: str = rng.choice([
+                    f'{title.lower().replace(" ", ".")}.s{season:02d}e{episode:02d}.720p.mkv',
+                    f'e{episode:02d}.mp4',
+                ])
+            else:
+                name = f'{title} S{season:02d}E{episode:02d}.mkv'
+            write_medium(os.path.join(season_dir, name), height, size)
+            created += 1
+
+    return created
+
+
+def generate(root: str, movies: int = 0, series: int = 0, seasons: int = 4, episodes: int = 12,
+             messiness: float = 0.5, size: int = 700 * 1024 * 1024, seed: int = 0) -> dict:
+    """Populate root/movies and root/series; returns what was created."""
+    rng: random.Random = random.Random(seed)
+    summary: dict = {'movies': movies, 'series': series, 'movie_media': 0, 'episodes': 0, 'messiness': messiness}
+    if movies:
+        movie_root: str = os.path.join(root, 'movies')
+        os.makedirs(movie_root, exist_ok=True)
+        for index in range(movies):
+            summary['movie_media'] += make_movie(movie_root, index, rng.random() < messiness, rng, size)
+    if series:
+        series_root: str = os.path.join(root, 'series')
+        os.makedirs(series_root, exist_ok=True)
+        for index in range(series):
+            summary['episodes'] += make_series(series_root, index, rng.random() < messiness, rng,
+                                               seasons, episodes, size)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", required=True, dest="root")
+    parser.add_argument("--movies", type=int, default=1000)
+    parser.add_argument("--series", type=int, default=50)
+    parser.add_argument("--seasons", type=int, default=4)
+    parser.add_argument("--episodes", type=int, default=12)
+    parser.add_argument("--messiness", type=float, default=0.5)
+    parser.add_argument("--size-mb", dest="size_mb", type=int, default=700)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.root, args.movies, args.series, args.seasons, args.episodes,
+                   args.messiness, args.size_mb * 1024 * 1024, args.seed))
+
+
+if __name__ == "__main__":
+    main()
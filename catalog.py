@@ -0,0 +1,245 @@
+"""Library-wide catalog: every title, medium and episode seen by a scan, in one indexed SQLite database.
+
+    python catalog.py --duplicates   # imdbids held by more than one folder
+    python catalog.py --overlaps     # episodes of one series and season in more than one file
+    python catalog.py --missing      # gaps in the episode numbers of a season
+    python catalog.py --prune        # forget titles whose folders are gone
+    python content_hash.py           # byte-identical media, whatever their names
+
+Each Movie or Series only sees its own folder; the catalog sees them all, so
+conflicts come out of one indexed query instead of comparing titles pairwise.
+The scan indexes each title as it is parsed and again under its new name once
+renamed. The rename stage leaves a title alone when another folder that still
+exists holds the same imdbid, instead of letting the two collide.
+
+Which twin would be renamed must not depend on which one the pipeline reaches
+first: as the walk finds them, the first folder whose name carries an imdbid
+claims it (NameClaims), and later folders of the scan named with it are held
+back. Twins known only once parsed (an imdbid found by the title resolver) are
+caught by the catalog as soon as the other is indexed.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from itertools import groupby
+from typing import Iterable, Iterator
+from OSAgnostics import CATALOG, PATH_SEP
+from classifier import find_imdbid
+from movie import Movie
+from series import Series
+
+MOVIE: str = 'movie'
+SERIES: str = 'series'
+
+
+def _size(path: str) -> int | None:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+class Catalog:
+    def __init__(self, path: str = CATALOG) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS titles ('
+            ' path TEXT PRIMARY KEY,'
+            ' kind TEXT NOT NULL,'
+            ' imdbid TEXT,'
+            ' media INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' indexed_at REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS titles_imdbid ON titles (kind, imdbid)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS media ('
+            ' title TEXT NOT NULL,'
+            ' name TEXT NOT NULL,'
+            ' size INTEGER,'
+            ' resolution TEXT,'
+            ' d3_format TEXT,'
+            ' part INTEGER,'
+            ' season INTEGER,'
+            ' episode_from INTEGER,'
+            ' episode_to INTEGER,'
+            ' PRIMARY KEY (title, name)'
+            ') WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS media_episodes ON media (title, season, episode_from)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS media_size ON media (size)')
+
+    def index(self, kind: str, path: str, imdbid: str, media: list[tuple], old_path: str = None) -> None:
+        """Replaces what is known of the title at path (or old_path, before a rename).
+
+        media rows are (name, size, resolution, d3_format, part, season, episode_from, episode_to).
+        """
+        with self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            for stale in {path, old_path or path}:
+                self._conn.execute('DELETE FROM titles WHERE path = ?', (stale,))
+                self._conn.execute('DELETE FROM media WHERE title = ?', (stale,))
+            self._conn.execute(
+                'INSERT INTO titles (path, kind, imdbid, media, size, indexed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, kind, imdbid, len(media), sum(i[1] or 0 for i in media), time.time())
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO media (title, name, size, resolution, d3_format, part, season, episode_from,'
+                ' episode_to) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(path, *i) for i in media]
+            )
+
+    def index_movie(self, movie: Movie, old_path: str = None) -> None:
+        self.index(MOVIE, movie.path, movie.imdbid, [
+            (name, _size(f'{movie.path}{PATH_SEP}{name}'), i.resolution, i.d3_format, i.part_no, None, None, None)
+            for name, i in movie.media.items()
+        ], old_path)
+
+    def index_series(self, series: Series, old_path: str = None) -> None:
+        self.index(SERIES, series.path, series.imdbid, [
+            (name, _size(f'{series.path}{PATH_SEP}{name}'), None, None, i.part_no, i.season_id, i.episode_from_id,
+             i.episode_to_id)
+            for name, i in series.episodes.items()
+        ], old_path)
+
+    def duplicate_of(self, kind: str, imdbid: str, path: str, besides: Iterable[str] = ()) -> str | None:
+        """Another folder that still exists and holds the same imdbid as path, if any, besides those given."""
+        besides = set(besides)
+        for (other,) in self._conn.execute(
+                'SELECT path FROM titles WHERE kind = ? AND imdbid = ? AND path != ?', (kind, imdbid, path)):
+            if other not in besides and os.path.isdir(other):
+                return other
+        return None
+
+    def duplicates(self) -> Iterator[tuple[str, str, list[str]]]:
+        """(kind, imdbid, folders) for every imdbid held by two or more folders that still exist."""
+        for kind, imdbid, paths in self._conn.execute(
+                'SELECT kind, imdbid, group_concat(path, char(0)) FROM titles WHERE imdbid IS NOT NULL'
+                ' GROUP BY kind, imdbid HAVING count(*) > 1'):
+            existing: list[str] = [i for i in paths.split('\0') if os.path.isdir(i)]
+            if len(existing) > 1:
+                yield (kind, imdbid, sorted(existing))
+
+    def overlaps(self) -> Iterator[tuple[str, int, str, str]]:
+        """(series folder, season, file, other file) for files whose episode ranges overlap.
+
+        The parts of one multi-part episode do not overlap each other.
+        """
+        yield from self._conn.execute(
+            'SELECT a.title, a.season, a.name, b.name FROM media a JOIN media b'
+            ' ON b.title = a.title AND b.season = a.season AND b.name > a.name'
+            ' AND b.episode_from <= coalesce(a.episode_to, a.episode_from)'
+            ' AND a.episode_from <= coalesce(b.episode_to, b.episode_from)'
+            ' WHERE a.season IS NOT NULL AND a.episode_from IS NOT NULL'
+            ' AND NOT (a.part IS NOT NULL AND b.part IS NOT NULL AND a.part != b.part)'
+            ' ORDER BY a.title, a.season'
+        )
+
+    def missing(self) -> Iterator[tuple[str, int, list[int]]]:
+        """(series folder, season, episode numbers) for seasons with gaps before their last episode."""
+        rows: sqlite3.Cursor = self._conn.execute(
+            'SELECT title, season, episode_from, coalesce(episode_to, episode_from) FROM media'
+            ' WHERE season IS NOT NULL AND episode_from IS NOT NULL ORDER BY title, season'
+        )
+        for (title, season), episodes in groupby(rows, key=lambda i: (i[0], i[1])):
+            present: set[int] = set()
+            for _, _, first, last in episodes:
+                present.update(range(first, max(first, last) + 1))
+            gaps: list[int] = [i for i in range(1, max(present) + 1) if i not in present]
+            if gaps:
+                yield (title, season, gaps)
+
+    def same_size(self) -> Iterator[list[str]]:
+        """Paths of the media that share their (non-zero) size with another, one list per size."""
+        for (paths,) in self._conn.execute(
+                'SELECT group_concat(title || ? || name, char(0)) FROM media WHERE size > 0'
+                ' GROUP BY size HAVING count(*) > 1', (PATH_SEP,)):
+            yield paths.split('\0')
+
+    def prune(self) -> int:
+        """Forgets the titles whose folders no longer exist; returns how many."""
+        gone: list[str] = [path for (path,) in self._conn.execute('SELECT path FROM titles')
+                           if not os.path.isdir(path)]
+        with self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            for path in gone:
+                self._conn.execute('DELETE FROM titles WHERE path = ?', (path,))
+                self._conn.execute('DELETE FROM media WHERE title = ?', (path,))
+        return len(gone)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class NameClaims:
+    """The imdbids in the folder names of a scan, each claimed by the first folder found with it."""
+
+    def __init__(self) -> None:
+        self._paths: dict[str, list[str]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def claim(self, entries: Iterable) -> Iterator:
+        """entries, as they are found, claiming the imdbid in each name."""
+        for entry in entries:
+            imdbid: str = find_imdbid(entry.name)
+            if imdbid:
+                with self._lock:
+                    self._paths.setdefault(imdbid, []).append(entry.path)
+            yield entry
+
+    def holder_of(self, imdbid: str, path: str) -> str | None:
+        """The folder found before path that claimed imdbid, if any; path is held back in its favour."""
+        with self._lock:
+            paths: list[str] = self._paths.get(imdbid, [])
+            return paths[0] if paths and paths[0] != path else None
+
+    def named(self, imdbid: str) -> list[str]:
+        """The folders of the scan found so far with imdbid in their names."""
+        with self._lock:
+            return list(self._paths.get(imdbid, []))
+
+
+_local: threading.local = threading.local()
+
+
+def get_catalog(path: str = CATALOG) -> Catalog:
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.catalogs, _local.pid = {}, os.getpid()
+    if path not in _local.catalogs:
+        _local.catalogs[path] = Catalog(path)
+
+    return _local.catalogs[path]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", dest="catalog", default=CATALOG)
+    parser.add_argument("--duplicates", action="store_true", help="imdbids held by more than one folder")
+    parser.add_argument("--overlaps", action="store_true", help="episodes in more than one file")
+    parser.add_argument("--missing", action="store_true", help="gaps in the episode numbers of each season")
+    parser.add_argument("--prune", action="store_true", help="forget titles whose folders are gone")
+    args = parser.parse_args()
+    catalog: Catalog = get_catalog(args.catalog)
+    if args.prune:
+        print(f'=== {catalog.prune()} titles pruned')
+    if args.duplicates:
+        for kind, imdbid, paths in catalog.duplicates():
+            print(f'!!! {kind} {imdbid} in ' + ', '.join(f'<{i}>' for i in paths))
+    if args.overlaps:
+        for title, season, name, other in catalog.overlaps():
+            print(f'!!! <{title}> season {season}: <{name}> and <{other}> hold the same episode')
+    if args.missing:
+        for title, season, gaps in catalog.missing():
+            print(f'??? <{title}> season {season} lacks episodes {", ".join(map(str, gaps))}')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
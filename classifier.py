@@ -0,0 +1,132 @@
+import os
+import re
+import sys
+from OSAgnostics import DirEntry
+from metrics import Metrics, get_metrics
+
+MEDIA_EXTENSIONS: frozenset[str] = frozenset(['mkv', 'mp4', 'avi', 'ts', 'wmv'])
+
+IMDBID: re.Pattern = re.compile(r'\[imdbid-(tt\d+)\]')
+SEASON_DIR: re.Pattern = re.compile(r'^Season (\d+)$', flags=re.IGNORECASE)
+PART_NO: re.Pattern = re.compile(r'(part|cd|disc)[ \-_]*(\d+)', flags=re.IGNORECASE)
+D3_FORMAT: re.Pattern = re.compile(r'(ftab|hsbs|fsbs)', flags=re.IGNORECASE)
+# scene resolution tags: 720p, 1080i, 2160p..., and the names 4K/UHD (2160) and FHD (1080)
+RESOLUTION_TAG: re.Pattern = re.compile(
+    r'(?<![a-z0-9])(?:(\d{3,4})[pi]|(4k|uhd)|(fhd))(?![a-z0-9])', flags=re.IGNORECASE
+)
+YEAR: re.Pattern = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+# release-group noise that ends the title part of a scene name
+RELEASE_NOISE: re.Pattern = re.compile(
+    r'\b(\d{3,4}[pi]|[hx]\.?26[45]|hevc|xvid|divx|bluray|blu-ray|brrip|bdrip|dvdrip|dvdscr|webrip|web-?dl|web|'
+    r'hdtv|hdrip|remux|proper|repack|extended|unrated|remastered|limited|internal|multi|dual|10bit|hdr|'
+    r'ftab|hsbs|fsbs|3d|s\d{1,2}(e\d+)?|season[ ._-]*\d+|complete|(part|cd|disc)[ ._-]*\d+)\b',
+    flags=re.IGNORECASE
+)
+BRACKETED: re.Pattern = re.compile(r'\[[^\]]*\]|\{[^}]*\}')
+SEPARATORS: re.Pattern = re.compile(r'[._\s]+')
+
+# episode tags by location: a file directly in the series folder must name its season,
+# one inside a season folder may leave it out; both share the same group layout
+EPISODE_TAGS: dict[bool, re.Pattern] = {
+    False: re.compile(r'(S(\d+))E(\d+)(-E(\d+))?', flags=re.IGNORECASE),
+    True: re.compile(r'(S(\d+))?E(\d+)(-E(\d+))?', flags=re.IGNORECASE),
+}
+
+
+def extension(name: str) -> str:
+    # interned: a library has a handful of extensions over millions of files
+    return sys.intern(name.rpartition('.')[2])
+
+
+def is_media(name: str) -> bool:
+    return '.' in name and extension(name).lower() in MEDIA_EXTENSIONS
+
+
+def find_imdbid(name: str) -> str | None:
+    match: re.Match = IMDBID.search(name)
+    return match.groups()[0] if match else None
+
+
+def find_part_no(name: str) -> int | None:
+    match: re.Match = PART_NO.search(name)
+    return int(match.groups()[1]) if match else None
+
+
+def find_d3_format(name: str) -> str | None:
+    match: re.Match = D3_FORMAT.search(name)
+    return sys.intern(match.groups()[0].upper()) if match else None
+
+
+def find_resolution(name: str) -> int | None:
+    """Frame height a scene name states (1080p, 4K, UHD...); None if it states none, or several that disagree."""
+    heights: set[int] = {int(match.groups()[0]) if match.groups()[0] else 2160 if match.groups()[1] else 1080
+                         for match in RESOLUTION_TAG.finditer(name)}
+    return heights.pop() if len(heights) == 1 else None
+
+
+def find_title_year(name: str) -> tuple[str, str | None]:
+    """Best-guess (title, year or None) from a messy folder or file name.
+
+    Bracketed tags are dropped and dots/underscores become spaces; the title ends
+    at the last year that isn't its first word, or at the first release tag
+    (resolution, source, codec, season, part...), whichever comes first.
+    """
+    if is_media(name):
+        name = name.rpartition('.')[0]
+    text: str = SEPARATORS.sub(' ', BRACKETED.sub(' ', name)).strip()
+    end: int = len(text)
+    noise: re.Match = RELEASE_NOISE.search(text)
+    if noise and noise.start() > 0:
+        end = noise.start()
+    year: str = None
+    for match in YEAR.finditer(text[:end]):
+        if match.start() > 0:
+            (year, end) = (match.groups()[0], match.start())
+    title: str = text[:end].strip(' -()')
+
+    return (title, year)
+
+
+def find_episode(name: str, season_id: int = None) -> tuple[int, int, int] | None:
+    """(season, first episode, last episode or None) from a non-compliant episode name.
+
+    season_id is the season of the enclosing season folder, if any; it is used
+    when the name carries only an episode number.
+    """
+    match: re.Match = EPISODE_TAGS[season_id is not None].search(name)
+    if not match:
+        return None
+    groups = match.groups()
+
+    return (int(groups[1]) if groups[0] else season_id, int(groups[2]), int(groups[4]) if groups[3] else None)
+
+
+def media_files(path: str) -> list[DirEntry]:
+    metrics: Metrics = get_metrics()
+    metrics.count('dirs_scanned')
+    with metrics.timer('scandir_seconds'), os.scandir(path) as nodes:
+        return [i for i in nodes if is_media(i.name) and i.is_file()]
+
+
+def walk_title(path: str) -> tuple[list[DirEntry], list[tuple[DirEntry, int, list[DirEntry]]]]:
+    """Media directly in path, and (folder, season id, media) for each `Season N` folder.
+
+    One scandir for the title plus one per season folder; the file/dir split uses
+    the type information scandir already returned.
+    """
+    files: list[DirEntry] = []
+    seasons: list[tuple[DirEntry, int, list[DirEntry]]] = []
+    metrics: Metrics = get_metrics()
+    metrics.count('dirs_scanned')
+    with metrics.timer('scandir_seconds'), os.scandir(path) as nodes:
+        for entry in nodes:
+            if is_media(entry.name):
+                if entry.is_file():
+                    files.append(entry)
+                continue
+            match: re.Match = SEASON_DIR.match(entry.name)
+            if match and entry.is_dir():
+                seasons.append((entry, int(match.groups()[0]), None))
+    seasons = [(entry, season_id, media_files(entry.path)) for entry, season_id, _ in seasons]
+
+    return (files, seasons)
@@ -0,0 +1,456 @@
+import os
+import struct
+from OSAgnostics import PROBE_MAX_READ_BYTES
+
+
+class ProbeBudgetExceeded(Exception):
+    pass
+
+
+class BoundedReader:
+    """File reader that refuses to read more than `budget` bytes in total."""
+
+    def __init__(self, path: str, budget: int = PROBE_MAX_READ_BYTES) -> None:
+        self._file = open(path, 'rb')
+        self._budget: int = budget
+        self.size: int = os.fstat(self._file.fileno()).st_size
+
+    def read_at(self, offset: int, length: int) -> bytes:
+        length = max(0, min(length, self.size - offset))
+        if length > self._budget:
+            raise ProbeBudgetExceeded(f'read of {length} bytes at {offset}')
+        self._budget -= length
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'BoundedReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class BitReader:
+
+    def __init__(self, data: bytes) -> None:
+        self._data: bytes = data
+        self._pos: int = 0
+
+    def u(self, bits: int) -> int:
+        value: int = 0
+        for _ in range(bits):
+            byte: int = self._data[self._pos >> 3]
+            value = (value << 1) | ((byte >> (7 - (self._pos & 7))) & 1)
+            self._pos += 1
+        return value
+
+    def skip(self, bits: int) -> None:
+        self._pos += bits
+
+    def ue(self) -> int:
+        zeros: int = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError('invalid exp-golomb code')
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self) -> int:
+        value: int = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+# ----------------------------------------------------------------- Matroska
+
+EBML_MAGIC: int = 0x1A45DFA3
+MKV_SEGMENT: int = 0x18538067
+MKV_SEEKHEAD: int = 0x114D9B74
+MKV_SEEK: int = 0x4DBB
+MKV_SEEKID: int = 0x53AB
+MKV_SEEKPOSITION: int = 0x53AC
+MKV_TRACKS: int = 0x1654AE6B
+MKV_TRACKENTRY: int = 0xAE
+MKV_TRACKTYPE: int = 0x83
+MKV_VIDEO: int = 0xE0
+MKV_PIXELHEIGHT: int = 0xBA
+MKV_CLUSTER: int = 0x1F43B675
+MKV_HEAD_BYTES: int = 128 * 1024
+
+
+def _ebml_vint(data: bytes, pos: int, keep_marker: bool) -> tuple[int, int]:
+    first: int = data[pos]
+    length: int = 1
+    mask: int = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError('invalid EBML vint')
+    value: int = first if keep_marker else first & (mask - 1)
+    for i in range(1, length):
+        value = (value << 8) | data[pos + i]
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = -1
+    return value, pos + length
+
+
+def _ebml_elements(data: bytes, start: int, end: int):
+    pos: int = start
+    while pos < end:
+        element_id, pos = _ebml_vint(data, pos, keep_marker=True)
+        size, pos = _ebml_vint(data, pos, keep_marker=False)
+        yield element_id, pos, size
+        if size < 0:
+            return
+        pos += size
+
+
+def _mkv_tracks_height(data: bytes, start: int, end: int) -> int | None:
+    for element_id, pos, size in _ebml_elements(data, start, min(end, len(data))):
+        if element_id != MKV_TRACKENTRY:
+            continue
+        track_type, height = None, None
+        for child_id, child_pos, child_size in _ebml_elements(data, pos, min(pos + size, len(data))):
+            if child_id == MKV_TRACKTYPE:
+                track_type = int.from_bytes(data[child_pos:child_pos + child_size], 'big')
+            elif child_id == MKV_VIDEO:
+                for video_id, video_pos, video_size in _ebml_elements(data, child_pos, child_pos + child_size):
+                    if video_id == MKV_PIXELHEIGHT:
+                        height = int.from_bytes(data[video_pos:video_pos + video_size], 'big')
+        if track_type == 1 and height:
+            return height
+
+    return None
+
+
+def probe_mkv(reader: BoundedReader) -> int | None:
+    head: bytes = reader.read_at(0, MKV_HEAD_BYTES)
+    if len(head) < 4 or struct.unpack('>I', head[:4])[0] != EBML_MAGIC:
+        return None
+    tracks_position: int = None
+    for element_id, pos, size in _ebml_elements(head, 0, len(head)):
+        if element_id != MKV_SEGMENT:
+            continue
+        segment_start: int = pos
+        segment_end: int = len(head) if size < 0 else min(len(head), pos + size)
+        child_start: int = segment_start
+        for child_id, child_pos, child_size in _ebml_elements(head, segment_start, segment_end):
+            if child_id == MKV_TRACKS:
+                if child_pos + child_size <= len(head):
+                    return _mkv_tracks_height(head, child_pos, child_pos + child_size)
+                tracks_position = child_start - segment_start
+                break
+            if child_id == MKV_CLUSTER:
+                break
+            child_start = child_pos + child_size
+            if child_id == MKV_SEEKHEAD and child_pos + child_size <= len(head):
+                for seek_id, seek_pos, seek_size in _ebml_elements(head, child_pos, child_pos + child_size):
+                    if seek_id != MKV_SEEK:
+                        continue
+                    target, position = None, None
+                    for entry_id, entry_pos, entry_size in _ebml_elements(head, seek_pos, seek_pos + seek_size):
+                        if entry_id == MKV_SEEKID:
+                            target = int.from_bytes(head[entry_pos:entry_pos + entry_size], 'big')
+                        elif entry_id == MKV_SEEKPOSITION:
+                            position = int.from_bytes(head[entry_pos:entry_pos + entry_size], 'big')
+                    if target == MKV_TRACKS and position is not None:
+                        tracks_position = position
+        if tracks_position is not None:
+            data: bytes = reader.read_at(segment_start + tracks_position, MKV_HEAD_BYTES)
+            for child_id, child_pos, child_size in _ebml_elements(data, 0, min(len(data), 16)):
+                if child_id == MKV_TRACKS:
+                    return _mkv_tracks_height(data, child_pos, child_pos + child_size)
+        break
+
+    return None
+
+
+# ---------------------------------------------------------------------- MP4
+
+MP4_CONTAINERS: set[bytes] = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+def _mp4_boxes(reader: BoundedReader, start: int, end: int):
+    pos: int = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', reader.read_at(pos, 8))
+        header: int = 8
+        if size == 1:
+            size = struct.unpack('>Q', reader.read_at(pos + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _mp4_track_height(reader: BoundedReader, start: int, end: int) -> int | None:
+    handler, tkhd_height, stsd_height = None, None, None
+    stack: list[tuple[int, int]] = [(start, end)]
+    while stack:
+        box_start, box_end = stack.pop()
+        for box_type, data_start, data_end in _mp4_boxes(reader, box_start, box_end):
+            if box_type in MP4_CONTAINERS:
+                stack.append((data_start, data_end))
+            elif box_type == b'tkhd':
+                version: int = reader.read_at(data_start, 1)[0]
+                offset: int = data_start + (92 if version == 1 else 80)
+                tkhd_height = struct.unpack('>I', reader.read_at(offset, 4))[0] >> 16
+            elif box_type == b'hdlr':
+                handler = reader.read_at(data_start + 8, 4)
+            elif box_type == b'stsd':
+                # full box header + entry_count, then the first VisualSampleEntry
+                entry: bytes = reader.read_at(data_start + 8, 36)
+                if len(entry) == 36:
+                    stsd_height = struct.unpack('>H', entry[34:36])[0]
+    if handler != b'vide':
+        return None
+
+    return stsd_height or tkhd_height or None
+
+
+def probe_mp4(reader: BoundedReader) -> int | None:
+    for box_type, data_start, data_end in _mp4_boxes(reader, 0, reader.size):
+        if box_type == b'moov':
+            for child_type, child_start, child_end in _mp4_boxes(reader, data_start, data_end):
+                if child_type == b'trak':
+                    height: int = _mp4_track_height(reader, child_start, child_end)
+                    if height:
+                        return height
+            return None
+
+    return None
+
+
+# ---------------------------------------------------------------------- AVI
+
+AVI_HEAD_BYTES: int = 64 * 1024
+
+
+def probe_avi(reader: BoundedReader) -> int | None:
+    head: bytes = reader.read_at(0, AVI_HEAD_BYTES)
+    if head[:4] != b'RIFF' or head[8:12] != b'AVI ':
+        return None
+    avih_height, strh_height = None, None
+    stack: list[tuple[int, int]] = [(12, len(head))]
+    while stack:
+        pos, end = stack.pop()
+        stream_type: bytes = None
+        while pos + 8 <= end:
+            chunk_id, size = struct.unpack('<4sI', head[pos:pos + 8])
+            data: int = pos + 8
+            if chunk_id == b'LIST':
+                if head[data:data + 4] in (b'hdrl', b'strl'):
+                    stack.append((data + 4, min(end, data + size)))
+            elif chunk_id == b'avih' and size >= 40:
+                avih_height = struct.unpack('<I', head[data + 36:data + 40])[0]
+            elif chunk_id == b'strh' and size >= 56:
+                stream_type = head[data:data + 4]
+                if stream_type == b'vids':
+                    (_, top, _, bottom) = struct.unpack('<4h', head[data + 48:data + 56])
+                    strh_height = strh_height or (bottom - top)
+            elif chunk_id == b'strf' and stream_type == b'vids' and size >= 12:
+                strh_height = strh_height or abs(struct.unpack('<i', head[data + 8:data + 12])[0])
+            pos = data + size + (size & 1)
+
+    return avih_height or strh_height or None
+
+
+# ----------------------------------------------------------------------- TS
+
+TS_HEAD_BYTES: int = 384 * 1024
+TS_SYNC: int = 0x47
+
+
+def _nal_unescape(data: bytes) -> bytes:
+    return data.replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def _h264_sps_height(sps: bytes) -> int:
+    bits: BitReader = BitReader(_nal_unescape(sps))
+    profile_idc: int = bits.u(8)
+    bits.skip(16)
+    bits.ue()
+    chroma_format_idc: int = 1
+    if profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        chroma_format_idc = bits.ue()
+        if chroma_format_idc == 3:
+            bits.skip(1)
+        bits.ue()
+        bits.ue()
+        bits.skip(1)
+        if bits.u(1):
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if bits.u(1):
+                    last_scale, next_scale = 8, 8
+                    for _ in range(16 if i < 6 else 64):
+                        if next_scale != 0:
+                            next_scale = (last_scale + bits.se() + 256) % 256
+                        last_scale = next_scale if next_scale != 0 else last_scale
+    bits.ue()
+    pic_order_cnt_type: int = bits.ue()
+    if pic_order_cnt_type == 0:
+        bits.ue()
+    elif pic_order_cnt_type == 1:
+        bits.skip(1)
+        bits.se()
+        bits.se()
+        for _ in range(bits.ue()):
+            bits.se()
+    bits.ue()
+    bits.skip(1)
+    bits.ue()
+    pic_height_in_map_units: int = bits.ue() + 1
+    frame_mbs_only: int = bits.u(1)
+    if not frame_mbs_only:
+        bits.skip(1)
+    bits.skip(1)
+    crop_top, crop_bottom = 0, 0
+    if bits.u(1):
+        bits.ue()
+        bits.ue()
+        crop_top = bits.ue()
+        crop_bottom = bits.ue()
+    crop_unit_y: int = (2 if chroma_format_idc == 1 else 1) * (2 - frame_mbs_only)
+    if chroma_format_idc == 0:
+        crop_unit_y = 2 - frame_mbs_only
+
+    return (2 - frame_mbs_only) * pic_height_in_map_units * 16 - crop_unit_y * (crop_top + crop_bottom)
+
+
+def _hevc_sps_height(sps: bytes) -> int:
+    bits: BitReader = BitReader(_nal_unescape(sps))
+    bits.skip(4)
+    max_sub_layers_minus1: int = bits.u(3)
+    bits.skip(1)
+    bits.skip(96)
+    sub_layer_flags: list[tuple[int, int]] = [(bits.u(1), bits.u(1)) for _ in range(max_sub_layers_minus1)]
+    if max_sub_layers_minus1 > 0:
+        bits.skip(2 * (8 - max_sub_layers_minus1))
+    for profile_present, level_present in sub_layer_flags:
+        bits.skip((88 if profile_present else 0) + (8 if level_present else 0))
+    bits.ue()
+    chroma_format_idc: int = bits.ue()
+    if chroma_format_idc == 3:
+        bits.skip(1)
+    bits.ue()
+    height: int = bits.ue()
+    if bits.u(1):
+        bits.ue()
+        bits.ue()
+        height -= (2 if chroma_format_idc == 1 else 1) * (bits.ue() + bits.ue())
+
+    return height
+
+
+def _elementary_height(stream_type: int, data: bytes) -> int | None:
+    pos: int = data.find(b'\x00\x00\x01')
+    while 0 <= pos < len(data) - 4:
+        nal: int = pos + 3
+        following: int = data.find(b'\x00\x00\x01', nal)
+        payload: bytes = data[nal:following if following > 0 else len(data)]
+        try:
+            if stream_type == 0x1B and payload and payload[0] & 0x1F == 7:
+                return _h264_sps_height(payload[1:])
+            if stream_type == 0x24 and payload and (payload[0] >> 1) & 0x3F == 33:
+                return _hevc_sps_height(payload[2:])
+            if stream_type in (0x01, 0x02) and payload[:1] == b'\xb3' and len(payload) >= 4:
+                return ((payload[2] & 0x0F) << 8) | payload[3]
+        except (IndexError, ValueError):
+            pass
+        pos = following
+
+    return None
+
+
+def probe_ts(reader: BoundedReader) -> int | None:
+    head: bytes = reader.read_at(0, TS_HEAD_BYTES)
+    packet_size: int = None
+    for candidate, offset in ((188, 0), (192, 4)):
+        if all(len(head) > offset + i * candidate and head[offset + i * candidate] == TS_SYNC for i in range(4)):
+            packet_size = candidate
+            head = head[offset:]
+            break
+    if packet_size is None:
+        return None
+    pmt_pid: int = None
+    video_pid, video_type = None, None
+    video: list[bytes] = []
+    for pos in range(0, len(head) - 187, packet_size):
+        packet: bytes = head[pos:pos + 188]
+        if packet[0] != TS_SYNC:
+            continue
+        pusi: int = packet[1] & 0x40
+        pid: int = ((packet[1] & 0x1F) << 8) | packet[2]
+        adaptation: int = (packet[3] >> 4) & 0x3
+        start: int = 4
+        if adaptation & 0x2:
+            start += 1 + packet[4]
+        if not adaptation & 0x1 or start >= 188:
+            continue
+        payload: bytes = packet[start:]
+        if pid == 0 and pusi and pmt_pid is None:
+            section: bytes = payload[1 + payload[0]:]
+            section_length: int = ((section[1] & 0x0F) << 8) | section[2]
+            for i in range(8, 3 + section_length - 4, 4):
+                program: int = (section[i] << 8) | section[i + 1]
+                if program != 0:
+                    pmt_pid = ((section[i + 2] & 0x1F) << 8) | section[i + 3]
+                    break
+        elif pid == pmt_pid and pusi and video_pid is None:
+            section = payload[1 + payload[0]:]
+            section_length = ((section[1] & 0x0F) << 8) | section[2]
+            program_info_length: int = ((section[10] & 0x0F) << 8) | section[11]
+            i: int = 12 + program_info_length
+            while i < 3 + section_length - 4:
+                stream_type: int = section[i]
+                elementary_pid: int = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+                if stream_type in (0x01, 0x02, 0x1B, 0x24):
+                    video_pid, video_type = elementary_pid, stream_type
+                    break
+                i += 5 + (((section[i + 3] & 0x0F) << 8) | section[i + 4])
+        elif pid == video_pid:
+            if pusi and payload[:3] == b'\x00\x00\x01':
+                payload = payload[9 + payload[8]:]
+                if video:
+                    height: int = _elementary_height(video_type, b''.join(video))
+                    if height:
+                        return height
+            video.append(payload)
+
+    return _elementary_height(video_type, b''.join(video)) if video else None
+
+
+PROBES: dict[str, callable] = {
+    'mkv': probe_mkv,
+    'mp4': probe_mp4,
+    'avi': probe_avi,
+    'ts': probe_ts,
+}
+
+
+def probe_height(medium_path: str) -> int | None:
+    """Frame height read from the container headers, or None if this format/file isn't understood."""
+    probe = PROBES.get(medium_path.rsplit('.', 1)[-1].lower())
+    if probe is None:
+        return None
+    try:
+        with BoundedReader(medium_path) as reader:
+            return probe(reader)
+    except (OSError, ProbeBudgetExceeded, struct.error, IndexError, ValueError):
+        return None
+
+
+def probe_heights(medium_paths: list[str]) -> dict[str, int]:
+    heights: dict[str, int] = {}
+    for medium_path in medium_paths:
+        height: int = probe_height(medium_path)
+        if height:
+            heights[medium_path] = height
+
+    return heights
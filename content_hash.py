@@ -0,0 +1,196 @@
+"""Sampled content hashes, to find byte-identical media without reading every byte.
+
+    python content_hash.py   # sets of identical media across the catalog (see catalog.py)
+
+A sampled hash covers a file's size and HASH_WINDOW bytes at its head, middle
+and tail, read through mmap; a file of up to three windows is hashed whole.
+Only media of equal size are sampled, and only those whose sampled hashes
+collide are read in full to confirm. Both hashes are cached by (st_dev, st_ino)
+while size and mtime are unchanged, as probes are, so a rerun reads nothing new.
+"""
+import os
+import sys
+import mmap
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+from OSAgnostics import CATALOG, CONTENT_HASHES, HASH_WORKERS
+from catalog import Catalog, get_catalog
+from metrics import Metrics, get_metrics
+
+HASH_WINDOW: int = 1 << 20
+DIGEST_SIZE: int = 16
+
+
+def sampled_hash(path: str, size: int) -> str:
+    """blake2b of size and the head, middle and tail windows; exact for files of up to three windows."""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=DIGEST_SIZE)
+    if size == 0:
+        return digest.hexdigest()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if size <= 3 * HASH_WINDOW:
+            digest.update(m)
+            return digest.hexdigest()
+        if hasattr(m, 'madvise'):
+            m.madvise(mmap.MADV_RANDOM)
+        view: memoryview = memoryview(m)
+        try:
+            # hashing a memoryview releases the GIL while the pages fault in, so threads overlap their reads
+            for offset in (0, (size - HASH_WINDOW) // 2, size - HASH_WINDOW):
+                digest.update(view[offset:offset + HASH_WINDOW])
+        finally:
+            view.release()
+
+    return digest.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=DIGEST_SIZE)).hexdigest()
+
+
+class HashCache:
+    """Sampled and full content hashes keyed by (st_dev, st_ino), valid while st_size and st_mtime_ns are unchanged."""
+
+    def __init__(self, path: str = CONTENT_HASHES) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            ' dev INTEGER NOT NULL,'
+            ' ino INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL,'
+            ' sampled TEXT NOT NULL,'
+            ' full TEXT,'
+            ' PRIMARY KEY (dev, ino)'
+            ') WITHOUT ROWID'
+        )
+        self._metrics: Metrics = get_metrics()
+
+    def _row(self, st: os.stat_result) -> tuple[str, str] | None:
+        row = self._conn.execute(
+            'SELECT size, mtime_ns, sampled, full FROM hashes WHERE dev = ? AND ino = ?', (st.st_dev, st.st_ino)
+        ).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return None
+        return (row[2], row[3])
+
+    def sampled(self, path: str) -> str:
+        st: os.stat_result = os.stat(path)
+        row: tuple[str, str] = self._row(st)
+        if row:
+            self._metrics.count('hash_cache_hits')
+            return row[0]
+        with self._metrics.timer('hash_seconds', kind='sampled'):
+            sampled: str = sampled_hash(path, st.st_size)
+        self._metrics.count('hash_bytes_read', min(st.st_size, 3 * HASH_WINDOW))
+        self._conn.execute(
+            'INSERT OR REPLACE INTO hashes (dev, ino, size, mtime_ns, sampled, full) VALUES (?, ?, ?, ?, ?, NULL)',
+            (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, sampled)
+        )
+        return sampled
+
+    def full(self, path: str) -> str:
+        """The hash of every byte; small files need no second read, their sampled hash already is one."""
+        st: os.stat_result = os.stat(path)
+        if st.st_size <= 3 * HASH_WINDOW:
+            return self.sampled(path)
+        row: tuple[str, str] = self._row(st)
+        if row and row[1]:
+            self._metrics.count('hash_cache_hits')
+            return row[1]
+        sampled: str = row[0] if row else self.sampled(path)
+        with self._metrics.timer('hash_seconds', kind='full'):
+            full: str = full_hash(path)
+        self._metrics.count('hash_bytes_read', st.st_size)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO hashes (dev, ino, size, mtime_ns, sampled, full) VALUES (?, ?, ?, ?, ?, ?)',
+            (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, sampled, full)
+        )
+        return full
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_local: threading.local = threading.local()
+
+
+def get_hash_cache() -> HashCache:
+    """Per-process, per-thread handle, as SQLite connections are not shared across threads."""
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.cache, _local.pid = HashCache(), os.getpid()
+
+    return _local.cache
+
+
+def _grouped(paths: list[str], hasher, pool: ThreadPoolExecutor) -> list[list[str]]:
+    """paths grouped by hasher(path), groups of one dropped; unreadable files are left out."""
+    def safe(path: str) -> str | None:
+        try:
+            return hasher(path)
+        except OSError as ex:
+            print(f'!!! cannot hash <{path}>: {str(ex)}')
+            return None
+
+    groups: dict[str, list[str]] = defaultdict(list)
+    for path, digest in zip(paths, pool.map(safe, paths)):
+        if digest:
+            groups[digest].append(path)
+    return [i for i in groups.values() if len(i) > 1]
+
+
+def _one_link_each(paths: list[str], pool: ThreadPoolExecutor) -> list[str]:
+    """paths, keeping the first of the hard links to each file, as they share its bytes without wasting any."""
+    def safe(path: str) -> tuple[int, int] | None:
+        try:
+            st: os.stat_result = os.stat(path)
+        except OSError as ex:
+            print(f'!!! cannot hash <{path}>: {str(ex)}')
+            return None
+        return (st.st_dev, st.st_ino)
+
+    files: dict[tuple[int, int], str] = {}
+    for path, file in zip(paths, pool.map(safe, paths)):
+        if file:
+            files.setdefault(file, path)
+    return list(files.values())
+
+
+def identical_media(same_size: Iterable[list[str]], workers: int = HASH_WORKERS) -> Iterator[list[str]]:
+    """Sets of byte-identical files, from groups of files of equal size; hard links count as one file."""
+    with ThreadPoolExecutor(workers, thread_name_prefix='hash') as pool:
+        for paths in same_size:
+            paths = _one_link_each(paths, pool)
+            for candidates in _grouped(paths, lambda i: get_hash_cache().sampled(i), pool):
+                yield from _grouped(candidates, lambda i: get_hash_cache().full(i), pool)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", dest="catalog", default=CATALOG)
+    parser.add_argument("--workers", dest="workers", type=int, default=HASH_WORKERS,
+                        help="files hashed at once; more help on network storage")
+    args = parser.parse_args()
+    catalog: Catalog = get_catalog(args.catalog)
+    (sets, wasted) = (0, 0)
+    for paths in identical_media(catalog.same_size(), args.workers):
+        sets += 1
+        wasted += os.path.getsize(paths[0]) * (len(paths) - 1)
+        print('!!! identical: ' + ', '.join(f'<{i}>' for i in paths))
+    metrics: Metrics = get_metrics()
+    read: int = sum(v for (name, _), v in metrics.counters.items() if name == 'hash_bytes_read')
+    print(f'=== {sets} sets of identical media, {wasted / (1 << 30):.2f} GiB in extra copies;'
+          f' {read / (1 << 30):.2f} GiB read to find them')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Discovery of title folders under the basedirs, as a stream the pipeline consumes while the walk goes on.
+
+Which folders are titles and which are collections of titles follows from
+their names and contents (see classifier.py); this module does the walking.
+"""
+import os
+import re
+from typing import Iterator
+from OSAgnostics import DirEntry
+from classifier import SEASON_DIR, find_imdbid, is_media
+from metrics import Metrics, get_metrics
+
+
+def is_title(path: str, nested: bool = False) -> bool:
+    """Whether a folder found above --depth is a title (tagged, or holding media or season folders) or a collection."""
+    if find_imdbid(os.path.basename(path)):
+        return True
+    get_metrics().count('dirs_scanned')
+    with os.scandir(path) as nodes:
+        for node in nodes:
+            if is_media(node.name) and node.is_file():
+                return True
+            if nested and SEASON_DIR.match(node.name) and node.is_dir():
+                return True
+
+    return False
+
+
+def _is_title_or_unreadable(entry: DirEntry, nested: bool) -> bool:
+    # an unreadable folder is handed on as a title, so its error lands in the report instead of ending the walk
+    try:
+        return is_title(entry.path, nested)
+    except OSError:
+        return True
+
+
+def discover(roots: list[str], depth: int = 1, filter: re.Pattern = None, nested: bool = False) -> Iterator[DirEntry]:
+    """Title folders under roots, yielded as they are found so work can start before the walk ends.
+
+    Folders directly in a root are titles when depth is 1. With a larger depth
+    a folder that is not a title (see is_title) is a collection and is walked
+    into, down to depth levels below its root. Hidden folders are skipped;
+    filter, if given, must match a title's name.
+    """
+    metrics: Metrics = get_metrics()
+    pending: list[tuple[str, int]] = [(root, 1) for root in reversed(roots)]
+    while pending:
+        (path, level) = pending.pop()
+        metrics.count('dirs_scanned')
+        collections: list[tuple[str, int]] = []
+        try:
+            with os.scandir(path) as nodes:
+                for entry in nodes:
+                    if entry.name.startswith('.') or not entry.is_dir():
+                        continue
+                    if level < depth and not _is_title_or_unreadable(entry, nested):
+                        collections.append((entry.path, level + 1))
+                    elif not filter or filter.match(entry.name):
+                        yield entry
+        except OSError as ex:
+            print(f'!!! cannot scan <{path}>: {str(ex)}')
+        # depth first, so a collection's titles come out together
+        pending.extend(reversed(collections))
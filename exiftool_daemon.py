@@ -0,0 +1,108 @@
+import os
+import json
+import atexit
+import subprocess
+from OSAgnostics import (
+    EXIFTOOL,
+    EXIFTOOL_DAEMON_OPTS,
+    EXIFTOOL_BATCH_SIZE,
+)
+
+
+class ExifToolDaemon:
+    """One long-lived `exiftool -stay_open True -@ -` process.
+
+    Each command is a batch of paths followed by `-execute<N>`; exiftool answers
+    with the JSON for the batch and a `{ready<N>}` line that frames the reply.
+    """
+
+    def __init__(self, executable: str = EXIFTOOL) -> None:
+        self._seq: int = 0
+        self._proc: subprocess.Popen = subprocess.Popen(
+            args=[executable, '-stay_open', 'True', '-@', '-', '-common_args'] + EXIFTOOL_DAEMON_OPTS,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def execute(self, args: list[str]) -> bytes:
+        self._seq += 1
+        command: str = '\n'.join(args + [f'-execute{self._seq}']) + '\n'
+        self._proc.stdin.write(command.encode('utf-8'))
+        self._proc.stdin.flush()
+        ready: bytes = f'{{ready{self._seq}}}'.encode('ascii')
+        lines: list[bytes] = []
+        while True:
+            line: bytes = self._proc.stdout.readline()
+            if not line:
+                raise EOFError(f'exiftool exited while waiting for {ready}')
+            if line.rstrip() == ready:
+                break
+            lines.append(line)
+
+        return b''.join(lines)
+
+    def image_heights(self, medium_paths: list[str]) -> dict[str, int]:
+        heights: dict[str, int] = {}
+        paths: list[str] = [i for i in medium_paths if '\n' not in i]
+        for start in range(0, len(paths), EXIFTOOL_BATCH_SIZE):
+            result: bytes = self.execute(paths[start:start + EXIFTOOL_BATCH_SIZE])
+            if not result.strip():
+                continue
+            for meta_info in json.loads(result):
+                image_size: str = meta_info.get("Composite", {}).get("ImageSize")
+                if image_size and 'x' in str(image_size):
+                    heights[os.path.normpath(meta_info["SourceFile"])] = int(str(image_size).split(sep="x")[1])
+
+        return {i: heights[os.path.normpath(i)] for i in paths if os.path.normpath(i) in heights}
+
+    def close(self) -> None:
+        if self.alive():
+            try:
+                self._proc.stdin.write(b'-stay_open\nFalse\n')
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+
+
+_daemon: ExifToolDaemon = None
+_daemon_pid: int = None
+_daemon_broken: bool = False
+
+
+def get_daemon() -> ExifToolDaemon | None:
+    """Per-process daemon, started on first use; None once it has failed in this process."""
+    global _daemon, _daemon_pid, _daemon_broken
+    if _daemon_pid != os.getpid():
+        _daemon, _daemon_pid, _daemon_broken = None, os.getpid(), False
+    if _daemon_broken:
+        return None
+    if _daemon is None or not _daemon.alive():
+        try:
+            _daemon = ExifToolDaemon()
+            atexit.register(_daemon.close)
+        except OSError:
+            _daemon_broken = True
+            return None
+
+    return _daemon
+
+
+def probe_heights(medium_paths: list[str]) -> dict[str, int]:
+    """Frame heights for the paths exiftool could read; anything missing is left to the caller."""
+    global _daemon_broken
+    daemon: ExifToolDaemon = get_daemon()
+    if daemon is None or not medium_paths:
+        return {}
+    try:
+        return daemon.image_heights(medium_paths)
+    except (OSError, EOFError, ValueError) as ex:
+        print(f'!!! exiftool daemon failed, falling back to one-shot probing: {str(ex)}')
+        _daemon_broken = True
+        daemon.close()
+
+    return {}
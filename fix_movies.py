@@ -1,10 +1,36 @@
 import os
+import sys
 import re
-import json
+import time
+import signal
 import argparse
+from functools import partial
+from typing import Iterator
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, UTC
+from collections import Counter
 from movie import Movie
-from concurrent import futures
+from run_stats import RunStats
+from report import Report, TaskResult, default_report_path, timing
+from plan import PlanEntry, PlanWriter, apply_plan, planned_steps
+from rename_journal import RenameJournal, get_journal
+from relocate import Progress, get_progress
+from metrics import (
+    PROFILE_TOP, Metrics, get_metrics, take_worker_metrics, profiled, start_profiling, finish_profiling,
+    write_textfile,
+)
+from scan_manifest import get_manifest, verdict_for, changed_only
+from discovery import discover
+from watch import Watcher
+from media_table import MediaTable
+from catalog import Catalog, NameClaims, get_catalog
+from sharding import Leases, parse_shard, in_shard, sharded
+from omdb import query_omdb_async
+from omdb_client import OmdbClient
+from autotune import AUTO, Tuner, parse_workers, sizing
+from pipeline import Pipeline, Stage, Failed, THREAD, PROCESS, ASYNC
+from OSAgnostics import SCAN_MANIFEST, CATALOG, OMDB_CONCURRENCY, RESOLVE_THRESHOLD, WATCH_SETTLE
+from probe_cache import ProbeCache, get_probe_cache
 
 if os.name == "posix":
     from posix import DirEntry
@@ -12,70 +38,384 @@ else:
     from nt import DirEntry
 
 
+@dataclass
+class Task:
+    subdir: str
+    movie: Movie = None
+    ok: bool = False
+    counters: Counter = field(default_factory=Counter)
+    started: float = field(default_factory=time.perf_counter)
+    timings: dict[str, float] = field(default_factory=dict)
+    steps: list[list] = None
+    metrics: Metrics = None
+    found: bool = None
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--basedir", required=True, dest="basedir")
+    parser.add_argument("--basedir", dest="basedir", action="append",
+                        help="library folder to scan; repeat for several roots")
+    parser.add_argument("--depth", dest="depth", type=int, default=1,
+                        help="how many folder levels below a basedir titles may sit; folders in between that"
+                             " are not titles are walked as collections (e.g. Movies/Action/...)")
+    parser.add_argument("--filter", dest="filter", type=re.compile, default=None,
+                        help="regular expression a title folder's name must match")
+    parser.add_argument("--shard", dest="shard", type=parse_shard, default=None,
+                        help="I/N: only the titles of shard I (0 to N-1) of N, by a hash of the folder name that is"
+                             " the same on every host, so N hosts can share one library")
+    parser.add_argument("--leases", dest="leases", default=None,
+                        help="folder on the shared filesystem for per-title leases, so no two hosts ever work on"
+                             " one title at once; a dead host's leases are taken over after LEASE_TTL seconds")
     parser.add_argument("--dryrun", dest="dryrun", action="store_true")
+    parser.add_argument("--plan", dest="plan", default=None,
+                        help="write the renames to this plan file for --apply instead of making them (implies --dryrun)")
+    parser.add_argument("--apply", dest="apply", default=None,
+                        help="make the renames of a plan file written by --plan, without scanning, probing or OMDb")
+    parser.add_argument("--target", dest="target", default=None,
+                        help="move fixed titles into this library folder; across filesystems the copies are"
+                             " zero-copy, verified, and resumed after an interruption")
+    parser.add_argument("--undo", dest="undo", action="store_true",
+                        help="reverse the renames of the last fix_movies run, from the rename journal; titles"
+                             " --target moved to another filesystem are not moved back")
+    parser.add_argument("--watch", dest="watch", action="store_true",
+                        help="after the pass over the basedirs, keep running and fix each title that lands or changes"
+                             " there once it has been quiet for WATCH_SETTLE seconds (Linux)")
+    parser.add_argument("--incremental", dest="incremental", action="store_true",
+                        help="skip directories that were settled on a previous run and are unchanged since")
+    parser.add_argument("--manifest", dest="manifest", default=SCAN_MANIFEST)
+    parser.add_argument("--catalog", dest="catalog", default=CATALOG,
+                        help="SQLite catalog every scanned title and file is indexed into (see catalog.py)")
+    parser.add_argument("--no-catalog", dest="no_catalog", action="store_true",
+                        help="neither index titles nor hold back the ones whose imdbid another folder has")
+    parser.add_argument("--workers", dest="workers", type=parse_workers, default=AUTO,
+                        help="'auto' to tune worker counts while running, or a fixed count per stage")
+    parser.add_argument("--max-workers", dest="max_workers", type=int, default=None,
+                        help="ceiling for auto-tuned stages")
+    parser.add_argument("--resolve-threshold", dest="resolve_threshold", type=float, default=RESOLVE_THRESHOLD,
+                        help="score from which a folder without an imdbid takes its best catalog match;"
+                             " above 1 only lists candidates")
+    parser.add_argument("--verify-sample", dest="verify_sample", type=float, default=0.0, metavar="P",
+                        help="probe this fraction (0 to 1) of the media whose resolution comes from a name tag"
+                             " (1080p, 4K...), use the container's resolution and report names that were wrong")
+    parser.add_argument("--media-table", dest="media_table", default=None,
+                        help="save every scanned file to this compact columnar table (see media_table.py)")
+    parser.add_argument("--report", dest="report", default=None,
+                        help="JSONL file for the per-directory results (default: a new file under the cache's reports/)")
+    parser.add_argument("--verbose", dest="verbose", action="store_true",
+                        help="print what was done or planned for every directory as its result arrives")
+    parser.add_argument("--stats-json", dest="stats_json", default=None,
+                        help="write throughput, per-directory latency percentiles and peak RSS to this file")
+    parser.add_argument("--prometheus", dest="prometheus", default=None,
+                        help="write counters and latency histograms to this node_exporter textfile")
+    parser.add_argument("--profile", dest="profile", default=None,
+                        help="cProfile every worker into this directory and merge the dumps into merged.prof/merged.txt")
     args = parser.parse_args()
+    if not args.basedir and not args.apply and not args.undo:
+        parser.error('--basedir is required unless --apply or --undo is given')
+    if not 0 <= args.verify_sample <= 1:
+        parser.error('--verify-sample must be a fraction from 0 to 1')
+    if args.watch and (args.plan or args.apply or args.undo):
+        parser.error('--watch fixes titles as they land; it cannot be combined with --plan, --apply or --undo')
     return args
 
 
-def get_subdirs(basedir: str, filter: str = None) -> list[DirEntry]:
-    entries: list[DirEntry] = []
-    with os.scandir(basedir) as nodes:
-        for entry in nodes:
-            if entry.is_dir:
-                entries.append(entry)
-    if filter:
-        entries = [i for i in entries if re.match(filter, i.name)]
+def parse_task(task: Task, resolve_threshold: float = RESOLVE_THRESHOLD, verify_sample: float = 0.0) -> Task:
+    with timing(task.timings, 'parse'):
+        task.movie = Movie(task.subdir, probe=False, resolve_threshold=resolve_threshold, verify_sample=verify_sample)
+    return task
+
+
+def probe_task(task: Task) -> Task:
+    probe_cache: ProbeCache = get_probe_cache()
+    before: Counter = probe_cache.counters.copy()
+    with timing(task.timings, 'probe'):
+        task.movie.probe_media()
+    task.counters.update(probe_cache.counters - before)
+    task.metrics = take_worker_metrics()
+    return task
+
+
+async def lookup_task(client: OmdbClient, task: Task) -> Task:
+    with timing(task.timings, 'lookup'):
+        result: dict = await query_omdb_async(client, task.movie.imdbid, counters=task.counters)
+    # fix() refuses a movie OMDb knows nothing about, so its media need no probe
+    task.found = bool(result) and result.get('Response') == 'True'
+    return task
+
+
+def catalog_task(task: Task, catalog: str) -> Task:
+    with timing(task.timings, 'catalog'):
+        get_catalog(catalog).index_movie(task.movie)
+    return task
+
+
+def rename_task(task: Task, dryrun: bool, manifest: str = None, plan: bool = False, target: str = None,
+                leases: Leases = None, catalog: str = None, claims: NameClaims = None) -> Task:
+    movie: Movie = task.movie
+    if leases:
+        leases.check(task.subdir)
+    other: str = None
+    if catalog and movie.imdbid and (target or movie.need_fix()):
+        # renamed (or moved) alongside another folder of the same title, the two would collide;
+        # of the folders of a scan named with one imdbid, the first found goes ahead, whichever the pipeline
+        # reaches first
+        other = ((claims.holder_of(movie.imdbid, task.subdir) if claims else None)
+                 or get_catalog(catalog).duplicate_of('movie', movie.imdbid, task.subdir,
+                                                      besides=claims.named(movie.imdbid) if claims else ()))
+    with timing(task.timings, 'rename'):
+        if other:
+            task.ok = movie.refuse('another folder holds the same imdbid', f'--- same imdbid as <{other}>')
+        else:
+            task.ok = movie.fix(dry_run=dryrun)
+    task.counters.update(movie.resolution_checks)
+    if target and task.ok:
+        with timing(task.timings, 'relocate'):
+            task.counters['bytes_moved'] += movie.relocate(target, dry_run=dryrun)
+    if catalog and not dryrun and (movie.renames or movie.relocation):
+        get_catalog(catalog).index_movie(movie, old_path=task.subdir)
+    if plan and task.ok and (movie.renames or movie.relocation):
+        task.steps = planned_steps(movie.renames, relocation=movie.relocation)
+    if manifest and not (dryrun and movie.need_fix()):
+        get_manifest(manifest).record(
+            movie.path, movie.media_count(), verdict_for(movie.imdbid, movie.need_fix()),
+            nested=False, old_path=task.subdir
+        )
+    return task
+
+
+def print_catalog(path: str) -> None:
+    catalog: Catalog = get_catalog(path)
+    duplicates: int = sum(1 for i in catalog.duplicates() if i[0] == 'movie')
+    print(f'=== catalog {path}: {duplicates} imdbids held by more than one folder;'
+          f' python catalog.py --duplicates lists them')
 
-    return entries
 
+def print_outcome(outcome: TaskResult) -> None:
+    print('\n'.join([f'??? {outcome.path} [{outcome.status}]'] + outcome.notes
+                     + ([f'!!! {outcome.error}'] if outcome.error else [])))
 
-def process_subdir(subdir: str, dryrun: bool) -> bool:
-    print(f"??? {subdir}")
+
+def write_prometheus(args, metrics: Metrics, summary: dict) -> None:
+    if args.prometheus:
+        write_textfile(args.prometheus, metrics.to_prometheus('fix_movies', {
+            'run_seconds': summary['seconds'],
+            'last_run_timestamp_seconds': round(time.time(), 3),
+        }))
+
+
+def finish(args, report: Report, metrics: Metrics) -> None:
+    progress: Progress = get_progress()
+    progress.stop()
+    summary: dict = report.close()
+    print('\n'.join(report.format_summary(summary) + metrics.hot_paths()
+                    + ([progress.line()] if progress.files else [])))
+    write_prometheus(args, metrics, summary)
+    if args.profile:
+        print(f'=== profile: {finish_profiling(args.profile)} (top {PROFILE_TOP} by cumulative time in merged.txt)')
+
+
+def apply(args) -> int:
+    """--apply: makes the renames of a saved plan whose sources are unchanged since it was written."""
+    print(f"=== applying {args.apply} ===")
+    if args.profile:
+        start_profiling(args.profile)
+    get_progress().start()
+    report: Report = Report(args.report or default_report_path('fix_movies'), 'fix_movies', False)
+    metrics: Metrics = get_metrics()
+    try:
+        for outcome in apply_plan(args.apply, 'fix_movies', args.manifest):
+            report.add(outcome)
+            metrics.record_task(outcome.timings, outcome.counters)
+            metrics.count('directories', status=outcome.status)
+            if args.verbose:
+                print_outcome(outcome)
+    except (OSError, ValueError) as ex:
+        print(f'!!! cannot apply {args.apply}: {str(ex)}')
+        return 1
+    finally:
+        finish(args, report, metrics)
+
+    return 0
+
+
+def watch(args, watcher: Watcher, report: Report, metrics: Metrics, dryrun: bool, leases: Leases = None) -> None:
+    """--watch: fixes every title folder that settles, one at a time in this process, until interrupted."""
+    catalog: str = None if args.no_catalog else args.catalog
+    print(f'=== watching {args.basedir}: titles are fixed {WATCH_SETTLE:g}s after their last change ===')
+    # stopped by a service manager's SIGTERM as by Ctrl-C, with the report and metrics written out
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
-        movie: Movie = Movie(subdir)
-        movie.fix(dry_run=dryrun)
-    except Exception as ex:
-        print(f'Error in processing <{subdir}>: {str(ex)}')
-        return False
+        for subdir in watcher.settled():
+            if not in_shard(os.path.basename(subdir), args.shard) or (leases and not leases.acquire(subdir)):
+                continue
+            task: Task = Task(subdir)
+            try:
+                parse_task(task, args.resolve_threshold, args.verify_sample)
+                if task.movie.needs_probe():
+                    probe_task(task)
+                if catalog:
+                    catalog_task(task, catalog)
+                rename_task(task, dryrun, args.manifest, target=args.target, leases=leases, catalog=catalog)
+                outcome: TaskResult = TaskResult.of('movie', subdir, task.movie, task.ok, dryrun, task.timings,
+                                                    task.counters)
+            except Exception as ex:
+                outcome = TaskResult.failed('movie', subdir, ex, task.movie, task.timings)
+            if leases:
+                leases.release(subdir)
+            metrics.record_task(task.timings, task.counters)
+            metrics.observe('directory_seconds', time.perf_counter() - task.started)
+            metrics.count('directories', status=outcome.status)
+            report.add(outcome)
+            report.flush()
+            print_outcome(outcome)
+            watcher.forget(subdir)
+            watcher.forget(outcome.new_path or subdir)
+            write_prometheus(args, metrics, report.summary())
+    except KeyboardInterrupt:
+        print('=== watch stopped')
+    finally:
+        watcher.close()
 
-    return True
+
+def undo(journal: RenameJournal) -> int:
+    """--undo: renames the folders and files of the last run back, newest first."""
+    (renames, errors) = journal.undo()
+    for source, target in renames:
+        print(f'+++ <{source}> ==> <{target}>')
+    for error in errors:
+        print(f'!!! could not undo: {error}')
+    print(f'=== {len(renames)} renames undone, {len(errors)} directories left as they were')
+
+    return 1 if errors else 0
 
 
 def main():
     args = parse_args()
-    basedir: str = args.basedir
-    dryrun: bool = args.dryrun
-    print(f"=== {basedir=} {dryrun=} ===")
-    movie_dirs: list[DirEntry] = get_subdirs(basedir)
+    journal: RenameJournal = get_journal()
+    journal.tool = 'fix_movies'
+    for source, target in journal.recover():
+        print(f'!!! rolled back <{source}> ==> <{target}> left half done by an interrupted run')
+    if args.undo:
+        return undo(journal)
+    if args.apply:
+        return apply(args)
+    basedirs: list[str] = args.basedir
+    dryrun: bool = args.dryrun or bool(args.plan)
+    incremental: bool = args.incremental
+    workers: str | int = args.workers
+    if args.target:
+        args.target = os.path.abspath(args.target)
+        if not dryrun:
+            os.makedirs(args.target, exist_ok=True)
+            get_progress().start()
+    print(f"=== {basedirs=} {dryrun=} {incremental=} {workers=} ===")
+    try:
+        # watching before the pass, so a title landing while it runs is not missed
+        watcher: Watcher = Watcher(basedirs, args.depth, args.filter, nested=False,
+                                   ignore=journal.renamed_recently) if args.watch else None
+    except OSError as ex:
+        print(f'!!! cannot watch {basedirs}: {str(ex)}')
+        return 1
+    # discovered as the pipeline consumes them, so the first titles are processed while the walk goes on
+    movie_dirs: Iterator[DirEntry] = discover(basedirs, args.depth, args.filter, nested=False)
+    discovered: Counter = Counter()
+    catalog: str = None if args.no_catalog else args.catalog
+    # every name of the scan, unchanged or in other shards too, claimed in the order the walk finds them
+    claims: NameClaims = NameClaims() if catalog else None
+    if claims:
+        movie_dirs = claims.claim(movie_dirs)
+    if incremental:
+        movie_dirs = changed_only(movie_dirs, args.manifest, False, discovered)
+    leases: Leases = Leases(args.leases) if args.leases else None
+    if args.shard or leases:
+        movie_dirs = sharded(movie_dirs, args.shard, leases, discovered)
+    if leases:
+        leases.start()
     result: int = 0
+    stats: RunStats = RunStats()
     start_time: datetime = datetime.now(UTC)
 
-    # looping
-    # print(f'looping started at {start_time.isoformat()}')
-    # for movie_dir in movie_dirs:
-    #     ok: bool = process_subdir(movie_dir.path, dryrun)
-    #     result += (1 if ok else 0)
-    # finish_time: datetime = datetime.now(UTC)
-    # print(f'looping finished at {finish_time.isoformat()}')
-    # time_used: timedelta = finish_time - start_time
-    # print(f'looping duration: {time_used}, total movies: {result}')
-
-    # futrues
-    print(f'futures started at {start_time.isoformat()}')
-    with futures.ProcessPoolExecutor(max_workers=10) as pool:
-        tasks: list[futures.Future] = [
-            pool.submit(process_subdir, movie_dir.path, dryrun)
-            for movie_dir in movie_dirs
-        ]
-    for completed in futures.as_completed(tasks):
-        result += (1 if completed.result() else 0)
+    # pipeline: scandir and renames on threads, OMDb lookups on one event loop, then probes on processes
+    # for the movies that will be renamed
+    print(f'pipeline started at {start_time.isoformat()}')
+    pipeline: Pipeline = Pipeline([
+        Stage('parse', profiled(partial(parse_task, resolve_threshold=args.resolve_threshold,
+                                        verify_sample=args.verify_sample), args.profile), THREAD,
+              **sizing(workers, THREAD, 4, args.max_workers)),
+        Stage('catalog', profiled(partial(catalog_task, catalog=catalog), args.profile), THREAD,
+              accepts=lambda t: bool(catalog), **sizing(workers, THREAD, 2, args.max_workers)),
+        Stage('lookup', profiled(partial(lookup_task, OmdbClient()), args.profile, asynchronous=True), ASYNC,
+              workers=OMDB_CONCURRENCY, accepts=lambda t: bool(t.movie.need_fix())),
+        Stage('probe', profiled(probe_task, args.profile), PROCESS,
+              accepts=lambda t: t.movie.needs_probe() and t.found is not False,
+              **sizing(workers, PROCESS, os.cpu_count() or 1, args.max_workers)),
+        Stage('rename', profiled(partial(rename_task, dryrun=dryrun, manifest=args.manifest, plan=bool(args.plan),
+                                         target=args.target, leases=leases, catalog=catalog, claims=claims),
+                      args.profile),
+              THREAD, **sizing(workers, THREAD, 4, args.max_workers)),
+    ], tuner=Tuner() if workers == AUTO else None)
+    print(f'=== workers at start: {pipeline.limits()} ===')
+    if args.profile:
+        start_profiling(args.profile)
+    counters: Counter = Counter()
+    report: Report = Report(args.report or default_report_path('fix_movies'), 'fix_movies', dryrun)
+    metrics: Metrics = get_metrics()
+    planner: PlanWriter = PlanWriter(args.plan, 'fix_movies', basedirs) if args.plan else None
+    table: MediaTable = MediaTable() if args.media_table else None
+    for task in pipeline.run(Task(i.path) for i in movie_dirs):
+        if isinstance(task, Failed):
+            item: Task = task.item
+            outcome: TaskResult = TaskResult.failed('movie', item.subdir if item else ', '.join(basedirs), task.error,
+                                                    item.movie if item else None, item.timings if item else None)
+            if item:
+                stats.record(item.started, outcome.status)
+                metrics.record_task(item.timings, item.counters)
+        else:
+            outcome = TaskResult.of('movie', task.subdir, task.movie, task.ok, dryrun, task.timings, task.counters)
+            stats.record(task.started, outcome.status)
+            metrics.record_task(task.timings, task.counters)
+            metrics.observe('directory_seconds', time.perf_counter() - task.started)
+            if task.metrics:
+                metrics.merge(task.metrics)
+            result += 1
+            counters.update(task.counters)
+            if table is not None:
+                table.add_movie(task.movie)
+            if planner and task.steps:
+                planner.add(PlanEntry(task.subdir, 'movie', task.movie.imdbid, task.movie.media_count(), False, task.steps))
+        done: Task = task.item if isinstance(task, Failed) else task
+        if leases and done:
+            leases.release(done.subdir)
+        report.add(outcome)
+        metrics.count('directories', status=outcome.status)
+        if args.verbose:
+            print_outcome(outcome)
     finish_time: datetime = datetime.now(UTC)
-    print(f'futures finished at {finish_time.isoformat()}')
+    print(f'pipeline finished at {finish_time.isoformat()}')
+    print(f'=== workers at finish: {pipeline.limits()} ===')
     time_used: timedelta = finish_time - start_time
-    print(f'futures duration: {time_used}, total movies: {result}')
+    if incremental:
+        print(f"=== incremental: {discovered['unchanged']} of {discovered['seen']} directories unchanged ===")
+    if args.shard or leases:
+        shard: str = '/'.join(map(str, args.shard)) if args.shard else 'all'
+        print(f"=== shard {shard}: {discovered['other_shards']} directories left to the other shards,"
+              f" {discovered['leased_elsewhere']} leased by other hosts ===")
+    print(f'pipeline duration: {time_used}, total movies: {result}')
+    if args.stats_json:
+        stats.write(args.stats_json, tool='fix_movies', dryrun=dryrun, workers=pipeline.limits(), counters=dict(counters))
+    if catalog:
+        print_catalog(catalog)
+    if table is not None:
+        table.save(args.media_table)
+        print(f'=== {len(table)} files in {args.media_table}, {table.nbytes() / max(1, len(table)):.0f} bytes per file')
+    if planner:
+        planner.close()
+        print(f'=== {planner.entries} directories to change planned into {planner.path}; run --apply {planner.path}')
+    if watcher:
+        watch(args, watcher, report, metrics, dryrun, leases)
+    if leases:
+        leases.stop()
+    finish(args, report, metrics)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
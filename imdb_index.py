@@ -0,0 +1,210 @@
+"""Offline imdbid -> (title, years, type) index built from the IMDb `title.basics.tsv` dump.
+
+    python imdb_index.py title.basics.tsv.gz [--output PATH] [--with-episodes]
+
+The index is one file, memory-mapped read-only:
+
+    header   8s magic, uint32 byte-order mark, uint32 count
+    ids      count x uint32 tconst numbers, ascending
+    records  count x (uint16 start year, uint16 end year, uint8 type, pad, uint16 title length, uint32 title offset)
+    titles   UTF-8 primaryTitle blob
+
+Lookups bisect the id array in C through a memoryview, then read one record.
+Integers are stored in the byte order of the machine that built the file.
+"""
+import os
+import sys
+import gzip
+import mmap
+import array
+import bisect
+import struct
+import argparse
+from OSAgnostics import IMDB_INDEX
+
+MAGIC: bytes = b'IMDBIDX1'
+BYTE_ORDER_MARK: int = 0x01020304
+HEADER: struct.Struct = struct.Struct('=8sII')
+RECORD: struct.Struct = struct.Struct('=HHBxHI')
+NULL: str = '\\N'
+
+TYPES: list[str] = [
+    'movie', 'short', 'tvMovie', 'tvSeries', 'tvMiniSeries', 'tvSpecial',
+    'video', 'videoGame', 'tvEpisode', 'tvShort', 'tvPilot',
+]
+TYPE_CODES: dict[str, int] = {name: code for code, name in enumerate(TYPES)}
+OTHER: int = 255
+# IMDb titleType -> the Type OMDb reports for it
+OMDB_TYPES: dict[str, str] = {
+    'tvSeries': 'series',
+    'tvMiniSeries': 'series',
+    'tvEpisode': 'episode',
+    'videoGame': 'game',
+}
+
+
+def _tconst(imdbid: str) -> int | None:
+    if not imdbid or not imdbid.startswith('tt') or not imdbid[2:].isdigit():
+        return None
+    return int(imdbid[2:])
+
+
+def _year(value: str) -> int:
+    return int(value) if value != NULL and value.isdigit() else 0
+
+
+def _open_dump(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='\n')
+    return open(path, 'rt', encoding='utf-8', newline='\n')
+
+
+def build_index(dump: str, output: str = IMDB_INDEX, with_episodes: bool = False) -> int:
+    """Import a title.basics.tsv[.gz] dump into an index file; returns the number of titles kept.
+
+    The file is written next to `output` and renamed over it, so readers that
+    already mapped the old index keep a consistent view.
+    """
+    rows: list[tuple[int, int, int, int, bytes]] = []
+    with _open_dump(dump) as f:
+        columns: list[str] = f.readline().rstrip('\n').split('\t')
+        (c_id, c_type, c_title, c_start, c_end) = (
+            columns.index('tconst'), columns.index('titleType'), columns.index('primaryTitle'),
+            columns.index('startYear'), columns.index('endYear'),
+        )
+        for line_no, line in enumerate(f, start=1):
+            fields: list[str] = line.rstrip('\n').split('\t')
+            if len(fields) < len(columns):
+                continue
+            if fields[c_type] == 'tvEpisode' and not with_episodes:
+                continue
+            number: int = _tconst(fields[c_id])
+            if number is None:
+                continue
+            title: bytes = fields[c_title].encode('utf-8')[:0xFFFF]
+            rows.append((number, _year(fields[c_start]), _year(fields[c_end]),
+                         TYPE_CODES.get(fields[c_type], OTHER), title))
+            if line_no % 1000000 == 0:
+                print(f'=== {line_no} lines read, {len(rows)} titles kept')
+    rows.sort(key=lambda i: i[0])
+
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    partial: str = f'{output}.{os.getpid()}.tmp'
+    with open(partial, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, len(rows)))
+        f.write(array.array('I', [i[0] for i in rows]).tobytes())
+        offset: int = 0
+        for (_, start, end, code, title) in rows:
+            f.write(RECORD.pack(start, end, code, len(title), offset))
+            offset += len(title)
+        for row in rows:
+            f.write(row[4])
+    os.replace(partial, output)
+
+    return len(rows)
+
+
+def omdb_type(title_type: str) -> str:
+    return OMDB_TYPES.get(title_type, 'movie')
+
+
+def omdb_year(omdb_type: str, start: int, end: int | None) -> str:
+    """OMDb's Year: `1999` for a movie, `1999–2003` or `1999–` for a series that ran more than a year."""
+    if omdb_type == 'series' and end != start:
+        return f'{start}–{end or ""}'
+    return str(start)
+
+
+class ImdbIndex:
+    """Read-only view of an index file built by build_index."""
+
+    def __init__(self, path: str = IMDB_INDEX) -> None:
+        self._path: str = path
+        with open(path, 'rb') as f:
+            self._mm: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, mark, count) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or mark != BYTE_ORDER_MARK:
+            self._mm.close()
+            raise ValueError(f'{path} is not an imdb index for this machine; re-run the import')
+        self.count: int = count
+        ids_at: int = HEADER.size
+        self._records_at: int = ids_at + 4 * count
+        self._titles_at: int = self._records_at + RECORD.size * count
+        self._ids: memoryview = memoryview(self._mm)[ids_at:self._records_at].cast('I')
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def lookup(self, imdbid: str) -> tuple[str, int | None, int | None, str] | None:
+        """(primary title, start year, end year, IMDb titleType) or None if imdbid is not indexed."""
+        number: int = _tconst(imdbid)
+        position: int = bisect.bisect_left(self._ids, number) if number is not None else self.count
+        if position == self.count or self._ids[position] != number:
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        return self.entry(position)[1:]
+
+    def entry(self, position: int) -> tuple[str, str, int | None, int | None, str]:
+        """(imdbid, primary title, start year, end year, titleType) of the position-th title in id order."""
+        (start, end, code, length, offset) = RECORD.unpack_from(self._mm, self._records_at + RECORD.size * position)
+        at: int = self._titles_at + offset
+        title: str = self._mm[at:at + length].decode('utf-8')
+
+        return (f'tt{self._ids[position]:07d}', title, start or None, end or None,
+                TYPES[code] if code < len(TYPES) else 'other')
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def omdb_record(self, imdbid: str, type: str = None) -> dict | None:
+        """The lookup shaped like an OMDb `?i=` answer, or None when absent or not of the requested OMDb type."""
+        found: tuple = self.lookup(imdbid)
+        if not found:
+            return None
+        (title, start, end, title_type) = found
+        kind: str = omdb_type(title_type)
+        if (type and type != kind) or not start:
+            return None
+
+        return {'Title': title, 'Year': omdb_year(kind, start, end), 'imdbID': imdbid,
+                'Type': kind, 'Response': 'True'}
+
+    def close(self) -> None:
+        self._ids.release()
+        self._mm.close()
+
+
+_index: ImdbIndex = None
+_index_pid: int = None
+
+
+def get_index() -> ImdbIndex | None:
+    """This process's index, or None when no index has been imported."""
+    global _index, _index_pid
+    if _index_pid != os.getpid():
+        _index_pid = os.getpid()
+        try:
+            _index = ImdbIndex() if os.path.exists(IMDB_INDEX) else None
+        except (OSError, ValueError) as ex:
+            print(f'!!! ignoring the imdb index: {str(ex)}')
+            _index = None
+
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dump", help="title.basics.tsv or title.basics.tsv.gz from datasets.imdbws.com")
+    parser.add_argument("--output", dest="output", default=IMDB_INDEX)
+    parser.add_argument("--with-episodes", dest="with_episodes", action="store_true",
+                        help="also index tvEpisode titles (several times larger)")
+    args = parser.parse_args()
+    count: int = build_index(args.dump, args.output, args.with_episodes)
+    print(f'=== {count} titles indexed into {args.output}')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""A library scan as a compact columnar table: one row per medium or episode, tens of bytes each.
+
+Strings that repeat (folders, imdbids, extensions, resolutions, 3D formats)
+are stored once in a symbol table and referenced by a small int code; numbers
+go into typed arrays; file names are one UTF-8 blob with end offsets. Saved
+with --media-table as a JSON header line followed by the raw arrays, so a
+catalog job can load millions of rows without building an object per file.
+"""
+import os
+import json
+from array import array
+from typing import Iterator, NamedTuple
+from movie import Movie
+from series import Series
+
+TABLE_VERSION: int = 2
+# column => array typecode; strings are symbol codes (0: none), numbers are 0 when unknown;
+# numbers take 32 bits, as absolute and date-style episode numbers (20241015) do not fit in 16
+COLUMNS: dict[str, str] = {
+    'folder': 'I',
+    'imdbid': 'I',
+    'name_end': 'Q',
+    'season': 'I',
+    'episode_from': 'I',
+    'episode_to': 'I',
+    'part': 'I',
+    'resolution': 'B',
+    'd3_format': 'B',
+    'extension': 'B',
+}
+SYMBOL_COLUMNS: tuple[str, ...] = ('folder', 'imdbid', 'resolution', 'd3_format', 'extension')
+
+
+class MediaRow(NamedTuple):
+    folder: str
+    name: str
+    imdbid: str | None
+    season: int | None
+    episode_from: int | None
+    episode_to: int | None
+    part: int | None
+    resolution: str | None
+    d3_format: str | None
+    extension: str | None
+
+
+class Symbols:
+    """Distinct strings, each stored once; code 0 stands for None."""
+
+    def __init__(self, values: list[str] = None) -> None:
+        self.values: list[str] = values or [None]
+        self._codes: dict[str, int] = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value: str | None) -> int:
+        code: int = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class MediaTable:
+    def __init__(self) -> None:
+        self.columns: dict[str, array] = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.symbols: dict[str, Symbols] = {name: Symbols() for name in SYMBOL_COLUMNS}
+        self.names: bytearray = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.columns['name_end'])
+
+    def _add(self, folder: str, name: str, imdbid: str, season: int = None, episode_from: int = None,
+             episode_to: int = None, part: int = None, resolution: str = None, d3_format: str = None,
+             extension: str = None) -> None:
+        self.names += name.encode('utf-8', 'surrogateescape')
+        row: dict[str, int] = {
+            'name_end': len(self.names),
+            'season': season or 0,
+            'episode_from': episode_from or 0,
+            'episode_to': episode_to or 0,
+            'part': part or 0,
+        }
+        for column, value in (('folder', folder), ('imdbid', imdbid), ('resolution', resolution),
+                              ('d3_format', d3_format), ('extension', extension)):
+            row[column] = self.symbols[column].code(value)
+        for column, value in row.items():
+            self.columns[column].append(value)
+
+    def add_movie(self, movie: Movie) -> None:
+        for name, medium in movie.media.items():
+            self._add(movie.path, name, movie.imdbid, part=medium.part_no, resolution=medium.resolution,
+                      d3_format=medium.d3_format, extension=medium.extension)
+
+    def add_series(self, series: Series) -> None:
+        for name, episode in series.episodes.items():
+            self._add(series.path, name, series.imdbid, episode.season_id, episode.episode_from_id,
+                      episode.episode_to_id, episode.part_no, extension=episode.extension)
+
+    def rows(self) -> Iterator[MediaRow]:
+        columns: dict[str, array] = self.columns
+        symbols: dict[str, list[str]] = {k: v.values for k, v in self.symbols.items()}
+        start: int = 0
+        for i, end in enumerate(columns['name_end']):
+            yield MediaRow(
+                symbols['folder'][columns['folder'][i]],
+                self.names[start:end].decode('utf-8', 'surrogateescape'),
+                symbols['imdbid'][columns['imdbid'][i]],
+                columns['season'][i] or None,
+                columns['episode_from'][i] or None,
+                columns['episode_to'][i] or None,
+                columns['part'][i] or None,
+                symbols['resolution'][columns['resolution'][i]],
+                symbols['d3_format'][columns['d3_format'][i]],
+                symbols['extension'][columns['extension'][i]],
+            )
+            start = end
+
+    def nbytes(self) -> int:
+        """Bytes held by the arrays and name blob; the symbol tables grow with titles, not files."""
+        return sum(i.itemsize * len(i) for i in self.columns.values()) + len(self.names)
+
+    def save(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        header: dict = {
+            'type': 'media_table', 'version': TABLE_VERSION, 'rows': len(self), 'names': len(self.names),
+            'symbols': {k: v.values for k, v in self.symbols.items()},
+        }
+        partial: str = f'{path}.{os.getpid()}.tmp'
+        with open(partial, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+            for name in COLUMNS:
+                self.columns[name].tofile(f)
+            f.write(self.names)
+        os.replace(partial, path)
+
+    @staticmethod
+    def load(path: str) -> 'MediaTable':
+        """A table written by save(); raises ValueError for anything else."""
+        table: MediaTable = MediaTable()
+        with open(path, 'rb') as f:
+            header: dict = json.loads(f.readline() or b'{}')
+            if header.get('type') != 'media_table' or header.get('version') != TABLE_VERSION:
+                raise ValueError(f'{path} is not a version {TABLE_VERSION} media table')
+            for name in COLUMNS:
+                table.columns[name].fromfile(f, header['rows'])
+            table.names = bytearray(f.read(header['names']))
+        table.symbols = {k: Symbols(v) for k, v in header['symbols'].items()}
+
+        return table
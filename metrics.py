@@ -0,0 +1,298 @@
+"""Run instrumentation: counters, latency histograms, a Prometheus textfile export and --profile.
+
+Hot paths record into this process's registry (get_metrics()). Thread and async
+stages run in the parent and record there directly; a process stage ships its
+worker's numbers back with each task (take_worker_metrics()) and the parent
+merges them.
+"""
+import os
+import sys
+import glob
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+import multiprocessing
+import multiprocessing.util
+from collections import Counter
+from contextlib import contextmanager
+
+# seconds; the Prometheus `le` bounds of every histogram
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# from 3.12 a profiler sees every thread of its process and only one may be active at a time
+PROFILE_PER_PROCESS: bool = sys.version_info >= (3, 12)
+PROFILE_TOP: int = 40
+
+Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict[str, str]) -> Key:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets: tuple[float, ...] = buckets
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: 'Histogram') -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, fraction: float) -> float | None:
+        """Upper bound of the bucket holding the fraction-th observation; inf past the last bucket."""
+        if not self.count:
+            return None
+        rank: float = fraction * self.count
+        seen: int = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return float('inf')
+
+
+class Metrics:
+    """Thread-safe counters and histograms, keyed by name and labels."""
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self.counters: Counter = Counter()
+        self.histograms: dict[Key, Histogram] = {}
+
+    def __getstate__(self) -> dict:
+        return {'counters': self.counters, 'histograms': self.histograms}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+        self.counters = state['counters']
+        self.histograms = state['histograms']
+
+    def count(self, name: str, n: int = 1, **labels: str) -> None:
+        with self._lock:
+            self.counters[_key(name, labels)] += n
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key: Key = _key(name, labels)
+        with self._lock:
+            histogram: Histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        """Observes the block's duration into histogram `name`."""
+        started: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def drain(self) -> 'Metrics':
+        """Everything recorded so far, as a new Metrics; this one starts over."""
+        drained: Metrics = Metrics()
+        with self._lock:
+            (drained.counters, self.counters) = (self.counters, Counter())
+            (drained.histograms, self.histograms) = (self.histograms, {})
+        return drained
+
+    def merge(self, other: 'Metrics') -> None:
+        with self._lock:
+            self.counters.update(other.counters)
+            for key, histogram in other.histograms.items():
+                mine: Histogram = self.histograms.get(key)
+                if mine is None:
+                    mine = self.histograms[key] = Histogram(histogram.buckets)
+                mine.merge(histogram)
+
+    def record_task(self, timings: dict[str, float], counters: Counter | dict) -> None:
+        """A finished task's stage timings and counters (cache hits and the like)."""
+        for stage, seconds in timings.items():
+            self.observe('stage_seconds', seconds, stage=stage)
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def hot_paths(self) -> list[str]:
+        """One line per histogram: calls, total seconds, p50 and p99 bucket bounds."""
+        lines: list[str] = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            label: str = ','.join(f'{k}={v}' for k, v in labels)
+            lines.append(
+                f'=== {name}{{{label}}}: {histogram.count} calls, {histogram.sum:.3f}s, '
+                f'p50<={histogram.quantile(0.5)}s, p99<={histogram.quantile(0.99)}s'
+            )
+        return lines
+
+    def to_prometheus(self, prefix: str, extra: dict[str, float] = None) -> str:
+        """Prometheus text exposition format: counters as <prefix>_<name>_total, histograms as <prefix>_<name>."""
+        def labels_of(pairs: tuple[tuple[str, str], ...], **more: str) -> str:
+            items: list[tuple[str, str]] = list(pairs) + list(more.items())
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in items) + '}'
+
+        lines: list[str] = []
+        with self._lock:
+            typed: set[str] = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric: str = f'{prefix}_{name}_total'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                lines.append(f'{metric}{labels_of(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f'{prefix}_{name}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                cumulative: int = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{labels_of(labels, le=repr(bound))} {cumulative}')
+                lines.append(f'{metric}_bucket{labels_of(labels, le="+Inf")} {histogram.count}')
+                lines.append(f'{metric}_sum{labels_of(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{labels_of(labels)} {histogram.count}')
+        for name, value in (extra or {}).items():
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_textfile(path: str, text: str) -> None:
+    """Writes a node_exporter textfile atomically, so the collector never reads half a file."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial: str = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(partial, path)
+
+
+_metrics: Metrics = None
+_metrics_pid: int = None
+
+
+def get_metrics() -> Metrics:
+    """This process's registry; a forked worker starts with an empty one."""
+    global _metrics, _metrics_pid
+    if _metrics is None or _metrics_pid != os.getpid():
+        _metrics = Metrics()
+        _metrics_pid = os.getpid()
+
+    return _metrics
+
+
+def take_worker_metrics() -> Metrics | None:
+    """In a worker process, what it recorded since the last call, to send back with a task; None in the parent."""
+    if multiprocessing.parent_process() is None:
+        return None
+    return get_metrics().drain()
+
+
+class Profiled:
+    """Stage function wrapper for --profile: makes sure the calling thread (or process) is being profiled.
+
+    Picklable as long as fn is, so it also wraps process stages. Each worker
+    process dumps its profile when it exits; the parent dumps its own in
+    finish_profiling() and merges everything there.
+    """
+
+    def __init__(self, fn, directory: str) -> None:
+        self._fn = fn
+        self._directory: str = directory
+
+    def __call__(self, item):
+        _ensure_profile(self._directory)
+        return self._fn(item)
+
+
+class AsyncProfiled(Profiled):
+
+    async def __call__(self, item):
+        _ensure_profile(self._directory)
+        return await self._fn(item)
+
+
+def profiled(fn, directory: str = None, asynchronous: bool = False):
+    """fn wrapped for --profile when a profile directory is given, else fn itself."""
+    if not directory:
+        return fn
+    return (AsyncProfiled if asynchronous else Profiled)(fn, directory)
+
+
+_profiles: dict[tuple[int, int], tuple[cProfile.Profile, str]] = {}
+_profiles_lock: threading.Lock = threading.Lock()
+
+
+def _ensure_profile(directory: str) -> None:
+    key: tuple[int, int] = (os.getpid(), 0 if PROFILE_PER_PROCESS else threading.get_ident())
+    if key in _profiles:
+        return
+    with _profiles_lock:
+        if key in _profiles:
+            return
+        first_in_process: bool = not any(pid == key[0] for pid, _ in _profiles)
+        if first_in_process:
+            # a forked worker inherits the parent's profilers; they would only record into copies nobody dumps
+            for inherited in list(_profiles):
+                _profiles.pop(inherited)[0].disable()
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler already watches this process
+            return
+        _profiles[key] = (profile, os.path.join(directory, f'{key[0]}-{key[1]}.prof'))
+    if first_in_process and multiprocessing.parent_process() is not None:
+        multiprocessing.util.Finalize(None, _dump_profiles, exitpriority=10)
+
+
+def _dump_profiles() -> list[str]:
+    dumped: list[str] = []
+    with _profiles_lock:
+        for (pid, _), (profile, path) in list(_profiles.items()):
+            if pid == os.getpid():
+                profile.disable()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                profile.dump_stats(path)
+                dumped.append(path)
+    return dumped
+
+
+def start_profiling(directory: str) -> None:
+    """Profiles the calling (main) thread; stage wrappers add worker threads and processes as they start."""
+    os.makedirs(directory, exist_ok=True)
+    _ensure_profile(directory)
+
+
+def finish_profiling(directory: str) -> str | None:
+    """Dumps this process's profiles and merges every dump in directory into merged.prof and merged.txt."""
+    _dump_profiles()
+    dumps: list[str] = [i for i in glob.glob(os.path.join(directory, '*.prof')) if not i.endswith('merged.prof')]
+    if not dumps:
+        return None
+    merged: str = os.path.join(directory, 'merged.prof')
+    stats: pstats.Stats = pstats.Stats(*dumps)
+    stats.dump_stats(merged)
+    with open(os.path.join(directory, 'merged.txt'), 'w', encoding='utf-8') as f:
+        pstats.Stats(merged, stream=f).sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+    return merged
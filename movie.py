@@ -1,25 +1,35 @@
 import os
-import shutil
 import subprocess
-from sys import argv
+from sys import argv, intern
 import re
 import json
+import random
+from collections import Counter
 from dataclasses import dataclass
+from typing import Callable
 # from xmlrpc.client import boolean
-import requests
+from omdb import query_omdb
+from classifier import extension, find_d3_format, find_imdbid, find_part_no, find_resolution, media_files
+import container_probe
+import exiftool_daemon
+from title_resolver import suggest_imdbid
+from metrics import Metrics, get_metrics
+from rename_journal import get_journal
+from relocate import relocate_tree
+from probe_cache import ProbeCache, get_probe_cache, entry_stat
 from OSAgnostics import (
     DirEntry,
     EXIFTOOL,
     PATH_SEP,
     EXIFTOOL_OPTS,
-    OMDB_URL,
-    OMDB_APIKEY,
     RESOLUTIONS,
     RESOLUTIONS_STR,
+    RESOLVE_THRESHOLD,
 )
 
 
-@dataclass
+# slotted, and holding interned strings and small ints, as a library has millions of media
+@dataclass(slots=True)
 class Medium:
     title: str = None
     year: str = None
@@ -40,7 +50,14 @@ class Movie:
             + r')(p|i))\]\.(mkv|mp4|avi|ts|wmv)$'),
         flags=re.IGNORECASE
     )
-    def __init__(self, path: str) -> None:
+    # each backend returns frame heights for the paths it could read; one-shot exiftool is the last resort
+    PROBE_BACKENDS: list[Callable[[list[str]], dict[str, int]]] = [
+        container_probe.probe_heights,
+        exiftool_daemon.probe_heights,
+    ]
+
+    def __init__(self, path: str, probe: bool = False, resolve_threshold: float = RESOLVE_THRESHOLD,
+                 verify_sample: float = 0.0) -> None:
         self._path: str = path
         self._name: str = path.split(sep=PATH_SEP)[-1]
         self._parent: str = PATH_SEP.join(path.split(sep=PATH_SEP)[:-1])
@@ -49,7 +66,19 @@ class Movie:
         self._imdbid: str = None
         self._need_fix: bool = False
         self._media: dict[str, Medium] = None
+        self._unprobed: dict[str, os.stat_result] = {}
+        # media whose resolution came from a name tag, picked to be probed anyway (--verify-sample)
+        self._unverified: dict[str, os.stat_result] = {}
+        self._verify_sample: float = verify_sample
+        self._resolution_checks: Counter = Counter()
+        self._resolve_threshold: float = resolve_threshold
+        self._notes: list[str] = []
+        self._renames: list[tuple[str, str]] = []
+        self._relocation: tuple[str, str] = None
+        self._skip_reason: str = None
         self._decompose()
+        if probe:
+            self.probe_media()
 
     def _decompose(self) -> None:
         match: re.Match = Movie.MOVIE_COMPLIANT.fullmatch(self._name)
@@ -59,19 +88,16 @@ class Movie:
             self._year = groups[1]
             self._imdbid = groups[3]
         else:
-            match = re.search(r'\[imdbid-(tt\d+)\]', self._name)
-            if match:
-                self._imdbid = match.groups()[0]
-                self._need_fix = True
-            else:
-                self._imdbid = None
-                self._need_fix = False
-                print('!!! Please include [imdbid-ttXXXXXX] in the movie folder name.')
-
-        entries: list[DirEntry] = [i for i in os.scandir(self._path) if i.is_file()]
-        entries = [
-            i for i in entries if re.match(r'^.*\.(mkv|mp4|avi|ts|wmv)$', i.name, flags=re.IGNORECASE)
-        ]
+            self._imdbid = find_imdbid(self._name)
+            self._need_fix = bool(self._imdbid)
+
+        entries: list[DirEntry] = media_files(self._path)
+        if not self._imdbid:
+            names: list[str] = [self._name] + [i.name for i in entries]
+            self._imdbid = suggest_imdbid(names, 'movie', self._resolve_threshold, self._note)
+            self._need_fix = bool(self._imdbid)
+            if not self._imdbid:
+                self._note('!!! Please include [imdbid-ttXXXXXX] in the movie folder name.')
         if len(entries) > 0:
             media: dict[str, Medium] = {}
             for entry in entries:
@@ -79,50 +105,84 @@ class Movie:
                 match = Movie.MEDIUM_COMPLIANT.fullmatch(entry.name)
                 if match:
                     groups = match.groups()
-                    medium.title = groups[0]
-                    medium.year = groups[1]
+                    medium.title = intern(groups[0])
+                    medium.year = intern(groups[1])
                     medium.is_3d = groups[3] is not None
                     medium.d3_format = groups[4] if medium.is_3d else medium.d3_format
                     medium.part_no = int(groups[6]) if groups[5] else None
-                    medium.resolution = groups[7]
-                    medium.extension = groups[10]
+                    medium.resolution = intern(groups[7])
+                    medium.extension = intern(groups[10])
                 else:
-                    medium.resolution = Movie.get_resolution(entry.path)
-                    match = re.search(r'(ftab|hsbs|fsbs)', entry.name, flags=re.IGNORECASE)
-                    if match:
-                        medium.is_3d = True
-                        medium.d3_format = match.groups()[0].upper()
-                    medium.extension = entry.name.split(sep='.')[-1]
-                    match = re.search(r'(part|cd|disc)[ \-_]*(\d+)', entry.name, flags=re.IGNORECASE)
-                    if match:
-                        medium.part_no = int(match.groups()[1])
+                    height: int = find_resolution(entry.name)
+                    if height and height <= RESOLUTIONS[-1]:
+                        # the name says it (1080p, 4K...): no probe, unless sampled to check such names
+                        medium.resolution = Movie.to_resolution(height)
+                        self._resolution_checks['resolution_tags'] += 1
+                        if self._verify_sample and random.random() < self._verify_sample:
+                            self._unverified[entry.name] = entry_stat(entry)
+                    else:
+                        self._unprobed[entry.name] = entry_stat(entry)
+                    medium.d3_format = find_d3_format(entry.name)
+                    medium.is_3d = medium.d3_format is not None
+                    medium.extension = extension(entry.name)
+                    medium.part_no = find_part_no(entry.name)
                     self._need_fix = True
                 media[entry.name] = medium
             self._media = media
 
         return
 
+    def probe_media(self) -> None:
+        """Resolve, in one batch, the media whose names don't carry a resolution and those sampled to verify theirs."""
+        if not self._unprobed and not self._unverified:
+            return
+        stats: dict[str, os.stat_result] = {
+            f"{self._path}{PATH_SEP}{i}": st for i, st in (self._unprobed | self._unverified).items()
+        }
+        resolutions: dict[str, str] = Movie.get_cached_resolutions(stats)
+        for name in self._unprobed:
+            self._media[name].resolution = resolutions.get(f"{self._path}{PATH_SEP}{name}")
+        for name in self._unverified:
+            probed: str = resolutions.get(f"{self._path}{PATH_SEP}{name}")
+            self._resolution_checks['resolution_tags_verified'] += 1
+            if probed and probed != self._media[name].resolution:
+                # the container is right: the name gets its real resolution
+                self._resolution_checks['resolution_tags_wrong'] += 1
+                self._note(f"!!! <{name}> says {self._media[name].resolution} but the video is {probed}")
+                self._media[name].resolution = probed
+        (self._unprobed, self._unverified) = ({}, {})
+
+    def needs_probe(self) -> bool:
+        """Whether fix() will probe: media whose names lack a resolution, in a folder it will not refuse."""
+        return (len(self._unprobed) > 0 or len(self._unverified) > 0) and bool(self._imdbid)
+
     def need_fix(self) -> bool:
         if not self._need_fix:
             self._need_fix = self._need_fix or self._title is None or self._year is None
         if not self._need_fix:
-            for medium in self._media.values():
+            for medium in (self._media or {}).values():
                 self._need_fix = self._need_fix or self._title != medium.title or self._year != medium.year
         self._need_fix = self._need_fix and self._imdbid
 
         return self._need_fix
 
-    def fix(self, dry_run: bool = False) -> None:
+    def fix(self, dry_run: bool = False) -> bool:
         if not self._imdbid:
-            print(f"--- cannot fix without a known imdbid")
-            return
+            self._skip("cannot fix without a known imdbid")
+            return False
         if not self.need_fix():
-            print(f"--- no need to fix as it's already compliant")
-            return
-        (self._title, self._year, _) = Movie.get_omdb_details(self._imdbid)
+            self._note("--- no need to fix as it's already compliant")
+            return True
+        (title, year, _) = Movie.get_omdb_details(self._imdbid)
+        if not title or not year:
+            self._skip(f"cannot fix as OMDb has no details for <{self._imdbid}>")
+            return False
+        (self._title, self._year) = (title, year)
+        # probed only now that the folder is going to be renamed (a no-op if the probe stage got there first)
+        self.probe_media()
         # rename the media first
         rename_media: dict[str, str] = {}
-        for name, medium in self._media.items():
+        for name, medium in (self._media or {}).items():
             medium.title = self._title
             medium.year = self._year
             new_name: str = f"{medium.title} ({medium.year}) "
@@ -133,29 +193,107 @@ class Movie:
             new_name += f"- [{medium.resolution}].{medium.extension}"
             rename_media[name] = new_name
         if len(rename_media) > len(set(rename_media.values())):
-            print(f"--- cannot fix as 2 or more media are identical")
-            return
+            self._skip("cannot fix as 2 or more media are identical")
+            return False
         for old, new in rename_media.items():
             if old != new:
-                print(f"+++ <{old}> ==> <{new}>")
-                if not dry_run:
-                    shutil.move(f"{self._path}{PATH_SEP}{old}", f"{self._path}{PATH_SEP}{new}")
-                    self._media[new] = self._media.pop(old)
+                self._note(f"+++ <{old}> ==> <{new}>")
+                self._renames.append((f"{self._path}{PATH_SEP}{old}", f"{self._path}{PATH_SEP}{new}"))
             else:
-                print(f"--- no change for identical old/new media <{old}>")
+                self._note(f"--- no change for identical old/new media <{old}>")
         # then rename the movie
         new_movie_name: str = f"{self._title} ({self._year}) [imdbid-{self._imdbid}]"
         if self._name != new_movie_name:
-            print(f"+++ <{self._name}> ==> <{new_movie_name}>")
-            if not dry_run:
-                shutil.move(self._path, f"{self._parent}{PATH_SEP}{new_movie_name}")
+            self._note(f"+++ <{self._name}> ==> <{new_movie_name}>")
+            self._renames.append((self._path, f"{self._parent}{PATH_SEP}{new_movie_name}"))
+        else:
+            self._note(f"--- no change for identical movie <{self._name}>")
+
+        if not dry_run:
+            # one journaled transaction: the media and the folder are renamed together or not at all
+            get_journal().execute(self._renames)
+            if self._media:
+                self._media = {rename_media.get(name, name): medium for name, medium in self._media.items()}
+            if self._name != new_movie_name:
                 self._name = new_movie_name
                 self._path = f"{self._parent}{PATH_SEP}{new_movie_name}"
-                self._need_fix = False
-        else:
-            print(f"--- no change for identical movie <{self._name}>")
+            self._need_fix = False
 
-        return
+        return True
+
+    def relocate(self, target: str, dry_run: bool = False) -> int:
+        """Moves the (fixed) movie folder into the target library folder; returns the bytes copied to get it there."""
+        source: str = self._path
+        if dry_run and self._renames and self._renames[-1][0] == self._path:
+            # where the dry run's folder rename would have put it
+            source = self._renames[-1][1]
+        destination: str = f"{target}{PATH_SEP}{source.split(sep=PATH_SEP)[-1]}"
+        if destination == source:
+            return 0
+        self._note(f"+++ relocate <{source}> ==> <{destination}>")
+        self._relocation = (source, destination)
+        if dry_run:
+            return 0
+        copied: int = relocate_tree(self._path, destination)
+        (self._parent, self._path) = (target, destination)
+
+        return copied
+
+    def refuse(self, reason: str, note: str = None) -> bool:
+        """Leaves the folder alone for a reason found outside it, as fix() does for one found inside."""
+        self._skip(reason)
+        if note:
+            self._note(note)
+        return False
+
+    def _note(self, message: str) -> None:
+        self._notes.append(message)
+
+    def _skip(self, reason: str) -> None:
+        if self._unprobed:
+            get_metrics().count('probes_avoided', len(self._unprobed))
+        self._skip_reason = reason
+        self._note(f"--- {reason}")
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def notes(self) -> list[str]:
+        """What parsing and fix() did or would do, in order, as the lines they used to print."""
+        return self._notes
+
+    @property
+    def renames(self) -> list[tuple[str, str]]:
+        """(old path, new path) of every rename fix() applied, or planned on a dry run, in order."""
+        return self._renames
+
+    @property
+    def relocation(self) -> tuple[str, str] | None:
+        """(folder, its path under --target) once relocate() moved it, or planned to on a dry run."""
+        return self._relocation
+
+    @property
+    def media(self) -> dict[str, Medium]:
+        """Media by file name (their new names once fix() renamed them)."""
+        return self._media or {}
+
+    @property
+    def resolution_checks(self) -> Counter:
+        """Resolutions taken from name tags, and how many of those were probed to verify them and were wrong."""
+        return self._resolution_checks
+
+    @property
+    def skip_reason(self) -> str | None:
+        return self._skip_reason
+
+    @property
+    def imdbid(self) -> str:
+        return self._imdbid
+
+    def media_count(self) -> int:
+        return len(self._media or {})
 
     def dry_run(self) -> None:
         self.fix(dry_run=True)
@@ -195,26 +333,14 @@ class Movie:
     def get_omdb_details(imdbid: str) -> tuple[str | None]:
         title, year = None, None
         if imdbid:
-            query_params: dict[str, str] = {
-                "apikey": OMDB_APIKEY,
-                "i": imdbid,
-                # "type": "movie",
-                "r": "json",
-            }
-            resp: requests.Response = requests.get(OMDB_URL, params=query_params)
-            if resp.status_code // 100 == 2:
-                result: dict = resp.json()
-                if result["Response"] == "True":
-                    good_title: str = re.sub(r'[ /\\:\*<>\|\?]+', ' ', result["Title"])
-                    (title, year, imdbid) = (
-                        good_title,
-                        result["Year"],
-                        result["imdbID"],
-                    )
-            elif resp.status_code // 100 == 4:
-                result: dict = resp.json()
-                if result["Error"] == "Request limit reached!":
-                    raise Exception(f'!!! Reached daily limit when retrieve details for "{imdbid}"')
+            result: dict = query_omdb(imdbid)
+            if result and result["Response"] == "True":
+                good_title: str = re.sub(r'[ /\\:\*<>\|\?]+', ' ', result["Title"])
+                (title, year, imdbid) = (
+                    good_title,
+                    result["Year"],
+                    result["imdbID"],
+                )
 
         return (title, year, imdbid)
 
@@ -273,8 +399,56 @@ class Movie:
 
     #     return media
 
+    @staticmethod
+    def get_cached_resolutions(stats: dict[str, os.stat_result]) -> dict[str, str]:
+        cache: ProbeCache = get_probe_cache()
+        heights: dict[str, int] = {}
+        misses: dict[str, os.stat_result] = {}
+        for path, st in stats.items():
+            height: int = cache.get(st)
+            if height:
+                heights[path] = height
+            else:
+                misses[path] = st
+        probed: dict[str, int] = Movie.get_heights(list(misses))
+        cache.put_many([(misses[path], height) for path, height in probed.items()])
+        heights.update(probed)
+
+        return {path: Movie.to_resolution(height) for path, height in heights.items()}
+
+    @staticmethod
+    def get_resolutions(medium_paths: list[str]) -> dict[str, str]:
+        return {path: Movie.to_resolution(height) for path, height in Movie.get_heights(medium_paths).items()}
+
+    @staticmethod
+    def get_heights(medium_paths: list[str]) -> dict[str, int]:
+        heights: dict[str, int] = {}
+        pending: list[str] = list(medium_paths)
+        metrics: Metrics = get_metrics()
+        for backend in Movie.PROBE_BACKENDS:
+            if not pending:
+                break
+            with metrics.timer('probe_seconds', backend=backend.__module__):
+                heights.update(backend(pending))
+            metrics.count('probes', len(pending), backend=backend.__module__)
+            pending = [i for i in pending if i not in heights]
+        for medium_path in pending:
+            with metrics.timer('probe_seconds', backend='exiftool'):
+                heights[medium_path] = Movie.get_height(medium_path)
+            metrics.count('probes', backend='exiftool')
+
+        return heights
+
+    @staticmethod
+    def to_resolution(height: int) -> str:
+        return intern(f"{min([i for i in RESOLUTIONS if i >= height])}p")
+
     @staticmethod
     def get_resolution(medium_path: str) -> str:
+        return Movie.to_resolution(Movie.get_height(medium_path))
+
+    @staticmethod
+    def get_height(medium_path: str) -> int:
         proc = subprocess.Popen(
             args=[EXIFTOOL] + EXIFTOOL_OPTS + [medium_path],
             stdout=subprocess.PIPE,
@@ -286,9 +460,8 @@ class Movie:
         # meta_info = json.loads(result.decode('utf-8'))[0]
         meta_info = json.loads(result)[0]
         resolution: int = int(meta_info["Composite"]["ImageSize"].split(sep="x")[1])
-        res: str = f"{min([i for i in RESOLUTIONS if i >= resolution])}p"
 
-        return res
+        return resolution
 
     # @staticmethod
     # def is_movie_compliant(name: str):
@@ -309,4 +482,5 @@ if __name__ == "__main__":
     movie: Movie = Movie(movie_path)
     print(movie)
     movie.dry_run()
+    print("\n".join(movie.notes))
     # movie.fix()
@@ -0,0 +1,53 @@
+from collections import Counter
+from omdb_cache import OmdbCache, get_cache
+from omdb_client import OmdbClient, get_client
+from imdb_index import ImdbIndex, get_index
+
+
+def request_omdb(imdbid: str, type: str = None) -> dict | None:
+    return get_client().lookup(imdbid, type)
+
+
+def query_index(imdbid: str, type: str = None) -> dict | None:
+    """The offline IMDb index's answer for imdbid, if an index has been imported and knows it."""
+    index: ImdbIndex = get_index()
+    return index.omdb_record(imdbid, type) if index else None
+
+
+def query_omdb(imdbid: str, type: str = None) -> dict | None:
+    """Look up imdbid in the offline IMDb index, then the shared on-disk cache, hitting OMDb only on a miss.
+
+    "Response": "False" answers are cached too (for a shorter TTL); quota and
+    transport errors are not.
+    """
+    result: dict | None = query_index(imdbid, type)
+    if result is not None:
+        return result
+
+    return get_cache().get_or_fetch(imdbid, type or '', lambda: request_omdb(imdbid, type))
+
+
+async def query_omdb_async(client: OmdbClient, imdbid: str, type: str = None, counters: Counter = None) -> dict | None:
+    """query_omdb for callers that already run an event loop with their own client.
+
+    counters, if given, gets one of imdb_index_hits, omdb_cache_hits or omdb_requests, and omdb_failures
+    when OMDb did not answer.
+    """
+    counters = counters if counters is not None else Counter()
+    result: dict | None = query_index(imdbid, type)
+    if result is not None:
+        counters['imdb_index_hits'] += 1
+        return result
+    cache: OmdbCache = get_cache()
+    result = cache.get(imdbid, type or '')
+    if result is None:
+        counters['omdb_requests'] += 1
+        result = await client.lookup(imdbid, type)
+        if result is not None:
+            cache.put(imdbid, type or '', result)
+        else:
+            counters['omdb_failures'] += 1
+    else:
+        counters['omdb_cache_hits'] += 1
+
+    return result
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Callable
+from OSAgnostics import (
+    OMDB_CACHE,
+    OMDB_CACHE_TTL,
+    OMDB_CACHE_NEGATIVE_TTL,
+    OMDB_CACHE_MAX_ENTRIES,
+)
+
+
+class OmdbCache:
+    """Persistent OMDb response cache shared by every worker process.
+
+    Rows are keyed by (imdbid, kind). A worker that misses takes a short lease on
+    the row before going to the network, so other workers asking for the same id
+    wait for the answer instead of repeating the request.
+    """
+
+    LEASE_SECONDS: float = 30.0
+    POLL_SECONDS: float = 0.05
+    EVICT_EVERY: int = 256
+
+    def __init__(
+        self,
+        path: str = OMDB_CACHE,
+        ttl: int = OMDB_CACHE_TTL,
+        negative_ttl: int = OMDB_CACHE_NEGATIVE_TTL,
+        max_entries: int = OMDB_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self._path: str = path
+        self._ttl: int = ttl
+        self._negative_ttl: int = negative_ttl
+        self._max_entries: int = max_entries
+        self._puts: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS omdb ('
+            ' imdbid TEXT NOT NULL,'
+            ' kind TEXT NOT NULL,'
+            ' payload TEXT,'
+            ' ok INTEGER,'
+            ' fetched_at REAL,'
+            ' leased_until REAL,'
+            ' PRIMARY KEY (imdbid, kind)'
+            ') WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS omdb_fetched_at ON omdb (fetched_at)')
+        self.evict()
+
+    def _is_fresh(self, ok: int, fetched_at: float, now: float) -> bool:
+        ttl: int = self._ttl if ok else self._negative_ttl
+        return fetched_at is not None and now - fetched_at < ttl
+
+    def get(self, imdbid: str, kind: str = '') -> dict | None:
+        row = self._conn.execute(
+            'SELECT payload, ok, fetched_at FROM omdb WHERE imdbid = ? AND kind = ?', (imdbid, kind)
+        ).fetchone()
+        if row and row[0] is not None and self._is_fresh(row[1], row[2], time.time()):
+            self.hits += 1
+            return json.loads(row[0])
+
+        return None
+
+    def get_or_fetch(self, imdbid: str, kind: str, fetch: Callable[[], dict | None]) -> dict | None:
+        """Return the cached response for (imdbid, kind), calling fetch() at most once across processes.
+
+        fetch() returns the decoded OMDb response, or None when the answer must not be cached.
+        """
+        while True:
+            now: float = time.time()
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT payload, ok, fetched_at, leased_until FROM omdb WHERE imdbid = ? AND kind = ?',
+                    (imdbid, kind)
+                ).fetchone()
+                if row and row[0] is not None and self._is_fresh(row[1], row[2], now):
+                    self._conn.execute('COMMIT')
+                    self.hits += 1
+                    return json.loads(row[0])
+                if row and row[3] is not None and row[3] > now:
+                    self._conn.execute('COMMIT')
+                    time.sleep(OmdbCache.POLL_SECONDS)
+                    continue
+                self._conn.execute(
+                    'INSERT INTO omdb (imdbid, kind, leased_until) VALUES (?, ?, ?) '
+                    'ON CONFLICT (imdbid, kind) DO UPDATE SET leased_until = excluded.leased_until',
+                    (imdbid, kind, now + OmdbCache.LEASE_SECONDS)
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            break
+
+        self.misses += 1
+        try:
+            result: dict | None = fetch()
+        except BaseException:
+            self._release(imdbid, kind)
+            raise
+        if result is None:
+            self._release(imdbid, kind)
+        else:
+            self.put(imdbid, kind, result)
+
+        return result
+
+    def put(self, imdbid: str, kind: str, result: dict) -> None:
+        ok: int = 1 if result.get("Response") == "True" else 0
+        self._conn.execute(
+            'INSERT INTO omdb (imdbid, kind, payload, ok, fetched_at, leased_until) VALUES (?, ?, ?, ?, ?, NULL) '
+            'ON CONFLICT (imdbid, kind) DO UPDATE SET payload = excluded.payload, ok = excluded.ok, '
+            'fetched_at = excluded.fetched_at, leased_until = NULL',
+            (imdbid, kind, json.dumps(result, separators=(',', ':')), ok, time.time())
+        )
+        self._puts += 1
+        if self._puts % OmdbCache.EVICT_EVERY == 0:
+            self.evict()
+
+    def _release(self, imdbid: str, kind: str) -> None:
+        self._conn.execute(
+            'DELETE FROM omdb WHERE imdbid = ? AND kind = ? AND payload IS NULL', (imdbid, kind)
+        )
+        self._conn.execute(
+            'UPDATE omdb SET leased_until = NULL WHERE imdbid = ? AND kind = ?', (imdbid, kind)
+        )
+
+    def evict(self) -> None:
+        """Drop expired responses, then the oldest ones beyond max_entries."""
+        now: float = time.time()
+        self._conn.execute(
+            'DELETE FROM omdb WHERE (leased_until IS NULL OR leased_until < ?) AND ('
+            ' (ok = 1 AND fetched_at < ?) OR (ok = 0 AND fetched_at < ?) OR payload IS NULL)',
+            (now, now - self._ttl, now - self._negative_ttl)
+        )
+        (count,) = self._conn.execute('SELECT COUNT(*) FROM omdb').fetchone()
+        if count > self._max_entries:
+            self._conn.execute(
+                'DELETE FROM omdb WHERE (imdbid, kind) IN ('
+                ' SELECT imdbid, kind FROM omdb WHERE payload IS NOT NULL ORDER BY fetched_at LIMIT ?)',
+                (count - self._max_entries,)
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_local: threading.local = threading.local()
+
+
+def get_cache() -> OmdbCache:
+    """Per-process, per-thread handle; SQLite connections are never shared across a fork or a thread."""
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.cache, _local.pid = OmdbCache(), os.getpid()
+
+    return _local.cache
@@ -0,0 +1,281 @@
+import os
+import ssl
+import json
+import time
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit, urlencode
+from metrics import Metrics, get_metrics
+from OSAgnostics import (
+    OMDB_URL,
+    OMDB_APIKEY,
+    OMDB_CONCURRENCY,
+    OMDB_RATE,
+    OMDB_BURST,
+    OMDB_TIMEOUT,
+    OMDB_RETRIES,
+)
+
+
+class OmdbQuotaError(Exception):
+    pass
+
+
+class RetryableError(Exception):
+    pass
+
+
+def _json_object(body: bytes) -> dict | None:
+    try:
+        result = json.loads(body)
+    except ValueError:
+        return None
+    return result if isinstance(result, dict) else None
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate: float = rate
+        self._burst: float = float(burst)
+        self._tokens: float = float(burst)
+        self._updated: float = time.monotonic()
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now: float = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to the single OMDb host."""
+
+    def __init__(self, host: str, port: int, use_ssl: bool, max_idle: int) -> None:
+        self._host: str = host
+        self._port: int = port
+        self._ssl: ssl.SSLContext = ssl.create_default_context() if use_ssl else None
+        self._max_idle: int = max_idle
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.opened: int = 0
+
+    async def acquire(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer, True)
+            writer.close()
+        reader, writer = await asyncio.open_connection(self._host, self._port, ssl=self._ssl)
+        self.opened += 1
+
+        return (reader, writer, False)
+
+    def release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, reusable: bool) -> None:
+        if reusable and len(self._idle) < self._max_idle and not writer.is_closing():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle = []
+
+
+class OmdbClient:
+    """asyncio OMDb client: pooled keep-alive connections, a concurrency cap, a token-bucket
+    rate limit, jittered retries on 5xx/timeouts, and one request per in-flight (imdbid, type)."""
+
+    BACKOFF_SECONDS: float = 0.5
+
+    def __init__(
+        self,
+        base_url: str = OMDB_URL,
+        apikey: str = OMDB_APIKEY,
+        concurrency: int = OMDB_CONCURRENCY,
+        rate: float = OMDB_RATE,
+        burst: int = OMDB_BURST,
+        timeout: float = OMDB_TIMEOUT,
+        retries: int = OMDB_RETRIES,
+    ) -> None:
+        url = urlsplit(base_url)
+        self._host: str = url.hostname
+        self._path: str = url.path or '/'
+        self._apikey: str = apikey
+        self._timeout: float = timeout
+        self._retries: int = retries
+        self._concurrency: int = concurrency
+        self._rate: float = rate
+        self._burst: int = burst
+        self._pool: ConnectionPool = ConnectionPool(
+            url.hostname, url.port or (443 if url.scheme == 'https' else 80), url.scheme == 'https', concurrency
+        )
+        self._semaphore: asyncio.Semaphore = None
+        self._bucket: TokenBucket = None
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.requests: int = 0
+        self.coalesced: int = 0
+
+    def _ensure_primitives(self) -> None:
+        # created lazily so they bind to the loop that actually runs the client
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._bucket = TokenBucket(self._rate, self._burst)
+
+    async def lookup(self, imdbid: str, type: str = None) -> dict | None:
+        """Decoded OMDb answer (including "Response": "False"), or None after a non-retryable error."""
+        self._ensure_primitives()
+        key: tuple[str, str] = (imdbid, type or '')
+        if key in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+        task: asyncio.Task = asyncio.ensure_future(self._fetch(imdbid, type))
+        self._inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def lookup_many(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], dict | None]:
+        results = await asyncio.gather(*[self.lookup(imdbid, type) for imdbid, type in keys])
+
+        return dict(zip(keys, results))
+
+    async def _fetch(self, imdbid: str, kind: str = None) -> dict | None:
+        query_params: dict[str, str] = {
+            "apikey": self._apikey or '',
+            "i": imdbid,
+            "r": "json",
+        }
+        if kind:
+            query_params["type"] = kind
+        target: str = f'{self._path}?{urlencode(query_params)}'
+        metrics: Metrics = get_metrics()
+        for attempt in range(self._retries + 1):
+            if attempt:
+                metrics.count('http_retries')
+            try:
+                async with self._semaphore:
+                    await self._bucket.acquire()
+                    metrics.count('http_requests')
+                    with metrics.timer('http_request_seconds'):
+                        status, body = await asyncio.wait_for(self._get(target), self._timeout)
+                # a redirect or a page that is not JSON comes from a proxy or an outage page, like a 5xx
+                if status // 100 in (3, 5):
+                    raise RetryableError(f'HTTP {status}')
+                result: dict | None = _json_object(body)
+                if status // 100 == 2:
+                    if result is None:
+                        raise RetryableError(f'HTTP {status} with a body that is not a JSON object')
+                    return result
+                if status // 100 == 4 and result:
+                    if result.get("Error") == "Request limit reached!":
+                        raise OmdbQuotaError(f'!!! Reached daily limit when retrieve details for "{imdbid}"')
+                return None
+            except (RetryableError, asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, OSError) as ex:
+                metrics.count('http_errors', error=type(ex).__name__)
+                if attempt == self._retries:
+                    # the caller counts the title as an omdb_failure, and fix() notes it in the report
+                    metrics.count('http_gave_up')
+                    print(f'!!! giving up on OMDb details for "{imdbid}" after {attempt + 1} attempts: '
+                          f'{type(ex).__name__}: {str(ex)}')
+                    return None
+                await asyncio.sleep(random.uniform(0, OmdbClient.BACKOFF_SECONDS * 2 ** attempt))
+
+        return None
+
+    async def _get(self, target: str) -> tuple[int, bytes]:
+        request: bytes = (
+            f'GET {target} HTTP/1.1\r\n'
+            f'Host: {self._host}\r\n'
+            'Accept: application/json\r\n'
+            'Connection: keep-alive\r\n'
+            '\r\n'
+        ).encode('ascii')
+        reader, writer, reused = await self._pool.acquire()
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line: bytes = await reader.readline()
+            if not status_line and reused:
+                # the server dropped an idle keep-alive connection; retry once on a fresh one
+                writer.close()
+                reader, writer, reused = await self._pool.acquire()
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError('connection closed before response')
+            status: int = int(status_line.split()[1])
+            headers: dict[str, str] = {}
+            while True:
+                line: bytes = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                chunks: list[bytes] = []
+                while True:
+                    size: int = int((await reader.readline()).split(b';')[0], 16)
+                    if size == 0:
+                        await reader.readline()
+                        break
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readline()
+                body: bytes = b''.join(chunks)
+            elif 'content-length' in headers:
+                body = await reader.readexactly(int(headers['content-length']))
+            else:
+                body = await reader.read()
+                headers['connection'] = 'close'
+            self.requests += 1
+        except BaseException:
+            writer.close()
+            raise
+        self._pool.release(reader, writer, headers.get('connection', '').lower() != 'close')
+
+        return (status, body)
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+class BackgroundClient:
+    """Runs an OmdbClient on its own event loop thread so synchronous code can share it."""
+
+    def __init__(self, client: OmdbClient = None) -> None:
+        self._loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._thread: threading.Thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.client: OmdbClient = client or OmdbClient()
+
+    def lookup(self, imdbid: str, type: str = None) -> dict | None:
+        return asyncio.run_coroutine_threadsafe(self.client.lookup(imdbid, type), self._loop).result()
+
+    def lookup_many(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], dict | None]:
+        return asyncio.run_coroutine_threadsafe(self.client.lookup_many(keys), self._loop).result()
+
+
+_client: BackgroundClient = None
+_client_pid: int = None
+
+
+def get_client() -> BackgroundClient:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = BackgroundClient()
+        _client_pid = os.getpid()
+
+    return _client
@@ -0,0 +1,271 @@
+import time
+import queue
+import asyncio
+import threading
+import multiprocessing
+from typing import Any, Callable, Iterable, Iterator
+from dataclasses import dataclass
+from concurrent import futures
+from autotune import AdaptiveLimit, StageStats, Tuner
+
+THREAD: str = 'thread'
+PROCESS: str = 'process'
+ASYNC: str = 'async'
+
+QUEUE_SIZE: int = 64
+# PROCESS stage workers start after the stage threads are running, so they must not be forked from this
+# process: a child forked while another thread holds a lock (SQLite's, the allocator's) can hang on it for ever
+START_METHOD: str = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class _End:
+    pass
+
+
+END: _End = _End()
+
+
+@dataclass
+class Failed:
+    item: Any
+    stage: str
+    error: BaseException
+
+
+@dataclass
+class Stage:
+    """One step of a Pipeline.
+
+    fn takes an item and returns the item for the next stage. THREAD and PROCESS
+    stages run fn on up to `workers` threads/processes, ASYNC stages await fn with
+    at most `workers` calls in flight on one event loop. Items for which accepts()
+    is false bypass fn and go straight to the next stage.
+
+    With autotune, THREAD and PROCESS stages start at `initial` workers and the
+    pipeline's Tuner moves them between 1 and `workers`.
+    """
+    name: str
+    fn: Callable
+    kind: str = THREAD
+    workers: int = 1
+    accepts: Callable[[Any], bool] = None
+    autotune: bool = False
+    initial: int = None
+
+
+class Pipeline:
+    """Stages connected by bounded queues: items stream through with backpressure
+    and results are yielded in completion order."""
+
+    def __init__(self, stages: list[Stage], queue_size: int = QUEUE_SIZE, tuner: Tuner = None) -> None:
+        self._stages: list[Stage] = stages
+        self._queues: list[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self._threads: list[threading.Thread] = []
+        self._pools: list[futures.Executor] = []
+        self._tuner: Tuner = tuner
+        self._limits: dict[str, AdaptiveLimit] = {}
+        self._stats: dict[str, StageStats] = {}
+        self._cancelled: threading.Event = threading.Event()
+        for index, stage in enumerate(stages):
+            initial: int = stage.initial if stage.autotune and stage.initial else stage.workers
+            self._limits[stage.name] = AdaptiveLimit(initial, 1, stage.workers)
+            self._stats[stage.name] = StageStats()
+            if stage.autotune and tuner and stage.kind != ASYNC:
+                tuner.watch(stage.name, self._limits[stage.name], self._stats[stage.name], self._queues[index])
+
+    @property
+    def queues(self) -> list[queue.Queue]:
+        return self._queues
+
+    def limits(self) -> dict[str, int]:
+        return {name: limit.limit for name, limit in self._limits.items()}
+
+    def stats(self) -> dict[str, StageStats]:
+        return self._stats
+
+    def run(self, source: Iterable) -> Iterator[Any]:
+        self._spawn(self._feed, source)
+        for index, stage in enumerate(self._stages):
+            runner: Callable = {
+                THREAD: self._run_threads,
+                PROCESS: self._run_processes,
+                ASYNC: self._run_async,
+            }[stage.kind]
+            runner(stage, self._queues[index], self._queues[index + 1])
+        output: queue.Queue = self._queues[-1]
+        if self._tuner:
+            self._tuner.start()
+        finished: bool = False
+        try:
+            while True:
+                item = output.get()
+                if item is END:
+                    finished = True
+                    break
+                yield item
+        finally:
+            if not finished:
+                # the consumer gave up early: every stage now drops what it gets, and what is left is
+                # drained here, so no thread stays blocked on a full queue while it is joined
+                self._cancelled.set()
+                while output.get() is not END:
+                    pass
+            if self._tuner:
+                self._tuner.stop()
+            for thread in self._threads:
+                thread.join()
+            for pool in self._pools:
+                pool.shutdown()
+
+    def _spawn(self, target: Callable, *args) -> None:
+        thread: threading.Thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _feed(self, source: Iterable) -> None:
+        try:
+            for item in source:
+                if self._cancelled.is_set():
+                    break
+                self._queues[0].put(item)
+        except Exception as ex:
+            self._queues[-1].put(Failed(None, 'source', ex))
+        self._queues[0].put(END)
+
+    def _bypass(self, stage: Stage, item: Any) -> bool:
+        return isinstance(item, Failed) or (stage.accepts is not None and not stage.accepts(item))
+
+    def _fail(self, item: Any, stage: Stage, ex: BaseException) -> None:
+        # failed items skip the remaining stages
+        self._queues[-1].put(Failed(item, stage.name, ex))
+
+    def _run_threads(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        remaining: list[int] = [stage.workers]
+        lock: threading.Lock = threading.Lock()
+        limit: AdaptiveLimit = self._limits[stage.name]
+        stats: StageStats = self._stats[stage.name]
+
+        def work() -> None:
+            while True:
+                limit.acquire()
+                try:
+                    item = inbox.get()
+                    if item is END:
+                        inbox.put(END)
+                        break
+                    if self._cancelled.is_set():
+                        continue
+                    if self._bypass(stage, item):
+                        outbox.put(item)
+                        continue
+                    started: float = time.monotonic()
+                    try:
+                        result = stage.fn(item)
+                    except Exception as ex:
+                        self._fail(item, stage, ex)
+                        continue
+                    stats.record(time.monotonic() - started)
+                    outbox.put(result)
+                finally:
+                    limit.release()
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    outbox.put(END)
+
+        for _ in range(stage.workers):
+            self._spawn(work)
+
+    def _run_processes(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        pool: futures.ProcessPoolExecutor = futures.ProcessPoolExecutor(
+            max_workers=stage.workers, mp_context=multiprocessing.get_context(START_METHOD)
+        )
+        self._pools.append(pool)
+        # bounds the in-flight submissions, so memory stays flat however big the source is
+        slots: AdaptiveLimit = self._limits[stage.name]
+        stats: StageStats = self._stats[stage.name]
+        done: queue.SimpleQueue = queue.SimpleQueue()
+
+        def dispatch() -> None:
+            submitted: int = 0
+            while True:
+                item = inbox.get()
+                if item is END:
+                    break
+                if self._cancelled.is_set():
+                    continue
+                if self._bypass(stage, item):
+                    outbox.put(item)
+                    continue
+                slots.acquire()
+                started: float = time.monotonic()
+                future: futures.Future = pool.submit(stage.fn, item)
+                future.add_done_callback(
+                    lambda f, item=item, started=started: done.put((item, f, time.monotonic() - started))
+                )
+                submitted += 1
+            done.put((END, submitted, 0.0))
+
+        def collect() -> None:
+            collected, total = 0, None
+            while total is None or collected < total:
+                item, future, seconds = done.get()
+                if item is END:
+                    total = future
+                    continue
+                slots.release()
+                collected += 1
+                if self._cancelled.is_set():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as ex:
+                    self._fail(item, stage, ex)
+                else:
+                    stats.record(seconds)
+                    outbox.put(result)
+            outbox.put(END)
+
+        self._spawn(dispatch)
+        self._spawn(collect)
+
+    def _run_async(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue) -> None:
+
+        async def main() -> None:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            loop.set_default_executor(futures.ThreadPoolExecutor(max_workers=2))
+            local: asyncio.Queue = asyncio.Queue(maxsize=stage.workers)
+
+            async def work() -> None:
+                while True:
+                    item = await local.get()
+                    if item is END:
+                        break
+                    if self._cancelled.is_set():
+                        continue
+                    try:
+                        result = await stage.fn(item)
+                    except Exception as ex:
+                        # a full output queue must not block the loop, and every other lookup in flight with it
+                        await loop.run_in_executor(None, self._fail, item, stage, ex)
+                        continue
+                    await loop.run_in_executor(None, outbox.put, result)
+
+            workers: list[asyncio.Task] = [asyncio.ensure_future(work()) for _ in range(stage.workers)]
+            while True:
+                item = await loop.run_in_executor(None, inbox.get)
+                if item is END:
+                    break
+                if self._cancelled.is_set():
+                    continue
+                if self._bypass(stage, item):
+                    await loop.run_in_executor(None, outbox.put, item)
+                    continue
+                await local.put(item)
+            for _ in workers:
+                await local.put(END)
+            await asyncio.gather(*workers)
+            outbox.put(END)
+
+        self._spawn(asyncio.run, main())
+
@@ -0,0 +1,147 @@
+"""Rename plans: what a --plan dry run would do, applied later with --apply and no scanning, probing or OMDb.
+
+A plan is a JSONL file, a header line then one line per directory to change:
+
+    {"type": "plan", "version": 1, "tool": "fix_movies", "basedirs": [...], "created": ...}
+    {"type": "dir", "path": ..., "kind": "movie", "imdbid": ..., "children": 2, "nested": false,
+     "steps": [["mkdir", null, folder, null], ["rename", source, target, [inode, size, mtime_ns]], ...,
+               ["relocate", renamed folder, folder under --target, null]]}
+
+Folders are created first, then the renames run as one journaled transaction,
+then the renamed folder is relocated.
+Each rename source carries the stat fingerprint it had when it was planned; a
+directory whose sources changed since (or whose targets now exist) is skipped
+as stale, before any of its steps run.
+"""
+import os
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Iterator
+from report import TaskResult, FIXED, SKIPPED, FAILED, REPORT_BUFFER, timing
+from scan_manifest import get_manifest, verdict_for
+from rename_journal import get_journal
+from relocate import relocate_tree
+
+PLAN_VERSION: int = 1
+MKDIR: str = 'mkdir'
+RENAME: str = 'rename'
+RELOCATE: str = 'relocate'
+
+
+def fingerprint(path: str) -> list[int]:
+    """[inode, size, mtime_ns]: changes when a file is replaced or rewritten, or a directory's entries change."""
+    st: os.stat_result = os.stat(path, follow_symlinks=False)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def planned_steps(renames: list[tuple[str, str]], mkdirs: list[str] = (),
+                  relocation: tuple[str, str] = None) -> list[list]:
+    """Plan steps for the folders, (old path, new path) renames and relocation of a dry run, fingerprinted now."""
+    return ([[MKDIR, None, i, None] for i in mkdirs]
+            + [[RENAME, old, new, fingerprint(old)] for old, new in renames]
+            + ([[RELOCATE, relocation[0], relocation[1], None]] if relocation else []))
+
+
+@dataclass
+class PlanEntry:
+    path: str
+    kind: str
+    imdbid: str = None
+    children: int = 0
+    nested: bool = False
+    steps: list[list] = field(default_factory=list)
+
+
+class PlanWriter:
+    def __init__(self, path: str, tool: str, basedirs: list[str]) -> None:
+        self.path: str = path
+        self.entries: int = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8', buffering=REPORT_BUFFER)
+        self._write({'type': 'plan', 'version': PLAN_VERSION, 'tool': tool, 'basedirs': basedirs, 'created': time.time()})
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def add(self, entry: PlanEntry) -> None:
+        self._write({'type': 'dir', **asdict(entry)})
+        self.entries += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_plan(path: str, tool: str) -> Iterator[PlanEntry]:
+    """The plan's directories in order; raises ValueError for another tool's plan or an unknown version."""
+    with open(path, 'r', encoding='utf-8') as f:
+        header: dict = json.loads(f.readline() or '{}')
+        if header.get('type') != 'plan' or header.get('version') != PLAN_VERSION:
+            raise ValueError(f'{path} is not a version {PLAN_VERSION} plan')
+        if header.get('tool') != tool:
+            raise ValueError(f'{path} is a plan for {header.get("tool")}, not {tool}')
+        for line in f:
+            record: dict = json.loads(line)
+            record.pop('type', None)
+            yield PlanEntry(**record)
+
+
+def stale_step(entry: PlanEntry) -> str | None:
+    """Why entry can no longer be applied as planned, or None."""
+    renamed: set[str] = set()
+    for op, source, target, planned in entry.steps:
+        if op == RELOCATE and source not in renamed and not os.path.lexists(source):
+            return f'<{source}> is gone'
+        if op != RENAME:
+            continue
+        renamed.add(target)
+        try:
+            if fingerprint(source) != planned:
+                return f'<{source}> changed since it was planned'
+        except FileNotFoundError:
+            return f'<{source}> is gone'
+        # a case-only rename on a case-insensitive filesystem finds its own source
+        if os.path.lexists(target) and not os.path.samefile(source, target):
+            return f'<{target}> already exists'
+
+    return None
+
+
+def apply_entry(entry: PlanEntry, manifest: str = None) -> TaskResult:
+    result: TaskResult = TaskResult(path=entry.path, kind=entry.kind, imdbid=entry.imdbid)
+    with timing(result.timings, 'apply'):
+        reason: str = stale_step(entry)
+        if reason:
+            (result.status, result.reason) = (SKIPPED, f'stale plan: {reason}')
+            result.notes.append(f'--- {result.reason}')
+            return result
+        renames: list[tuple[str, str]] = [(source, target) for op, source, target, _ in entry.steps if op == RENAME]
+        try:
+            get_journal().execute(renames, mkdirs=[target for op, _, target, _ in entry.steps if op == MKDIR])
+            result.renames = renames
+            result.notes = [f'+++ <{os.path.basename(source)}> ==> <{os.path.basename(target)}>'
+                            for source, target in renames]
+            moved: list[str] = [target for source, target in renames if source == entry.path]
+            result.new_path = moved[-1] if moved else None
+            for op, source, target, _ in entry.steps:
+                if op == RELOCATE:
+                    result.counters['bytes_moved'] = relocate_tree(source, target)
+                    result.notes.append(f'+++ relocate <{source}> ==> <{target}>')
+                    result.new_path = target
+        except OSError as ex:
+            (result.status, result.error) = (FAILED, f'{type(ex).__name__}: {str(ex)}')
+            return result
+    result.status = FIXED
+    if manifest:
+        get_manifest(manifest).record(
+            result.new_path or entry.path, entry.children, verdict_for(entry.imdbid, False),
+            nested=entry.nested, old_path=entry.path
+        )
+
+    return result
+
+
+def apply_plan(path: str, tool: str, manifest: str = None) -> Iterator[TaskResult]:
+    for entry in read_plan(path, tool):
+        yield apply_entry(entry, manifest)
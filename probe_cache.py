@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+from collections import Counter
+from OSAgnostics import (
+    DirEntry,
+    PROBE_CACHE,
+)
+
+
+def entry_stat(entry: DirEntry) -> os.stat_result:
+    # DirEntry.stat() leaves st_dev/st_ino zeroed on Windows
+    return entry.stat() if os.name == "posix" else os.stat(entry.path)
+
+
+class ProbeCache:
+    """Frame heights keyed by (st_dev, st_ino), valid while st_size and st_mtime_ns are unchanged.
+
+    Keying on the inode means renaming a medium keeps its entry; rewriting it
+    changes size or mtime and the stale row is simply overwritten.
+    """
+
+    def __init__(self, path: str = PROBE_CACHE) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS probe ('
+            ' dev INTEGER NOT NULL,'
+            ' ino INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL,'
+            ' height INTEGER NOT NULL,'
+            ' PRIMARY KEY (dev, ino)'
+            ') WITHOUT ROWID'
+        )
+        self.counters: Counter = Counter()
+
+    def get(self, st: os.stat_result) -> int | None:
+        row = self._conn.execute(
+            'SELECT size, mtime_ns, height FROM probe WHERE dev = ? AND ino = ?', (st.st_dev, st.st_ino)
+        ).fetchone()
+        if row is None:
+            self.counters['probe_cache_misses'] += 1
+            return None
+        if row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            self.counters['probe_cache_stale'] += 1
+            self.counters['probe_cache_misses'] += 1
+            return None
+        self.counters['probe_cache_hits'] += 1
+
+        return row[2]
+
+    def put_many(self, items: list[tuple[os.stat_result, int]]) -> None:
+        if not items:
+            return
+        with self._conn:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO probe (dev, ino, size, mtime_ns, height) VALUES (?, ?, ?, ?, ?)',
+                [(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, height) for st, height in items]
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_local: threading.local = threading.local()
+
+
+def get_probe_cache() -> ProbeCache:
+    """Per-process, per-thread handle; SQLite connections are never shared across a fork or a thread."""
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.cache, _local.pid = ProbeCache(), os.getpid()
+
+    return _local.cache
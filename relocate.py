@@ -0,0 +1,225 @@
+"""--target: moves fixed titles into another library folder, across filesystems if need be.
+
+On the same device a title folder is one journaled rename, refused when the
+target is taken (an empty target folder is replaced). Across devices every
+file is copied in the kernel (copy_file_range, else sendfile, else a read/write
+loop) to `<target>.part`, verified against the source, renamed into place and
+only then deleted at the source. A `.part` left by an interrupted run is
+resumed from a little before its end instead of starting over; a file already
+in place whose source was not deleted yet is verified and its source deleted.
+The files of a title are copied RELOCATE_STREAMS at a time, and concurrent
+streams are capped per device, so one spindle is not thrashed by every rename
+worker at once.
+"""
+import os
+import time
+import errno
+import shutil
+import threading
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from OSAgnostics import RELOCATE_STREAMS, RELOCATE_VERIFY
+from rename_journal import check_same_device, rename_noreplace, get_journal, CrossDeviceError
+from metrics import Metrics, get_metrics
+
+PARTIAL_SUFFIX: str = '.part'
+COPY_CHUNK: int = 64 << 20
+# a resumed copy rewrites this much of the partial file's tail, which may not have reached the disk
+RESUME_BACKOFF: int = 64 << 20
+VERIFY_WINDOW: int = 1 << 20
+VERIFY_SAMPLES: int = 16
+PROGRESS_SECONDS: float = 10.0
+VERIFY_FULL: bool = RELOCATE_VERIFY == 'full'
+FALLBACK_ERRORS: frozenset[int] = frozenset([errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF])
+
+_device_slots: dict[int, threading.BoundedSemaphore] = {}
+_device_slots_lock: threading.Lock = threading.Lock()
+
+
+@contextmanager
+def device_slots(*devices: int):
+    """Holds one of RELOCATE_STREAMS slots on each device; taken in a fixed order, so two streams never deadlock."""
+    with ExitStack() as stack:
+        for device in sorted(set(devices)):
+            with _device_slots_lock:
+                slots: threading.BoundedSemaphore = _device_slots.setdefault(
+                    device, threading.BoundedSemaphore(RELOCATE_STREAMS))
+            slots.acquire()
+            stack.callback(slots.release)
+        yield
+
+
+class Progress:
+    """Bytes and files relocated so far, printed every PROGRESS_SECONDS from a ticker thread in the parent."""
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._started: float = time.perf_counter()
+        self._stop: threading.Event = threading.Event()
+        self.bytes: int = 0
+        self.files: int = 0
+
+    def add(self, size: int, files: int = 0) -> None:
+        with self._lock:
+            self.bytes += size
+            self.files += files
+
+    def line(self) -> str:
+        seconds: float = time.perf_counter() - self._started
+        return (f'=== relocated {self.bytes / (1 << 30):.2f} GiB in {self.files} files, '
+                f'{self.bytes / (1 << 20) / seconds if seconds else 0:.1f} MiB/s')
+
+    def start(self) -> None:
+        def tick() -> None:
+            last: int = 0
+            while not self._stop.wait(PROGRESS_SECONDS):
+                if self.bytes != last:
+                    last = self.bytes
+                    print(self.line())
+        threading.Thread(target=tick, name='relocate-progress', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_progress: Progress = None
+
+
+def get_progress() -> Progress:
+    global _progress
+    if _progress is None:
+        _progress = Progress()
+    return _progress
+
+
+def _copy_range(source_fd: int, target_fd: int, offset: int, size: int, progress: Progress) -> None:
+    """Copies source[offset:size] to the same offsets of target, in the kernel where it can."""
+    kernel: bool = hasattr(os, 'copy_file_range')
+    while offset < size:
+        count: int = min(COPY_CHUNK, size - offset)
+        try:
+            if kernel:
+                copied: int = os.copy_file_range(source_fd, target_fd, count, offset, offset)
+            else:
+                os.lseek(target_fd, offset, os.SEEK_SET)
+                copied = os.sendfile(target_fd, source_fd, offset, count)
+        except OSError as ex:
+            if ex.errno not in FALLBACK_ERRORS:
+                raise
+            if kernel:
+                # e.g. kernels before 5.3 refuse copy_file_range across filesystems; sendfile takes over
+                kernel = False
+                continue
+            copied = os.pwrite(target_fd, os.pread(source_fd, count, offset), offset)
+        if copied == 0:
+            raise OSError(errno.EIO, f'source shrank to {offset} bytes while being copied')
+        offset += copied
+        progress.add(copied)
+
+
+def same_content(source: str, target: str, full: bool = VERIFY_FULL) -> bool:
+    """Same size and same bytes: every byte if full, else VERIFY_SAMPLES windows spread over the file."""
+    size: int = os.path.getsize(source)
+    if os.path.getsize(target) != size:
+        return False
+    if full:
+        offsets: range = range(0, size, COPY_CHUNK)
+        window: int = COPY_CHUNK
+    else:
+        step: int = max(VERIFY_WINDOW, size // VERIFY_SAMPLES)
+        offsets = range(0, size, step)
+        window = VERIFY_WINDOW
+    with open(source, 'rb', buffering=0) as a, open(target, 'rb', buffering=0) as b:
+        for offset in list(offsets) + [max(0, size - window)]:
+            if os.pread(a.fileno(), window, offset) != os.pread(b.fileno(), window, offset):
+                return False
+
+    return True
+
+
+def copy_file(source: str, target: str, progress: Progress) -> int:
+    """Moves one file to another filesystem through target.part; returns the bytes copied by this call."""
+    metrics: Metrics = get_metrics()
+    if os.path.lexists(target):
+        # copied and renamed into place by an interrupted run that did not get to delete the source
+        if not same_content(source, target):
+            raise FileExistsError(errno.EEXIST, 'exists with other content', source, None, target)
+        os.unlink(source)
+        progress.add(0, files=1)
+        return 0
+    partial: str = target + PARTIAL_SUFFIX
+    size: int = os.path.getsize(source)
+    copied: int = 0
+    with device_slots(os.stat(source).st_dev, os.stat(os.path.dirname(target)).st_dev), \
+            metrics.timer('copy_seconds'), open(source, 'rb', buffering=0) as src:
+        fd: int = os.open(partial, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            resume: int = os.fstat(fd).st_size
+            resume = max(0, resume - RESUME_BACKOFF) if resume <= size else 0
+            if resume:
+                metrics.count('copies_resumed')
+            os.ftruncate(fd, resume)
+            _copy_range(src.fileno(), fd, resume, size, progress)
+            os.fsync(fd)
+            copied = size - resume
+        finally:
+            os.close(fd)
+    if not same_content(source, partial):
+        os.unlink(partial)
+        raise OSError(errno.EIO, 'copy does not match its source', source, None, partial)
+    shutil.copystat(source, partial)
+    rename_noreplace(partial, target)
+    os.unlink(source)
+    progress.add(0, files=1)
+    metrics.count('files_relocated')
+
+    return copied
+
+
+def _move_link(path: str, target: str) -> None:
+    """Recreates the symlink path at target (unless a resumed run already did) and removes it."""
+    if not os.path.islink(target):
+        os.symlink(os.readlink(path), target)
+    os.unlink(path)
+
+
+def relocate_tree(source: str, target: str, progress: Progress = None) -> int:
+    """Moves the folder source to target; returns the bytes copied (bytes_moved)."""
+    progress = progress or get_progress()
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        check_same_device(source, target)
+    except CrossDeviceError:
+        pass
+    else:
+        if os.path.isdir(target) and not os.path.islink(target) and not os.listdir(target):
+            os.rmdir(target)
+        elif os.path.lexists(target):
+            # merging into it would copy every byte to move what one rename can, and may clobber what is there
+            raise FileExistsError(errno.EEXIST, 'target already exists on the same device', source, None, target)
+        get_journal().execute([(source, target)])
+        return 0
+    folders: list[tuple[str, str]] = []
+    copies: list[tuple[str, str]] = []
+    for folder, dirs, files in os.walk(source):
+        destination: str = os.path.join(target, os.path.relpath(folder, source))
+        os.makedirs(destination, exist_ok=True)
+        folders.append((folder, destination))
+        for name in [i for i in dirs if os.path.islink(os.path.join(folder, i))]:
+            # a link to a folder is moved as a link, not walked
+            _move_link(os.path.join(folder, name), os.path.join(destination, name))
+            dirs.remove(name)
+        for name in files:
+            path: str = os.path.join(folder, name)
+            if os.path.islink(path):
+                _move_link(path, os.path.join(destination, name))
+            else:
+                copies.append((path, os.path.join(destination, name)))
+    # the title's files go RELOCATE_STREAMS at a time; device_slots() still caps each device overall
+    with ThreadPoolExecutor(RELOCATE_STREAMS, thread_name_prefix='relocate') as pool:
+        copied: int = sum(pool.map(lambda i: copy_file(*i, progress), copies))
+    for folder, destination in reversed(folders):
+        shutil.copystat(folder, destination)
+        os.rmdir(folder)
+
+    return copied
@@ -0,0 +1,403 @@
+"""Crash-safe renames: same-device, no-replace renames grouped in transactions and journaled before they run.
+
+    python rename_journal.py --recover          # roll back whatever an interrupted run left half done
+    python rename_journal.py --undo fix_movies  # reverse the last run of a tool
+
+The journal is an append-only JSONL file. A transaction (one directory's
+renames) is written and fsynced before its first rename, and committed after
+its last one. Several runs may share the journal, so each run holds a lock
+on a file of its own under <journal>.runs for as long as it lives; only a
+transaction without its commit whose run's lock is free was interrupted, and
+it is rolled back, last rename first. Folders a transaction creates for its
+renames (a series' `Season NN`) are journaled with it, and removed again when
+it is rolled back or undone. Undoing a run journals one transaction per
+directory reversed, so an interrupted undo recovers the same way.
+
+A title relocated across devices by --target is copied, not renamed: it is
+not journaled, and --undo leaves it (and the renames made inside it) where it is.
+"""
+import os
+import sys
+import json
+import time
+import errno
+import socket
+import ctypes
+import argparse
+import threading
+from OSAgnostics import RENAME_JOURNAL
+from metrics import Metrics, get_metrics
+
+AT_FDCWD: int = -100
+RENAME_NOREPLACE: int = 1
+# rotated (one old generation kept, for --undo) once bigger than this and nothing is pending
+JOURNAL_ROTATE_BYTES: int = 64 << 20
+UNDO: str = 'undo'
+RUNS_SUFFIX: str = '.runs'
+# how long renamed_recently() remembers the paths of a rename, for --watch to tell its own changes apart
+RECENT_SECONDS: float = 60.0
+
+if os.name == "posix":
+    import fcntl
+else:
+    import msvcrt
+
+
+class CrossDeviceError(OSError):
+    pass
+
+
+def _load_renameat2():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        fn = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_renameat2 = _load_renameat2()
+
+
+def _lock(path: str, create: bool = False) -> int | None:
+    """An fd holding the exclusive lock on path, taken without waiting; None while another process holds it.
+
+    Raises FileNotFoundError when path is gone, including when it was removed just as the lock was taken.
+    """
+    fd: int = os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o644)
+    try:
+        if os.name == "posix":
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        os.close(fd)
+        return None
+    if os.path.exists(path) and os.path.samestat(os.fstat(fd), os.stat(path)):
+        return fd
+    os.close(fd)
+    raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+
+def check_same_device(source: str, target: str) -> None:
+    """Raises CrossDeviceError unless renaming source to target is a metadata-only rename."""
+    if os.stat(source, follow_symlinks=False).st_dev != os.stat(os.path.dirname(target) or '.').st_dev:
+        raise CrossDeviceError(errno.EXDEV, 'not on the same device', source, None, target)
+
+
+def rename_noreplace(source: str, target: str) -> None:
+    """os.rename that refuses to overwrite target: atomically with renameat2 where the kernel and filesystem allow."""
+    if _renameat2 is not None:
+        if _renameat2(AT_FDCWD, os.fsencode(source), AT_FDCWD, os.fsencode(target), RENAME_NOREPLACE) == 0:
+            return
+        code: int = ctypes.get_errno()
+        # EINVAL/ENOSYS: no RENAME_NOREPLACE here; EEXIST on a case-only rename of a case-insensitive filesystem
+        if code not in (errno.EINVAL, errno.ENOSYS, errno.EEXIST) or (
+                code == errno.EEXIST and not os.path.samefile(source, target)):
+            raise OSError(code, os.strerror(code), source, None, target)
+    if os.path.lexists(target) and not os.path.samefile(source, target):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), source, None, target)
+    os.rename(source, target)
+
+
+def _remove_empty(folders: list[str]) -> None:
+    """Removes folders, last first, leaving those that are gone or no longer empty."""
+    for path in reversed(folders):
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+
+class RenameJournal:
+    def __init__(self, path: str = RENAME_JOURNAL) -> None:
+        self.path: str = path
+        self.tool: str = os.path.basename(sys.argv[0]) or 'python'
+        self.host: str = socket.gethostname()
+        self.started: float = time.time()
+        self._run: str = f'{time.strftime("%Y%m%dT%H%M%S")}-{self.host}-{os.getpid()}'
+        self._run_lock: int = None
+        self._next: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        # source and target paths of this process's renames => monotonic time they were journaled
+        self._recent: dict[str, float] = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(path + RUNS_SUFFIX, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _run_file(self, run: str) -> str:
+        return os.path.join(self.path + RUNS_SUFFIX, f'{run}.lock')
+
+    def _hold_run_lock(self) -> None:
+        """Locks this run's file until the process exits, before its first transaction is journaled."""
+        with self._lock:
+            while self._run_lock is None:
+                try:
+                    # a recovery may hold the new file for a moment, taking it for a dead run's, and remove it
+                    self._run_lock = _lock(self._run_file(self._run), create=True)
+                except FileNotFoundError:
+                    continue
+                if self._run_lock is None:
+                    time.sleep(0.01)
+
+    def _append(self, record: dict) -> None:
+        """Writes record and waits for it to reach the disk."""
+        with self._lock:
+            if os.name == "posix":
+                # runs sharing the journal append one at a time, so their records never interleave,
+                # and never while another run rotates it
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                while self._rotated():
+                    self._file.close()
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            finally:
+                if os.name == "posix":
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _rotated(self) -> bool:
+        """Whether another run moved the journal this run appends to out of the way."""
+        try:
+            return not os.path.samestat(os.fstat(self._file.fileno()), os.stat(self.path))
+        except FileNotFoundError:
+            return True
+
+    def _read(self) -> list[dict]:
+        records: list[dict] = []
+        for path in (f'{self.path}.1', self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # a torn last line: the crash came before its transaction started
+                        continue
+        return records
+
+    def execute(self, renames: list[tuple[str, str]], tool: str = None, undoes: str = None,
+                mkdirs: list[str] = (), rmdirs: list[str] = ()) -> None:
+        """Makes renames in order, as one transaction: all of them, or (on failure) none and the error re-raised.
+
+        Every source that exists up front must be on its target's device; the
+        others only appear through an earlier rename of their folder. The
+        folders of mkdirs that are missing are created before the renames, and
+        those of rmdirs removed after them if they are empty.
+        """
+        if not renames:
+            return
+        created: list[str] = [i for i in dict.fromkeys(mkdirs) if not os.path.isdir(i)]
+        for source, target in renames:
+            if os.path.lexists(source):
+                # a folder still to be made lands on the device of its own parent
+                folder: str = os.path.dirname(target)
+                check_same_device(source, folder if folder in created else target)
+        self._hold_run_lock()
+        with self._lock:
+            txn: str = f'{self._run}:{self._next}'
+            self._next += 1
+        record: dict = {'t': 'txn', 'id': txn, 'run': self._run, 'tool': tool or self.tool, 'host': self.host,
+                        'pid': os.getpid(), 'started': self.started, 'renames': renames}
+        if undoes:
+            record['undoes'] = undoes
+        if created:
+            record['mkdirs'] = created
+        if rmdirs:
+            record['rmdirs'] = list(rmdirs)
+        self._append(record)
+        self._remember(renames)
+        metrics: Metrics = get_metrics()
+        done: list[tuple[str, str]] = []
+        made: list[str] = []
+        try:
+            for path in created:
+                os.mkdir(path)
+                made.append(path)
+            for source, target in renames:
+                with metrics.timer('rename_seconds'):
+                    rename_noreplace(source, target)
+                done.append((source, target))
+        except OSError:
+            for source, target in reversed(done):
+                rename_noreplace(target, source)
+            _remove_empty(made)
+            self._append({'t': 'abort', 'id': txn})
+            raise
+        _remove_empty(rmdirs)
+        self._append({'t': 'commit', 'id': txn})
+        metrics.count('renames', len(done))
+
+    def _remember(self, renames: list[tuple[str, str]]) -> None:
+        now: float = time.monotonic()
+        with self._lock:
+            for path in [k for k, at in self._recent.items() if now - at > RECENT_SECONDS]:
+                del self._recent[path]
+            for source, target in renames:
+                self._recent[source] = self._recent[target] = now
+
+    def renamed_recently(self, path: str) -> bool:
+        """Whether this process renamed something from or to path in the last RECENT_SECONDS."""
+        with self._lock:
+            at: float = self._recent.get(path)
+        return at is not None and time.monotonic() - at <= RECENT_SECONDS
+
+    def _transactions(self) -> tuple[list[dict], set[str], set[str]]:
+        """(transactions in journal order, ids that finished one way or another, ids that committed)."""
+        (txns, finished, committed) = ([], set(), set())
+        for record in self._read():
+            if record['t'] == 'txn':
+                txns.append(record)
+            elif record['t'] in ('commit', 'abort', 'recovered'):
+                finished.add(record['id'])
+                if record['t'] == 'commit':
+                    committed.add(record['id'])
+        return (txns, finished, committed)
+
+    def _lock_dead_run(self, run: str) -> int | None:
+        """A locked fd on run's file if its process is gone (None while it lives); -1 when it left no file."""
+        if run == self._run:
+            return None
+        try:
+            return _lock(self._run_file(run))
+        except FileNotFoundError:
+            # a run that journaled before run files, or whose file a recovery already removed
+            return -1
+
+    def recover(self) -> list[tuple[str, str]]:
+        """Rolls back the transactions interrupted runs left unfinished; returns the renames reversed.
+
+        Transactions of runs still alive, here or on another host sharing the journal, are left to them.
+        """
+        (txns, finished, _) = self._transactions()
+        unfinished: list[dict] = [i for i in txns if i['id'] not in finished]
+        reversed_renames: list[tuple[str, str]] = []
+        live: int = 0
+        for run in dict.fromkeys(i['run'] for i in reversed(unfinished)):
+            fd: int | None = self._lock_dead_run(run)
+            if fd is None:
+                live += 1
+                continue
+            try:
+                for txn in [i for i in reversed(unfinished) if i['run'] == run]:
+                    for path in txn.get('rmdirs', []):
+                        os.makedirs(path, exist_ok=True)
+                    for source, target in reversed(txn['renames']):
+                        # only renames that happened: the target is there and the source is not
+                        if os.path.lexists(target) and not os.path.lexists(source):
+                            rename_noreplace(target, source)
+                            reversed_renames.append((target, source))
+                    _remove_empty(txn.get('mkdirs', []))
+                    self._append({'t': 'recovered', 'id': txn['id']})
+            finally:
+                if fd >= 0:
+                    os.unlink(self._run_file(run))
+                    os.close(fd)
+        self._forget_dead_runs()
+        if not live:
+            self._rotate()
+
+        return reversed_renames
+
+    def _forget_dead_runs(self) -> None:
+        """Removes the files of runs that ended with nothing left unfinished."""
+        with os.scandir(self.path + RUNS_SUFFIX) as entries:
+            runs: list[str] = [i.name[:-len('.lock')] for i in entries if i.name.endswith('.lock')]
+        for run in runs:
+            fd: int | None = self._lock_dead_run(run)
+            if fd is not None and fd >= 0:
+                os.unlink(self._run_file(run))
+                os.close(fd)
+
+    def undo(self, tool: str = None) -> tuple[list[tuple[str, str]], list[str]]:
+        """Reverses the last run of tool, one transaction per directory, newest first; the folders a
+        transaction created go too, if they were left empty.
+
+        Returns (renames made, errors of the directories that could not be
+        reversed); undoing again retries just those, then moves to the run before.
+        """
+        tool = tool or self.tool
+        (txns, _, committed) = self._transactions()
+        undone: set[str] = {i['undoes'] for i in txns if 'undoes' in i and i['id'] in committed}
+        pending: list[dict] = [i for i in txns if i['tool'] == tool and i['id'] in committed and i['id'] not in undone]
+        if not pending:
+            return ([], [])
+        run: str = pending[-1]['run']
+        (renames, errors) = ([], [])
+        for txn in reversed([i for i in pending if i['run'] == run]):
+            reverse: list[tuple[str, str]] = [(target, source) for source, target in reversed(txn['renames'])]
+            try:
+                self.execute(reverse, f'{tool} {UNDO}', undoes=txn['id'], mkdirs=txn.get('rmdirs', []),
+                             rmdirs=txn.get('mkdirs', []))
+            except OSError as ex:
+                errors.append(f'{type(ex).__name__}: {str(ex)}')
+                continue
+            renames.extend(reverse)
+
+        return (renames, errors)
+
+    def _rotate(self) -> None:
+        """Starts a new journal once this one is big, while no other run is appending to it."""
+        with self._lock:
+            if os.name != "posix" or os.fstat(self._file.fileno()).st_size < JOURNAL_ROTATE_BYTES:
+                return
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+            try:
+                if not self._rotated():
+                    os.replace(self.path, f'{self.path}.1')
+            finally:
+                self._file.close()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self) -> None:
+        """Closes the journal; this run's transactions are all finished, so its run file goes too."""
+        self._file.close()
+        if self._run_lock is not None:
+            os.unlink(self._run_file(self._run))
+            os.close(self._run_lock)
+            self._run_lock = None
+
+
+_journal: RenameJournal = None
+_journal_pid: int = None
+
+
+def get_journal() -> RenameJournal:
+    global _journal, _journal_pid
+    if _journal is None or _journal_pid != os.getpid():
+        _journal = RenameJournal()
+        _journal_pid = os.getpid()
+
+    return _journal
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recover", action="store_true", help="roll back transactions left uncommitted")
+    parser.add_argument("--undo", dest="undo", default=None, metavar="TOOL",
+                        help="reverse the last run of TOOL (fix_movies, fix_series)")
+    args = parser.parse_args()
+    journal: RenameJournal = get_journal()
+    for source, target in journal.recover():
+        print(f'!!! rolled back <{source}> ==> <{target}>')
+    if args.undo:
+        (renames, errors) = journal.undo(args.undo)
+        for source, target in renames:
+            print(f'+++ <{source}> ==> <{target}>')
+        for error in errors:
+            print(f'!!! could not undo: {error}')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from OSAgnostics import REPORT_DIR
+
+COMPLIANT: str = 'compliant'
+PLANNED: str = 'planned'
+FIXED: str = 'fixed'
+SKIPPED: str = 'skipped'
+FAILED: str = 'failed'
+STATUSES: tuple[str, ...] = (FIXED, PLANNED, COMPLIANT, SKIPPED, FAILED)
+REPORT_BUFFER: int = 1 << 20
+# failures listed in the summary; the report has all of them
+SUMMARY_FAILURES: int = 10
+
+
+@contextmanager
+def timing(timings: dict[str, float], stage: str):
+    """Adds the time spent in the block to timings[stage]."""
+    started: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - started, 6)
+
+
+@dataclass
+class TaskResult:
+    """What happened to one movie or series folder; one line of the JSONL report."""
+    path: str
+    kind: str
+    status: str = None
+    imdbid: str = None
+    new_path: str = None
+    renames: list[tuple[str, str]] = field(default_factory=list)
+    reason: str = None
+    error: str = None
+    notes: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    @staticmethod
+    def of(kind: str, subdir: str, title, ok: bool, dryrun: bool,
+           timings: dict[str, float] = None, counters: Counter = None) -> 'TaskResult':
+        """Result for a Movie or Series that went through fix()."""
+        if not ok:
+            status: str = SKIPPED
+        elif not title.renames:
+            status = COMPLIANT
+        else:
+            status = PLANNED if dryrun else FIXED
+
+        return TaskResult(
+            path=subdir, kind=kind, status=status, imdbid=title.imdbid,
+            new_path=title.relocation[1] if title.relocation else (
+                title.renames[-1][1] if title.renames and title.renames[-1][0] == subdir else None),
+            renames=list(title.renames), reason=title.skip_reason, notes=list(title.notes),
+            timings=dict(timings or {}), counters=dict(counters or {}),
+        )
+
+    @staticmethod
+    def failed(kind: str, subdir: str, error: Exception, title=None, timings: dict[str, float] = None) -> 'TaskResult':
+        return TaskResult(
+            path=subdir, kind=kind, status=FAILED, imdbid=title.imdbid if title else None,
+            error=f'{type(error).__name__}: {str(error)}', notes=list(title.notes) if title else [],
+            timings=dict(timings or {}),
+        )
+
+
+class Report:
+    """Streams task results to a buffered JSONL file in the parent and keeps the totals for the summary.
+
+    Only the parent writes, so worker threads and processes never wait on the
+    terminal or the report file.
+    """
+
+    def __init__(self, path: str, tool: str, dryrun: bool) -> None:
+        self.path: str = path
+        self._tool: str = tool
+        self._dryrun: bool = dryrun
+        self._started: float = time.perf_counter()
+        self.statuses: Counter = Counter()
+        self.reasons: Counter = Counter()
+        self.counters: Counter = Counter()
+        self.stage_seconds: Counter = Counter()
+        self.renames: int = 0
+        self.failures: list[TaskResult] = []
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8', buffering=REPORT_BUFFER)
+
+    def add(self, result: TaskResult) -> None:
+        self._file.write(json.dumps({'type': 'task', **asdict(result)}, ensure_ascii=False) + '\n')
+        self.statuses[result.status] += 1
+        self.renames += len(result.renames)
+        self.counters.update(result.counters)
+        self.stage_seconds.update(result.timings)
+        if result.reason:
+            self.reasons[result.reason] += 1
+        if result.status == FAILED:
+            self.failures.append(result)
+
+    def flush(self) -> None:
+        """Pushes the buffered records to the file, for a --watch run that does not end."""
+        self._file.flush()
+
+    def summary(self) -> dict:
+        seconds: float = time.perf_counter() - self._started
+        directories: int = sum(self.statuses.values())
+        return {
+            'type': 'summary',
+            'tool': self._tool,
+            'dryrun': self._dryrun,
+            'directories': directories,
+            'seconds': round(seconds, 3),
+            'throughput': round(directories / seconds, 3) if seconds else None,
+            'statuses': {i: self.statuses[i] for i in STATUSES},
+            'renames': self.renames,
+            'reasons': dict(self.reasons.most_common()),
+            'stage_seconds': {k: round(v, 3) for k, v in self.stage_seconds.items()},
+            'counters': dict(self.counters),
+        }
+
+    def close(self) -> dict:
+        """Writes the summary record, closes the file and returns the summary."""
+        summary: dict = self.summary()
+        self._file.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        self._file.close()
+        return summary
+
+    def format_summary(self, summary: dict) -> list[str]:
+        statuses: str = ', '.join(f'{k} {v}' for k, v in summary['statuses'].items())
+        lines: list[str] = [
+            f"=== {summary['directories']} directories in {summary['seconds']}s "
+            f"({summary['throughput']}/s): {statuses}",
+            f"=== {summary['renames']} renames {'planned' if self._dryrun else 'applied'}; report: {self.path}",
+        ]
+        if summary['stage_seconds']:
+            lines.append('=== stage seconds: ' + ', '.join(f'{k}={v}' for k, v in summary['stage_seconds'].items()))
+        if summary['counters']:
+            lines.append('=== counters: ' + ', '.join(f'{k}={v}' for k, v in sorted(summary['counters'].items())))
+        for reason, count in list(summary['reasons'].items())[:5]:
+            lines.append(f'--- skipped {count}x: {reason}')
+        for result in self.failures[:SUMMARY_FAILURES]:
+            lines.append(f'!!! failed <{result.path}>: {result.error}')
+        if len(self.failures) > SUMMARY_FAILURES:
+            lines.append(f'!!! ... and {len(self.failures) - SUMMARY_FAILURES} more failures in the report')
+
+        return lines
+
+
+def default_report_path(tool: str) -> str:
+    return os.path.join(REPORT_DIR, f'{tool}-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}.jsonl')
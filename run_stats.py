@@ -0,0 +1,81 @@
+import os
+import json
+import math
+import time
+import threading
+from report import FAILED, SKIPPED
+
+if os.name == "posix":
+    import resource
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    """Nearest-rank percentile of values; None when there are none."""
+    if not values:
+        return None
+    ordered: list[float] = sorted(values)
+    rank: int = min(len(ordered), max(1, math.ceil(fraction * len(ordered))))
+
+    return ordered[rank - 1]
+
+
+def peak_rss_kb() -> int | None:
+    """Peak resident set of this process plus the largest reaped child (pool workers), in KiB."""
+    if os.name != "posix":
+        return None
+    own: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children: int = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    return own + children
+
+
+class RunStats:
+    """Per-directory latencies and outcome counts of one run, for --stats-json.
+
+    Outcomes follow the statuses of the report: skipped folders (no imdbid, a shared imdbid, no OMDb title)
+    are neither ok nor failed.
+    """
+
+    def __init__(self) -> None:
+        self._started: float = time.perf_counter()
+        self._lock: threading.Lock = threading.Lock()
+        self.latencies: list[float] = []
+        self.ok: int = 0
+        self.skipped: int = 0
+        self.failed: int = 0
+
+    def record(self, started: float, status: str) -> None:
+        """Latency of a directory started at `started`, and its report status."""
+        latency: float = time.perf_counter() - started
+        with self._lock:
+            self.latencies.append(latency)
+            if status == FAILED:
+                self.failed += 1
+            elif status == SKIPPED:
+                self.skipped += 1
+            else:
+                self.ok += 1
+
+    def summary(self, **extra) -> dict:
+        seconds: float = time.perf_counter() - self._started
+        directories: int = self.ok + self.skipped + self.failed
+        return {
+            'directories': directories,
+            'ok': self.ok,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'seconds': round(seconds, 6),
+            'throughput': round(directories / seconds, 3) if seconds else None,
+            'latency_p50': percentile(self.latencies, 0.50),
+            'latency_p99': percentile(self.latencies, 0.99),
+            'latency_max': max(self.latencies, default=None),
+            'peak_rss_kb': peak_rss_kb(),
+            **extra,
+        }
+
+    def write(self, path: str, **extra) -> dict:
+        summary: dict = self.summary(**extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+            f.write('\n')
+        return summary
@@ -0,0 +1,131 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Iterable, Iterator
+from collections import Counter
+from OSAgnostics import IMDB_INDEX, SCAN_MANIFEST
+from title_resolver import get_resolver, trigram_path
+
+COMPLIANT: str = 'compliant'
+NO_IMDBID: str = 'no-imdbid'
+PENDING: str = 'pending'
+
+# verdicts that stay true for as long as the directory is untouched; NO_IMDBID only while the IMDb index
+# and its trigram file are too (see resolver_signature)
+SETTLED: tuple[str] = (COMPLIANT, NO_IMDBID)
+
+
+def dir_signature(path: str, nested: bool = False) -> str:
+    """mtime of the directory, plus the mtime of each subdirectory when titles keep media one level down.
+
+    Adding, removing or renaming a child bumps the mtime of its parent, so this
+    changes whenever a rerun could come to a different verdict.
+    """
+    parts: list[str] = [str(os.stat(path).st_mtime_ns)]
+    if nested:
+        with os.scandir(path) as nodes:
+            parts.extend(sorted(f'{i.name}={i.stat().st_mtime_ns}' for i in nodes if i.is_dir()))
+
+    return '|'.join(parts)
+
+
+def resolver_signature(index_path: str = IMDB_INDEX) -> str:
+    """Size and mtime of the IMDb index and its trigram file, `-` for each that is missing.
+
+    A folder without an imdbid may be matched once they are imported or rebuilt.
+    """
+    parts: list[str] = []
+    for path in (index_path, trigram_path(index_path)):
+        try:
+            st: os.stat_result = os.stat(path)
+            parts.append(f'{st.st_size}:{st.st_mtime_ns}')
+        except OSError:
+            parts.append('-')
+
+    return 'resolver=' + ','.join(parts)
+
+
+def verdict_for(imdbid: str, need_fix: bool) -> str:
+    if not imdbid:
+        # the resolver had its chance and found no match; a rerun with another threshold still may
+        return PENDING if get_resolver() else NO_IMDBID
+
+    return PENDING if need_fix else COMPLIANT
+
+
+class ScanManifest:
+    """Per-directory record of the last scan: signature, number of media and verdict."""
+
+    def __init__(self, path: str = SCAN_MANIFEST, index_path: str = IMDB_INDEX) -> None:
+        self._index_path: str = index_path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS manifest ('
+            ' path TEXT PRIMARY KEY,'
+            ' signature TEXT NOT NULL,'
+            ' children INTEGER NOT NULL,'
+            ' verdict TEXT NOT NULL,'
+            ' scanned_at REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+
+    def is_unchanged(self, path: str, nested: bool = False) -> bool:
+        """True if path was settled on the last run and has not been touched since."""
+        row = self._conn.execute('SELECT signature, verdict FROM manifest WHERE path = ?', (path,)).fetchone()
+        if row is None or row[1] not in SETTLED:
+            return False
+        try:
+            return row[0] == self._signature(path, nested, row[1])
+        except OSError:
+            return False
+
+    def _signature(self, path: str, nested: bool, verdict: str) -> str:
+        signature: str = dir_signature(path, nested)
+        if verdict == NO_IMDBID:
+            signature += '|' + resolver_signature(self._index_path)
+
+        return signature
+
+    def record(self, path: str, children: int, verdict: str, nested: bool = False, old_path: str = None) -> None:
+        signature: str = self._signature(path, nested, verdict)
+        with self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            if old_path and old_path != path:
+                self._conn.execute('DELETE FROM manifest WHERE path = ?', (old_path,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO manifest (path, signature, children, verdict, scanned_at) VALUES (?, ?, ?, ?, ?)',
+                (path, signature, children, verdict, time.time())
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_local: threading.local = threading.local()
+
+
+def changed_only(entries: Iterable, path: str = SCAN_MANIFEST, nested: bool = False,
+                 counts: Counter = None) -> Iterator:
+    """entries (DirEntry) minus those settled on a previous run and untouched since; counts seen and unchanged."""
+    manifest: ScanManifest = get_manifest(path)
+    counts = counts if counts is not None else Counter()
+    for entry in entries:
+        counts['seen'] += 1
+        if manifest.is_unchanged(entry.path, nested):
+            counts['unchanged'] += 1
+            continue
+        yield entry
+
+
+def get_manifest(path: str = SCAN_MANIFEST) -> ScanManifest:
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.manifests, _local.pid = {}, os.getpid()
+    if path not in _local.manifests:
+        _local.manifests[path] = ScanManifest(path)
+
+    return _local.manifests[path]
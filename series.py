@@ -1,20 +1,19 @@
-import os
-import shutil
-from collections import defaultdict
-from sys import argv
+from sys import argv, intern
 import re
-import requests
 from dataclasses import dataclass
+from omdb import query_omdb
+from classifier import extension, find_episode, find_imdbid, find_part_no, walk_title
+from title_resolver import suggest_imdbid
+from rename_journal import get_journal
+from relocate import relocate_tree
 from OSAgnostics import (
-    DirEntry,
-    RENAME,
     PATH_SEP,
-    OMDB_URL,
-    OMDB_APIKEY,
+    RESOLVE_THRESHOLD,
 )
 
 
-@dataclass
+# slotted, and holding interned strings and small ints, as a library has millions of episodes
+@dataclass(slots=True)
 class Episode:
     title: str = None
     season_id: int = None
@@ -33,7 +32,7 @@ class Series:
         flags=re.IGNORECASE
     )
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, resolve_threshold: float = RESOLVE_THRESHOLD) -> None:
         self._path: str = path
         self._name: str = path.split(sep=PATH_SEP)[-1]
         self._parent: str = PATH_SEP.join(path.split(sep=PATH_SEP)[:-1])
@@ -42,6 +41,12 @@ class Series:
         self._imdbid: str = None
         self._need_fix: bool = False
         self._episodes: dict[str, Episode] = None
+        self._resolve_threshold: float = resolve_threshold
+        self._notes: list[str] = []
+        self._renames: list[tuple[str, str]] = []
+        self._relocation: tuple[str, str] = None
+        self._mkdirs: list[str] = []
+        self._skip_reason: str = None
         self._decompose()
 
     def _decompose(self) -> None:
@@ -52,108 +57,79 @@ class Series:
             self._year = groups[1]
             self._imdbid = groups[4]
         else:
-            match = re.search(r'\[imdbid-(tt\d+)\]', self._name)
-            if match:
-                self._imdbid = match.groups()[0]
-                self._need_fix = True
-            else:
-                self._imdbid = None
-                self._need_fix = False
-                print('!!! Please include [imdbid-ttXXXXXX] in the movie folder name.')
+            self._imdbid = find_imdbid(self._name)
+            self._need_fix = bool(self._imdbid)
         episodes: dict[str, Episode] = {}
-        f_entries: list[DirEntry] = [
-            i for i in os.scandir(self._path)
-            if i.is_file() and re.match(r'^.*\.(mkv|mp4|avi|ts|wmv)$', i.name, flags=re.IGNORECASE)
-        ]
+        (f_entries, seasons) = walk_title(self._path)
+        if not self._imdbid:
+            names: list[str] = [self._name] + [i.name for i in f_entries]
+            names += [files[0].name for _, _, files in seasons if files]
+            self._imdbid = suggest_imdbid(names, 'series', self._resolve_threshold, self._note)
+            self._need_fix = bool(self._imdbid)
+            if not self._imdbid:
+                self._note('!!! Please include [imdbid-ttXXXXXX] in the movie folder name.')
         if len(f_entries) > 0:
             self._need_fix = True
             for f_entry in f_entries:
-                episode: Episode = Episode()
-                match = Series.EPISODE_COMPLIANT.fullmatch(f_entry.name)
-                if match:
-                    groups = match.groups()
-                    episode.title = groups[0]
-                    episode.season_id = int(groups[1])
-                    episode.episode_from_id = int(groups[2])
-                    episode.episode_to_id = int(groups[4]) if groups[3] else None
-                    episode.part_no = int(groups[6]) if groups[5] else None
-                    episode.extension = groups[7]
-                else:
-                    match = re.search(r'S(\d+)E(\d+)(-E(\d+))?', f_entry.name, flags=re.IGNORECASE)
-                    if match:
-                        groups = match.groups()
-                        episode.season_id = int(groups[0])
-                        episode.episode_from_id = int(groups[1])
-                        episode.episode_to_id = int(groups[3]) if groups[2] else None
-                    episode.extension = f_entry.name.split(sep='.')[-1]
-                    match = re.search(r'(part|cd|disc)[ \-_]*(\d+)', f_entry.name, flags=re.IGNORECASE)
-                    if match:
-                        episode.part_no = int(match.groups()[1])
-                episodes[f_entry.name] = episode
-        d_entries: list[DirEntry] = [
-            i for i in os.scandir(self._path)
-            if i.is_dir() and re.match(r'^Season \d+$', i.name, flags=re.IGNORECASE)
-        ]
-        if len(d_entries) > 0:
-            for d_entry in d_entries:
-                self._need_fix = self._need_fix or not Series.SEASON_COMPLIANT.fullmatch(d_entry.name)
-                this_season_id: int = int(re.match(r'^Season (\d+)$', d_entry.name, flags=re.IGNORECASE).groups()[0])
-                f_entries = [
-                    i for i in os.scandir(d_entry.path)
-                    if i.is_file() and re.match(r'^.*\.(mkv|mp4|avi|ts|wmv)$', i.name, flags=re.IGNORECASE)
-                ]
-                for f_entry in f_entries:
-                    episode: Episode = Episode()
-                    match = Series.EPISODE_COMPLIANT.fullmatch(f_entry.name)
-                    if match:
-                        groups = match.groups()
-                        episode.title = groups[0]
-                        episode.season_id = int(groups[1])
-                        episode.episode_from_id = int(groups[2])
-                        episode.episode_to_id = int(groups[4]) if groups[3] else None
-                        episode.part_no = int(groups[6]) if groups[5] else None
-                        episode.extension = groups[7]
-                    else:
-                        self._need_fix = True
-                        match = re.search(r'(S(\d+))?E(\d+)(-E(\d+))?', f_entry.name, flags=re.IGNORECASE)
-                        if match:
-                            groups = match.groups()
-                            episode.season_id = int(groups[1]) if groups[0] else this_season_id
-                            episode.episode_from_id = int(groups[2])
-                            episode.episode_to_id = int(groups[4]) if groups[3] else None
-                        episode.extension = f_entry.name.split(sep='.')[-1]
-                        match = re.search(r'(part|cd|disc)[ \-_]*(\d+)', f_entry.name, flags=re.IGNORECASE)
-                        if match:
-                            episode.part_no = int(match.groups()[1])
-                    episodes[f'{d_entry.name}{PATH_SEP}{f_entry.name}'] = episode
+                episodes[f_entry.name] = Series.parse_episode(f_entry.name)
+        for d_entry, this_season_id, f_entries in seasons:
+            self._need_fix = self._need_fix or not Series.SEASON_COMPLIANT.fullmatch(d_entry.name)
+            for f_entry in f_entries:
+                episode: Episode = Series.parse_episode(f_entry.name, this_season_id)
+                self._need_fix = self._need_fix or episode.title is None
+                episodes[f'{d_entry.name}{PATH_SEP}{f_entry.name}'] = episode
 
         self._episodes = episodes
 
+    @staticmethod
+    def parse_episode(name: str, season_id: int = None) -> Episode:
+        episode: Episode = Episode()
+        match: re.Match = Series.EPISODE_COMPLIANT.fullmatch(name)
+        if match:
+            groups = match.groups()
+            episode.title = intern(groups[0])
+            episode.season_id = int(groups[1])
+            episode.episode_from_id = int(groups[2])
+            episode.episode_to_id = int(groups[4]) if groups[3] else None
+            episode.part_no = int(groups[6]) if groups[5] else None
+            episode.extension = intern(groups[7])
+        else:
+            found: tuple[int, int, int] = find_episode(name, season_id)
+            if found:
+                (episode.season_id, episode.episode_from_id, episode.episode_to_id) = found
+            episode.extension = extension(name)
+            episode.part_no = find_part_no(name)
+
+        return episode
+
     def need_fix(self) -> bool:
         if not self._need_fix:
             self._need_fix = self._need_fix or self._title is None or self._year is None
         if not self._need_fix:
-            for episode in self._episodes.values():
+            for episode in (self._episodes or {}).values():
                 self._need_fix = self._need_fix or self._title != episode.title
         self._need_fix = self._need_fix and self._imdbid
 
         return self._need_fix
 
-    def fix(self, dry_run: bool = False) -> None:
+    def fix(self, dry_run: bool = False) -> bool:
         if not self._imdbid:
-            print(f"--- cannot fix without a known imdbid")
-            return
+            self._skip("cannot fix without a known imdbid")
+            return False
         if not self.need_fix():
-            print(f"--- no need to fix as it's already compliant")
-            return
-        (self._title, self._year, _) = Series.get_omdb_series(self._imdbid)
+            self._note("--- no need to fix as it's already compliant")
+            return True
+        (title, year, _) = Series.get_omdb_series(self._imdbid)
+        if not title or not year:
+            self._skip(f"cannot fix as OMDb has no details for <{self._imdbid}>")
+            return False
+        (self._title, self._year) = (title, year)
         # rename the episodes first
         season_ids: set[int] = set(i.season_id for i in self._episodes.values())
         for s_id in season_ids:
             mkdir = f'{self._path}{PATH_SEP}Season {s_id:02d}'
-            print(f"+++ mkdir <{mkdir}>")
-            if not dry_run:
-                os.makedirs(mkdir, exist_ok=True)
+            self._note(f"+++ mkdir <{mkdir}>")
+            self._mkdirs.append(mkdir)
         rename_episodes: dict[str, str] = {}
         for old_name, episode in self._episodes.items():
             episode.title = self._title
@@ -165,37 +141,112 @@ class Series:
             new_name += f".{episode.extension}"
             rename_episodes[old_name] = new_name
         if len(rename_episodes) > len(set(rename_episodes.values())):
-            print(f"--- cannot fix as 2 or more episodes are identical")
-            return
+            self._skip("cannot fix as 2 or more episodes are identical")
+            return False
         for old, new in rename_episodes.items():
             if old != new:
-                print(f"+++ <{old}> ==> <{new}>")
-                if not dry_run:
-                    shutil.move(f"{self._path}{PATH_SEP}{old}", f"{self._path}{PATH_SEP}{new}")
-                    self._episodes[new] = self._episodes.pop(old)
+                self._note(f"+++ <{old}> ==> <{new}>")
+                self._renames.append((f"{self._path}{PATH_SEP}{old}", f"{self._path}{PATH_SEP}{new}"))
             else:
-                print(f"--- no change for identical old/new episodes <{old}>")
+                self._note(f"--- no change for identical old/new episodes <{old}>")
 
         # then rename the series
         new_series_name: str = f"{self._title} ({self._year}) [imdbid-{self._imdbid}]"
         if self._name != new_series_name:
-            print(f"+++ <{self._name}> ==> <{new_series_name}>")
-            if not dry_run:
-                shutil.move(self._path, f"{self._parent}{PATH_SEP}{new_series_name}")
+            self._note(f"+++ <{self._name}> ==> <{new_series_name}>")
+            self._renames.append((self._path, f"{self._parent}{PATH_SEP}{new_series_name}"))
+        else:
+            self._note(f"--- no change for identical series <{self._name}>")
+
+        if not dry_run:
+            # one journaled transaction: the season folders, the episodes and the folder, together or not at all
+            get_journal().execute(self._renames, mkdirs=self._mkdirs)
+            self._episodes = {rename_episodes.get(name, name): episode for name, episode in self._episodes.items()}
+            if self._name != new_series_name:
                 self._name = new_series_name
                 self._path = f"{self._parent}{PATH_SEP}{new_series_name}"
-                self._need_fix = False
-        else:
-            print(f"--- no change for identical series <{self._name}>")
+            self._need_fix = False
+
+        return True
+
+    def relocate(self, target: str, dry_run: bool = False) -> int:
+        """Moves the (fixed) series folder into the target library folder; returns the bytes copied to get it there."""
+        source: str = self._path
+        if dry_run and self._renames and self._renames[-1][0] == self._path:
+            # where the dry run's folder rename would have put it
+            source = self._renames[-1][1]
+        destination: str = f"{target}{PATH_SEP}{source.split(sep=PATH_SEP)[-1]}"
+        if destination == source:
+            return 0
+        self._note(f"+++ relocate <{source}> ==> <{destination}>")
+        self._relocation = (source, destination)
+        if dry_run:
+            return 0
+        copied: int = relocate_tree(self._path, destination)
+        (self._parent, self._path) = (target, destination)
+
+        return copied
+
+    def refuse(self, reason: str, note: str = None) -> bool:
+        """Leaves the folder alone for a reason found outside it, as fix() does for one found inside."""
+        self._skip(reason)
+        if note:
+            self._note(note)
+        return False
+
+    def _note(self, message: str) -> None:
+        self._notes.append(message)
+
+    def _skip(self, reason: str) -> None:
+        self._skip_reason = reason
+        self._note(f"--- {reason}")
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def notes(self) -> list[str]:
+        """What parsing and fix() did or would do, in order, as the lines they used to print."""
+        return self._notes
+
+    @property
+    def renames(self) -> list[tuple[str, str]]:
+        """(old path, new path) of every rename fix() applied, or planned on a dry run, in order."""
+        return self._renames
+
+    @property
+    def episodes(self) -> dict[str, Episode]:
+        """Episodes by path relative to the series folder (their new paths once fix() renamed them)."""
+        return self._episodes or {}
+
+    @property
+    def mkdirs(self) -> list[str]:
+        """Season folders fix() created, or would create on a dry run, before its renames."""
+        return self._mkdirs
+
+    @property
+    def relocation(self) -> tuple[str, str] | None:
+        """(folder, its path under --target) once relocate() moved it, or planned to on a dry run."""
+        return self._relocation
+
+    @property
+    def skip_reason(self) -> str | None:
+        return self._skip_reason
+
+    @property
+    def imdbid(self) -> str:
+        return self._imdbid
 
-        return
+    def media_count(self) -> int:
+        return len(self._episodes or {})
 
     def dry_run(self) -> None:
         self.fix(dry_run=True)
 
     def __str__(self) -> str:
         return (f"Series(title={self._title}, year={self._year}, imdbid={self._imdbid}, "
-                f"episodes={list(self._episodes.values())}, path={self._path})")
+                f"episodes=[{', '.join(map(str, (self._episodes or {}).values()))}], path={self._path})")
 
     # @staticmethod
     # def parse_path(path_str: str) -> tuple[str]:
@@ -221,29 +272,15 @@ class Series:
     def get_omdb_series(imdbid: str) -> tuple[str | None]:
         title, year = None, None
         if imdbid:
-            query_params: dict[str, str] = {
-                "apikey": OMDB_APIKEY,
-                "i": imdbid,
-                "type": "series",
-                "r": "json",
-            }
-            resp: requests.Response = requests.get(OMDB_URL, params=query_params)
-            if resp.status_code // 100 == 2:
-                result: dict = resp.json()
-                if result["Response"] == "True":
-                    good_title: str = re.sub(r"[ /\\:\*<>\|\?]+", " ", result["Title"])
-                    good_year: str = re.sub(r'[^ -~]+', '-', result["Year"])
-                    (title, year, imdbid) = (
-                        good_title,
-                        good_year,
-                        result["imdbID"]
-                    )
-            elif resp.status_code // 100 == 4:
-                result: dict = resp.json()
-                if result["Error"] == "Request limit reached!":
-                    raise Exception(
-                        f'!!! Reached daily limit when retrieve details for "{imdbid}"'
-                    )
+            result: dict = query_omdb(imdbid, type="series")
+            if result and result["Response"] == "True":
+                good_title: str = re.sub(r"[ /\\:\*<>\|\?]+", " ", result["Title"])
+                good_year: str = re.sub(r'[^ -~]+', '-', result["Year"])
+                (title, year, imdbid) = (
+                    good_title,
+                    good_year,
+                    result["imdbID"]
+                )
 
         return (title, year, imdbid)
 
@@ -334,3 +371,4 @@ if __name__ == "__main__":
     print(series)
     # series.dry_run()
     series.fix()
+    print("\n".join(series.notes))
@@ -0,0 +1,165 @@
+"""Splitting one library between several hosts: --shard I/N and per-directory leases under --leases.
+
+A title belongs to shard crc32(folder name) % N, which every host computes the
+same whatever its mount point, so N hosts with --shard 0/N .. N-1/N share
+a library without overlap. A lost host's shard is picked up by running its
+--shard again anywhere.
+
+Leases guard against two hosts working on one title at the same time (two
+runs of one shard, a rerun while the lost host comes back, or no --shard at
+all). A lease is a file in a shared folder, created with O_EXCL, and it is
+refreshed every LEASE_TTL / 3 seconds while held. A lease not refreshed for
+LEASE_TTL seconds belonged to a host that died, and is taken over. The rename
+stage checks that its lease is still held before it renames anything.
+"""
+import os
+import json
+import time
+import zlib
+import errno
+import socket
+import hashlib
+import threading
+from collections import Counter
+from typing import Iterable, Iterator
+from OSAgnostics import LEASE_TTL
+
+LEASE_SUFFIX: str = '.lease'
+
+
+class LeaseLost(OSError):
+    pass
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """argparse type for --shard I/N, 0 <= I < N."""
+    (index, count) = (int(i) for i in value.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f'shard must be I/N with 0 <= I < N: {value}')
+
+    return (index, count)
+
+
+def in_shard(name: str, shard: tuple[int, int] | None) -> bool:
+    if shard is None:
+        return True
+    return zlib.crc32(name.encode('utf-8', 'surrogateescape')) % shard[1] == shard[0]
+
+
+class Leases:
+    def __init__(self, directory: str, ttl: float = LEASE_TTL) -> None:
+        self.directory: str = directory
+        self.ttl: float = ttl
+        self.owner: str = f'{socket.gethostname()}:{os.getpid()}'
+        self._held: dict[str, str] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._stop: threading.Event = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def _file(self, path: str) -> str:
+        # by folder name, as the hosts may mount the library in different places
+        digest: str = hashlib.sha1(os.path.basename(path).encode('utf-8', 'surrogateescape')).hexdigest()
+        return os.path.join(self.directory, digest + LEASE_SUFFIX)
+
+    def _expired(self, lease: str) -> bool:
+        try:
+            return time.time() - os.stat(lease).st_mtime > self.ttl
+        except FileNotFoundError:
+            return True
+
+    def _owner_of(self, lease: str) -> str | None:
+        try:
+            with open(lease, 'r', encoding='utf-8') as f:
+                return json.load(f).get('owner')
+        except (OSError, ValueError):
+            return None
+
+    def _take_over(self, lease: str) -> None:
+        """Moves an expired lease out of the way; of several hosts trying at once, one rename wins."""
+        stale: str = f'{lease}.{self.owner}.stale'
+        try:
+            os.rename(lease, stale)
+        except FileNotFoundError:
+            return
+        if not self._expired(stale):
+            # another host took the lease over between our check and our rename: give it back
+            try:
+                os.link(stale, lease)
+            except FileExistsError:
+                pass
+        os.unlink(stale)
+
+    def acquire(self, path: str) -> bool:
+        """Leases path's folder to this process; False while another host holds it."""
+        lease: str = self._file(path)
+        for _ in range(2):
+            try:
+                fd: int = os.open(lease, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                if not self._expired(lease):
+                    return False
+                self._take_over(lease)
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'owner': self.owner, 'path': path, 'acquired': time.time()}, f)
+            with self._lock:
+                self._held[path] = lease
+            return True
+
+        return False
+
+    def check(self, path: str) -> None:
+        """Raises LeaseLost unless this process still holds path's lease."""
+        with self._lock:
+            lease: str = self._held.get(path)
+        if lease is None or self._owner_of(lease) != self.owner:
+            raise LeaseLost(errno.EBUSY, 'lease expired and was taken over by another host', path)
+
+    def release(self, path: str) -> None:
+        with self._lock:
+            lease: str = self._held.pop(path, None)
+        if lease and self._owner_of(lease) == self.owner:
+            try:
+                os.unlink(lease)
+            except FileNotFoundError:
+                pass
+
+    def start(self) -> None:
+        """Refreshes the held leases every ttl / 3 seconds from a ticker thread, until stop()."""
+        def tick() -> None:
+            while not self._stop.wait(self.ttl / 3):
+                with self._lock:
+                    leases: list[str] = list(self._held.values())
+                for lease in leases:
+                    try:
+                        os.utime(lease)
+                    except FileNotFoundError:
+                        pass
+        threading.Thread(target=tick, name='lease-refresh', daemon=True).start()
+
+    def stop(self) -> None:
+        """Stops refreshing and releases every lease still held."""
+        self._stop.set()
+        with self._lock:
+            paths: list[str] = list(self._held)
+        for path in paths:
+            self.release(path)
+
+
+def sharded(entries: Iterable, shard: tuple[int, int] = None, leases: Leases = None,
+            counts: Counter = None) -> Iterator:
+    """entries (DirEntry) of this shard whose lease this process got; counts other_shards and leased_elsewhere."""
+    counts = counts if counts is not None else Counter()
+    for entry in entries:
+        if not in_shard(entry.name, shard):
+            counts['other_shards'] += 1
+            continue
+        if leases and not leases.acquire(entry.path):
+            counts['leased_elsewhere'] += 1
+            continue
+        if leases and not os.path.isdir(entry.path):
+            # fixed and renamed under another name by the host that held the lease until now
+            leases.release(entry.path)
+            counts['leased_elsewhere'] += 1
+            continue
+        yield entry
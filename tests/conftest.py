@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+import pytest
+
+REPO: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the tools are flat modules run from the repository root
+sys.path.insert(0, REPO)
+
+# journals one rename, makes it, then waits for a line on stdin and dies without committing
+LIVE_RUN: str = '''
+import os, sys
+from rename_journal import RenameJournal
+journal = RenameJournal(sys.argv[1])
+journal._hold_run_lock()
+journal._append({'t': 'txn', 'id': journal._run + ':0', 'run': journal._run, 'tool': 'fix_movies',
+                 'renames': [[sys.argv[2], sys.argv[3]]]})
+os.rename(sys.argv[2], sys.argv[3])
+print('renamed', flush=True)
+sys.stdin.readline()
+os._exit(1)
+'''
+
+
+@pytest.fixture
+def live_run():
+    """Starts a run that is in the middle of a transaction renaming source to target in journal.
+
+    Send it a line (communicate('\\n')) to have it die there, leaving the transaction for recovery.
+    """
+    procs: list[subprocess.Popen] = []
+
+    def start(journal: str, source: str, target: str) -> subprocess.Popen:
+        proc: subprocess.Popen = subprocess.Popen([sys.executable, '-c', LIVE_RUN, journal, source, target], cwd=REPO,
+                                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        procs.append(proc)
+        assert proc.stdout.readline().strip() == 'renamed'
+        return proc
+
+    yield start
+    for proc in procs:
+        if proc.poll() is None:
+            proc.communicate('\n')
@@ -0,0 +1,62 @@
+import queue
+import threading
+import pytest
+from autotune import AUTO, AdaptiveLimit, StageStats, Tuner, parse_workers, sizing
+
+
+def test_limit_blocks_until_released_or_raised():
+    limit: AdaptiveLimit = AdaptiveLimit(1, maximum=4)
+    limit.acquire()
+    entered: threading.Event = threading.Event()
+    waiter: threading.Thread = threading.Thread(target=lambda: (limit.acquire(), entered.set()))
+    waiter.start()
+    assert not entered.wait(0.1)
+    assert limit.resize(2) == 2
+    assert entered.wait(5)
+    waiter.join()
+    assert limit.active == 2
+    assert (limit.resize(10), limit.resize(0)) == (4, 1)
+
+
+def tuned(backlog: int, active: int, limit: int = 8) -> tuple[Tuner, AdaptiveLimit, StageStats]:
+    (tuner, slots, stats) = (Tuner(interval=1.0), AdaptiveLimit(limit, 1, 32), StageStats())
+    inbox: queue.Queue = queue.Queue()
+    for i in range(backlog):
+        inbox.put(i)
+    slots.active = active
+    tuner.watch('probe', slots, stats, inbox)
+    return (tuner, slots, stats)
+
+
+def interval(tuner: Tuner, stats: StageStats, completed: int) -> None:
+    for _ in range(completed):
+        stats.record(0.01)
+    tuner._step(tuner._watches[0])
+
+
+def test_climbs_while_throughput_holds_and_turns_back_when_it_drops():
+    (tuner, slots, stats) = tuned(backlog=100, active=8)
+    interval(tuner, stats, 10)
+    assert slots.limit == 10
+    interval(tuner, stats, 12)
+    assert slots.limit == 12
+    # throughput fell by more than the tolerance: step back
+    interval(tuner, stats, 8)
+    assert slots.limit == 9
+    interval(tuner, stats, 8)
+    assert slots.limit == 7
+
+
+def test_idle_stage_shrinks():
+    (tuner, slots, stats) = tuned(backlog=0, active=2)
+    interval(tuner, stats, 2)
+    interval(tuner, stats, 2)
+    assert slots.limit == 6
+
+
+def test_workers_option():
+    assert (parse_workers('auto'), parse_workers('3')) == (AUTO, 3)
+    with pytest.raises(ValueError):
+        parse_workers('0')
+    assert sizing(5, 'thread', 4) == {'workers': 5, 'autotune': False}
+    assert sizing(AUTO, 'thread', 4, max_workers=2) == {'workers': 2, 'initial': 2, 'autotune': True}
@@ -0,0 +1,58 @@
+import os
+from catalog import Catalog, NameClaims
+
+
+def folders(root, *names: str) -> list[os.DirEntry]:
+    for name in names:
+        (root / name).mkdir()
+    with os.scandir(root) as entries:
+        return sorted(entries, key=lambda i: i.name)
+
+
+def test_the_first_folder_found_claims_an_imdbid(tmp_path):
+    entries = folders(tmp_path, 'Alien (1979) [imdbid-tt0078748]', 'Alien.1979.1080p [imdbid-tt0078748]',
+                      'Heat (1995) [imdbid-tt0113277]')
+    claims: NameClaims = NameClaims()
+    assert [i.name for i in claims.claim(entries)] == [i.name for i in entries]
+    (first, second, other) = (i.path for i in entries)
+    # asked in either order, the later folder is held back in favour of the first
+    assert claims.holder_of('tt0078748', second) == first
+    assert claims.holder_of('tt0078748', first) is None
+    assert claims.holder_of('tt0113277', other) is None
+    assert claims.named('tt0078748') == [first, second]
+
+
+def test_claims_are_known_as_the_walk_goes(tmp_path):
+    entries = folders(tmp_path, 'Alien (1979) [imdbid-tt0078748]', 'Alien.1979.1080p [imdbid-tt0078748]')
+    claims: NameClaims = NameClaims()
+    walked = claims.claim(iter(entries))
+    assert next(walked) == entries[0]
+    # nothing waits for the rest of the walk
+    assert claims.holder_of('tt0078748', entries[0].path) is None
+    assert claims.named('tt0078748') == [entries[0].path]
+    assert list(walked) == [entries[1]]
+    assert claims.holder_of('tt0078748', entries[1].path) == entries[0].path
+
+
+def test_catalog_queries(tmp_path):
+    catalog: Catalog = Catalog(str(tmp_path / 'catalog.db'))
+    (a, b, show) = (str(tmp_path / i) for i in ('a', 'b', 'show'))
+    for path in (a, b, show):
+        os.mkdir(path)
+    catalog.index('movie', a, 'tt0078748', [('a.mkv', 10, '1080p', None, None, None, None, None)])
+    catalog.index('movie', b, 'tt0078748', [('b.mkv', 10, None, None, None, None, None, None)])
+    catalog.index('series', show, 'tt0903747', [
+        ('S01E01.mkv', 1, None, None, None, 1, 1, None),
+        ('S01E02-E03.mkv', 2, None, None, None, 1, 2, 3),
+        ('S01E03.mkv', 3, None, None, None, 1, 3, None),
+        ('S01E06.mkv', 4, None, None, None, 1, 6, None),
+    ])
+    assert catalog.duplicate_of('movie', 'tt0078748', a) == b
+    assert catalog.duplicate_of('movie', 'tt0078748', a, besides=[a, b]) is None
+    assert list(catalog.duplicates()) == [('movie', 'tt0078748', [a, b])]
+    assert list(catalog.overlaps()) == [(show, 1, 'S01E02-E03.mkv', 'S01E03.mkv')]
+    assert list(catalog.missing()) == [(show, 1, [4, 5])]
+    os.rmdir(b)
+    assert catalog.duplicate_of('movie', 'tt0078748', a) is None
+    assert catalog.prune() == 1
+    catalog.close()
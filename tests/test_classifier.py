@@ -0,0 +1,61 @@
+import pytest
+from classifier import (find_d3_format, find_episode, find_imdbid, find_part_no, find_resolution, find_title_year,
+                        is_media, walk_title)
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('The.Matrix.1999.1080p.BluRay.x264-GRP', ('The Matrix', '1999')),
+    ('2001 A Space Odyssey (1968) [imdbid-tt0062622]', ('2001 A Space Odyssey', '1968')),
+    ('Blade Runner 2049 2017 2160p', ('Blade Runner 2049', '2017')),
+    ('Show.S02.COMPLETE.720p', ('Show', None)),
+    ('Movie Part 2 720p.mkv', ('Movie', None)),
+])
+def test_title_and_year_of_scene_names(name, expected):
+    assert find_title_year(name) == expected
+
+
+@pytest.mark.parametrize('name, height', [
+    ('Movie.1080p.BluRay', 1080),
+    ('Movie 4K HDR', 2160),
+    ('Movie.UHD.HDR', 2160),
+    ('Movie FHD', 1080),
+    ('Movie.720p.1080p', None),
+    ('Movie.a1080p', None),
+    ('Movie', None),
+])
+def test_resolution_tags(name, height):
+    assert find_resolution(name) == height
+
+
+@pytest.mark.parametrize('name, season_id, expected', [
+    ('Show S01E02-E03.mkv', None, (1, 2, 3)),
+    ('Show s2e10.mkv', None, (2, 10, None)),
+    ('Show E05.mkv', None, None),
+    ('Show E05.mkv', 3, (3, 5, None)),
+    ('Show.mkv', 3, None),
+])
+def test_episode_tags(name, season_id, expected):
+    assert find_episode(name, season_id) == expected
+
+
+def test_name_tags():
+    assert find_imdbid('Alien (1979) [imdbid-tt0078748]') == 'tt0078748'
+    assert find_imdbid('Alien tt0078748') is None
+    assert find_part_no('Movie CD2.avi') == 2
+    assert find_part_no('Movie - disc_1.mkv') == 1
+    assert find_d3_format('Movie.hsbs.mkv') == 'HSBS'
+    assert (is_media('a.MKV'), is_media('a.srt'), is_media('mkv')) == (True, False, False)
+
+
+def test_walk_title(tmp_path):
+    show = tmp_path / 'Show'
+    (show / 'Season 01').mkdir(parents=True)
+    (show / 'Season 01' / 'Show S01E01.mkv').write_bytes(b'')
+    (show / 'Season 01' / 'Show S01E01.srt').write_bytes(b'')
+    (show / 'Show S02E01.mp4').write_bytes(b'')
+    (show / 'Show.nfo').write_bytes(b'')
+    (show / 'Extras').mkdir()
+    (files, seasons) = walk_title(str(show))
+    assert [i.name for i in files] == ['Show S02E01.mp4']
+    assert [(i.name, season_id, [j.name for j in media]) for i, season_id, media in seasons] == [
+        ('Season 01', 1, ['Show S01E01.mkv'])]
@@ -0,0 +1,120 @@
+import struct
+import pytest
+from container_probe import MKV_HEAD_BYTES, BoundedReader, ProbeBudgetExceeded, probe_height, probe_mkv
+
+# sequence parameter set of a 1920x1088 High profile stream cropped to 1080 lines
+H264_SPS_1080: bytes = bytes.fromhex('67640028acd940780227e5c044000003000400000300f03c60c658')
+
+
+def _vint(size: int) -> bytes:
+    for length in range(1, 9):
+        if size < (1 << (7 * length)) - 1:
+            return (size | (1 << (7 * length))).to_bytes(length, 'big')
+    raise ValueError(size)
+
+
+def _element(element_id: int, data: bytes) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + _vint(len(data)) + data
+
+
+def _uint(element_id: int, value: int, size: int = 2) -> bytes:
+    return _element(element_id, value.to_bytes(size, 'big'))
+
+
+def mkv_tracks(width: int, height: int) -> bytes:
+    video: bytes = _element(0xAE, _uint(0xD7, 1, 1) + _uint(0x83, 1, 1)
+                            + _element(0xE0, _uint(0xB0, width) + _uint(0xBA, height)))
+    audio: bytes = _element(0xAE, _uint(0xD7, 2, 1) + _uint(0x83, 2, 1))
+    return _element(0x1654AE6B, audio + video)
+
+
+def mkv_header(width: int, height: int, void: int = 64) -> bytes:
+    """EBML header and a segment whose Tracks follow `void` bytes of padding, found through a SeekHead."""
+    padding: bytes = _element(0xEC, b'\0' * void)
+    seek: bytes = _element(0x114D9B74, _element(0x4DBB, _element(0x53AB, (0x1654AE6B).to_bytes(4, 'big'))
+                                                   + _uint(0x53AC, 0, 8)))
+    seek = _element(0x114D9B74, _element(0x4DBB, _element(0x53AB, (0x1654AE6B).to_bytes(4, 'big'))
+                                         + _uint(0x53AC, len(seek) + len(padding), 8)))
+    segment: bytes = _element(0x18538067, seek + padding + mkv_tracks(width, height))
+
+    return _element(0x1A45DFA3, _element(0x4282, b'matroska')) + segment
+
+
+def _box(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(data), kind) + data
+
+
+def mp4_header(width: int, height: int) -> bytes:
+    tkhd: bytes = _box(b'tkhd', b'\0' * 80 + struct.pack('>II', width << 16, height << 16))
+    hdlr: bytes = _box(b'hdlr', b'\0' * 8 + b'vide' + b'\0' * 12)
+    entry: bytes = struct.pack('>I4s', 86, b'avc1') + b'\0' * 24 + struct.pack('>HH', width, height) + b'\0' * 50
+    stsd: bytes = _box(b'stsd', b'\0' * 4 + struct.pack('>I', 1) + entry)
+    trak: bytes = _box(b'trak', tkhd + _box(b'mdia', hdlr + _box(b'minf', _box(b'stbl', stsd))))
+
+    return _box(b'ftyp', b'isom\0\0\0\0') + _box(b'moov', trak)
+
+
+def medium(tmp_path, name: str, data: bytes, size: int = 0) -> str:
+    path: str = str(tmp_path / name)
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.truncate(max(size, len(data)))
+    return path
+
+
+def _ts_packet(pid: int, payload: bytes, start: bool = True) -> bytes:
+    return (bytes([0x47, (0x40 if start else 0) | pid >> 8, pid & 0xFF, 0x10])
+            + payload + b'\xff' * (184 - len(payload)))
+
+
+def ts_stream(stream_type: int, elementary: bytes) -> bytes:
+    pat: bytes = b'\0\x00\xb0\x0d\x00\x01\xc1\x00\x00' + b'\x00\x01\xe1\x00' + b'\0' * 4
+    pmt: bytes = (b'\0\x02\xb0\x12\x00\x01\xc1\x00\x00\xe1\x01\xf0\x00'
+                  + bytes([stream_type]) + b'\xe1\x01\xf0\x00' + b'\0' * 4)
+    pes: bytes = b'\x00\x00\x01\xe0\x00\x00\x80\x00\x00' + b'\x00\x00\x00\x01' + elementary
+
+    # a null packet after them, as the sync byte must repeat four times
+    return _ts_packet(0, pat) + _ts_packet(0x100, pmt) + _ts_packet(0x101, pes) + _ts_packet(0x1FFF, b'', False)
+
+
+def test_mkv_height_from_the_video_track(tmp_path):
+    assert probe_height(medium(tmp_path, 'a.mkv', mkv_header(1920, 1080), 1 << 20)) == 1080
+
+
+def test_mkv_tracks_past_the_head_are_found_through_the_seek_head(tmp_path):
+    header: bytes = mkv_header(1280, 720, void=2 * MKV_HEAD_BYTES)
+    assert probe_height(medium(tmp_path, 'a.mkv', header, 1 << 20)) == 720
+
+
+def test_mp4_height_from_the_sample_entry(tmp_path):
+    assert probe_height(medium(tmp_path, 'a.mp4', mp4_header(3840, 2160), 1 << 20)) == 2160
+
+
+def test_avi_height_from_the_main_header(tmp_path):
+    avih: bytes = b'avih' + struct.pack('<I', 56) + b'\0' * 36 + struct.pack('<I', 576) + b'\0' * 16
+    hdrl: bytes = b'LIST' + struct.pack('<I', 4 + len(avih)) + b'hdrl' + avih
+    riff: bytes = b'RIFF' + struct.pack('<I', 4 + len(hdrl)) + b'AVI ' + hdrl
+    assert probe_height(medium(tmp_path, 'a.avi', riff)) == 576
+
+
+def test_ts_height_from_the_h264_sps(tmp_path):
+    assert probe_height(medium(tmp_path, 'a.ts', ts_stream(0x1B, H264_SPS_1080))) == 1080
+
+
+def test_ts_height_from_the_mpeg2_sequence_header(tmp_path):
+    sequence: bytes = b'\xb3' + bytes([0x2D, 0x02, 0x40]) + b'\0' * 4
+    assert probe_height(medium(tmp_path, 'a.ts', ts_stream(0x02, sequence))) == 576
+
+
+def test_unknown_and_damaged_files_have_no_height(tmp_path):
+    assert probe_height(medium(tmp_path, 'a.wmv', mkv_header(1920, 1080))) is None
+    assert probe_height(medium(tmp_path, 'b.mkv', b'not a matroska file')) is None
+    assert probe_height(medium(tmp_path, 'c.mkv', mkv_header(1920, 1080)[:40])) is None
+    assert probe_height(medium(tmp_path, 'd.ts', b'\x47' + b'\0' * 1000)) is None
+    assert probe_height(str(tmp_path / 'gone.mkv')) is None
+
+
+def test_reads_stay_within_the_budget(tmp_path):
+    path: str = medium(tmp_path, 'a.mkv', mkv_header(1920, 1080), 1 << 20)
+    with BoundedReader(path, budget=1024) as reader, pytest.raises(ProbeBudgetExceeded):
+        probe_mkv(reader)
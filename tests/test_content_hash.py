@@ -0,0 +1,90 @@
+import os
+import threading
+import pytest
+import content_hash
+from content_hash import HashCache, full_hash, identical_media, sampled_hash
+from metrics import get_metrics
+
+WINDOW: int = 4096
+
+
+@pytest.fixture(autouse=True)
+def small_windows(tmp_path, monkeypatch):
+    """Windows of 4 KiB, and a hash cache of the test's own for every thread."""
+    monkeypatch.setattr(content_hash, 'HASH_WINDOW', WINDOW)
+    local: threading.local = threading.local()
+
+    def get_hash_cache() -> HashCache:
+        if not hasattr(local, 'cache'):
+            local.cache = HashCache(str(tmp_path / 'hashes.db'))
+        return local.cache
+
+    monkeypatch.setattr(content_hash, 'get_hash_cache', get_hash_cache)
+
+
+def write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def counter(name: str) -> int:
+    return sum(v for (key, _), v in get_metrics().counters.items() if key == name)
+
+
+def large(fill: bytes, middle: bytes = b'\0') -> bytes:
+    """Ten windows: `fill` in the second and eighth, `middle` at the centre, zeros in the sampled windows."""
+    data: bytearray = bytearray(10 * WINDOW)
+    data[WINDOW:2 * WINDOW] = data[7 * WINDOW:8 * WINDOW] = fill * WINDOW
+    data[5 * WINDOW] = middle[0]
+    return bytes(data)
+
+
+def test_small_and_empty_files_are_hashed_whole(tmp_path):
+    (a, b, c) = (write(tmp_path / 'a', b'x' * 100), write(tmp_path / 'b', b'x' * 100), write(tmp_path / 'c', b'y' * 100))
+    assert sampled_hash(a, 100) == sampled_hash(b, 100) != sampled_hash(c, 100)
+    (e, f) = (write(tmp_path / 'e', b''), write(tmp_path / 'f', b''))
+    assert sampled_hash(e, 0) == sampled_hash(f, 0) != sampled_hash(a, 100)
+    # small files need no second read: their sampled hash covers every byte
+    cache: HashCache = HashCache(str(tmp_path / 'hashes.db'))
+    assert cache.full(a) == cache.sampled(a)
+
+
+def test_sampled_collisions_are_split_by_the_full_hash(tmp_path):
+    (a, b) = (write(tmp_path / 'a', large(b'a')), write(tmp_path / 'b', large(b'b')))
+    assert os.path.getsize(a) > 3 * WINDOW
+    assert sampled_hash(a, os.path.getsize(a)) == sampled_hash(b, os.path.getsize(b))
+    assert full_hash(a) != full_hash(b)
+    assert list(identical_media([[a, b]])) == []
+
+
+def test_cache_hits_until_the_file_changes(tmp_path):
+    path: str = write(tmp_path / 'a', large(b'a'))
+    cache: HashCache = HashCache(str(tmp_path / 'hashes.db'))
+    (hits, read) = (counter('hash_cache_hits'), counter('hash_bytes_read'))
+    first: str = cache.full(path)
+    assert (cache.full(path), cache.sampled(path)) == (first, cache.sampled(path))
+    assert counter('hash_cache_hits') - hits == 3
+    assert counter('hash_bytes_read') - read == 3 * WINDOW + os.path.getsize(path)
+    # same size, new content and mtime
+    write(tmp_path / 'a', large(b'b'))
+    st: os.stat_result = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert cache.full(path) != first
+    assert counter('hash_cache_hits') - hits == 3
+
+
+def test_identical_media_are_grouped(tmp_path):
+    (a, b, c, d) = (write(tmp_path / 'a', large(b'a')), write(tmp_path / 'b', large(b'b')),
+                    write(tmp_path / 'c', large(b'a')), write(tmp_path / 'd', large(b'a', b'!')))
+    (small, same) = (write(tmp_path / 's1', b'x' * 10), write(tmp_path / 's2', b'x' * 10))
+    groups: list[list[str]] = list(identical_media([[a, b, c, d], [small, same], [str(tmp_path / 'gone'), a]]))
+    assert sorted(map(sorted, groups)) == [[a, c], [small, same]]
+
+
+def test_hard_links_are_one_file(tmp_path):
+    (a, b) = (write(tmp_path / 'a', large(b'a')), write(tmp_path / 'b', large(b'a')))
+    os.link(a, tmp_path / 'a2')
+    os.link(b, tmp_path / 'b2')
+    linked: str = str(tmp_path / 'a2')
+    assert list(identical_media([[a, linked]])) == []
+    assert list(identical_media([[a, linked, b, str(tmp_path / 'b2')]])) == [[a, b]]
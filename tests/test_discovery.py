@@ -0,0 +1,33 @@
+import re
+from discovery import discover, is_title
+
+
+def test_discover_walks_collections_down_to_depth(tmp_path):
+    show = tmp_path / 'Collection' / 'Show'
+    (show / 'Season 01').mkdir(parents=True)
+    (show / 'Season 01' / 'Show S01E01.mkv').write_bytes(b'')
+    (tmp_path / 'Alien (1979) [imdbid-tt0078748]').mkdir()
+    (tmp_path / '.hidden').mkdir()
+    (tmp_path / 'notes.txt').write_bytes(b'')
+    assert sorted(i.name for i in discover([str(tmp_path)], 1, nested=True)) == [
+        'Alien (1979) [imdbid-tt0078748]', 'Collection']
+    assert sorted(i.path for i in discover([str(tmp_path)], 2, nested=True)) == [
+        str(tmp_path / 'Alien (1979) [imdbid-tt0078748]'), str(show)]
+    assert [i.path for i in discover([str(tmp_path)], 2, re.compile('Show'), nested=True)] == [str(show)]
+    # for movies, season folders do not make a title: the walk goes on into them
+    assert sorted(i.name for i in discover([str(tmp_path)], 3)) == ['Alien (1979) [imdbid-tt0078748]', 'Season 01']
+
+
+def test_discover_goes_on_past_unreadable_roots(tmp_path):
+    (tmp_path / 'b' / 'Heat').mkdir(parents=True)
+    assert [i.name for i in discover([str(tmp_path / 'a'), str(tmp_path / 'b')])] == ['Heat']
+
+
+def test_titles_are_told_from_collections(tmp_path):
+    for name in ('Alien (1979) [imdbid-tt0078748]', 'Heat', 'Show/Season 01', 'Collection/Heat'):
+        (tmp_path / name).mkdir(parents=True)
+    (tmp_path / 'Heat' / 'Heat.mkv').write_bytes(b'')
+    assert is_title(str(tmp_path / 'Alien (1979) [imdbid-tt0078748]'))
+    assert is_title(str(tmp_path / 'Heat'))
+    assert is_title(str(tmp_path / 'Show'), nested=True) and not is_title(str(tmp_path / 'Show'))
+    assert not is_title(str(tmp_path / 'Collection'), nested=True)
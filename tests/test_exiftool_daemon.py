@@ -0,0 +1,88 @@
+import sys
+import pytest
+import exiftool_daemon
+from exiftool_daemon import ExifToolDaemon, probe_heights
+
+# speaks the -stay_open protocol: a medium's first line is its WIDTHxHEIGHT, a medium named crash kills it
+FAKE_EXIFTOOL: str = '''
+import os, sys, json
+with open(os.environ['FAKE_EXIFTOOL_LOG'], 'a') as log:
+    log.write(f'{os.getpid()}\\n')
+batch = []
+for line in sys.stdin:
+    line = line.rstrip('\\n')
+    if line == '-stay_open':
+        continue
+    if line == 'False':
+        break
+    if not line.startswith('-execute'):
+        batch.append(line)
+        continue
+    reply = []
+    for path in batch:
+        if os.path.basename(path) == 'crash.mkv':
+            sys.exit(1)
+        try:
+            with open(path) as f:
+                size = f.readline().strip()
+        except OSError:
+            continue
+        reply.append({'SourceFile': path, 'Composite': {'ImageSize': size}})
+    if reply:
+        print(json.dumps(reply))
+    print('{ready' + line[len('-execute'):] + '}', flush=True)
+    batch = []
+'''
+
+
+@pytest.fixture
+def fake_exiftool(tmp_path, monkeypatch):
+    script = tmp_path / 'exiftool'
+    script.write_text(f'#!{sys.executable}\n{FAKE_EXIFTOOL}')
+    script.chmod(0o755)
+    monkeypatch.setenv('FAKE_EXIFTOOL_LOG', str(tmp_path / 'started'))
+    monkeypatch.setattr(exiftool_daemon, 'ExifToolDaemon', lambda: ExifToolDaemon(str(script)))
+    monkeypatch.setattr(exiftool_daemon, '_daemon', None)
+    monkeypatch.setattr(exiftool_daemon, '_daemon_pid', None)
+    yield str(script)
+    if exiftool_daemon._daemon:
+        exiftool_daemon._daemon.close()
+
+
+def media(root, sizes: dict[str, str]) -> list[str]:
+    for name, size in sizes.items():
+        (root / name).write_text(f'{size}\n')
+    return [str(root / i) for i in sizes]
+
+
+def started(tmp_path) -> int:
+    return len((tmp_path / 'started').read_text().split())
+
+
+def test_one_daemon_answers_every_batch(tmp_path, fake_exiftool):
+    paths: list[str] = media(tmp_path, {f'{i}.mkv': '1920x1080' if i % 2 else '1280x720'
+                                        for i in range(exiftool_daemon.EXIFTOOL_BATCH_SIZE + 5)})
+    heights: dict[str, int] = probe_heights(paths)
+    assert heights == {path: 720 if i % 2 == 0 else 1080 for i, path in enumerate(paths)}
+    assert probe_heights(paths[:1]) == {paths[0]: 720}
+    assert started(tmp_path) == 1
+
+
+def test_unreadable_and_unsafe_names_are_left_out(tmp_path, fake_exiftool):
+    (good,) = media(tmp_path, {'good.mkv': '720x576'})
+    assert probe_heights([good, str(tmp_path / 'gone.mkv'), str(tmp_path / 'two\nlines.mkv')]) == {good: 576}
+
+
+def test_a_dead_daemon_is_not_restarted(tmp_path, fake_exiftool):
+    (good, crash) = media(tmp_path, {'good.mkv': '720x576', 'crash.mkv': '1x1'})
+    assert probe_heights([crash]) == {}
+    assert probe_heights([good]) == {}
+    assert exiftool_daemon.get_daemon() is None
+    assert started(tmp_path) == 1
+
+
+def test_close_ends_the_process(fake_exiftool):
+    daemon: ExifToolDaemon = ExifToolDaemon(fake_exiftool)
+    assert daemon.alive()
+    daemon.close()
+    assert not daemon.alive()
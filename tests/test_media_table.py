@@ -0,0 +1,40 @@
+import os
+import pytest
+from media_table import MediaRow, MediaTable
+from series import Series
+
+
+def series(root, name: str, files: list[str]) -> Series:
+    for file in files:
+        path = root / name / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+    return Series(str(root / name))
+
+
+def test_round_trip_keeps_every_row(tmp_path):
+    table: MediaTable = MediaTable()
+    table.add_series(series(tmp_path, 'Show (2020) [imdbid-tt1234567]',
+                            [os.path.join('Season 01', 'Show S01E01.mkv'),
+                             os.path.join('Season 01', 'Show S01E02-E03 Part 2.mp4')]))
+    table.save(str(tmp_path / 'table'))
+    loaded: MediaTable = MediaTable.load(str(tmp_path / 'table'))
+    assert list(loaded.rows()) == list(table.rows())
+    assert sorted(loaded.rows())[1] == MediaRow(
+        str(tmp_path / 'Show (2020) [imdbid-tt1234567]'), os.path.join('Season 01', 'Show S01E02-E03 Part 2.mp4'),
+        'tt1234567', 1, 2, 3, 2, None, None, 'mp4')
+
+
+def test_date_style_episode_numbers_fit(tmp_path):
+    table: MediaTable = MediaTable()
+    table.add_series(series(tmp_path, 'Daily (2024) [imdbid-tt7654321]',
+                            [os.path.join('Season 01', 'Daily S01E20241015.mkv')]))
+    table.save(str(tmp_path / 'table'))
+    (row,) = MediaTable.load(str(tmp_path / 'table')).rows()
+    assert row.episode_from == 20241015
+
+
+def test_load_refuses_other_files(tmp_path):
+    (tmp_path / 'table').write_bytes(b'{"type": "report"}\n')
+    with pytest.raises(ValueError):
+        MediaTable.load(str(tmp_path / 'table'))
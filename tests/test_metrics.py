@@ -0,0 +1,70 @@
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from metrics import Histogram, Metrics, get_metrics, take_worker_metrics
+
+
+def key(name: str, **labels: str) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def test_quantiles_are_bucket_bounds():
+    histogram: Histogram = Histogram((0.1, 1.0))
+    assert histogram.quantile(0.5) is None
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    assert (histogram.quantile(0.5), histogram.quantile(0.75), histogram.quantile(1.0)) == (0.1, 1.0, float('inf'))
+    other: Histogram = Histogram((0.1, 1.0))
+    other.observe(0.5)
+    histogram.merge(other)
+    assert (histogram.counts, histogram.count, histogram.sum) == ([2, 2, 1], 5, 6.1)
+
+
+def test_prometheus_text():
+    metrics: Metrics = Metrics()
+    metrics.count('renames', 2)
+    metrics.count('http_errors', error='Time"out')
+    metrics.observe('stage_seconds', 0.003, stage='probe')
+    lines: list[str] = metrics.to_prometheus('fix_movies', {'up': 1}).splitlines()
+    assert lines[:4] == [
+        '# TYPE fix_movies_http_errors_total counter',
+        'fix_movies_http_errors_total{error="Time\\"out"} 1',
+        '# TYPE fix_movies_renames_total counter',
+        'fix_movies_renames_total 2',
+    ]
+    assert '# TYPE fix_movies_stage_seconds histogram' in lines
+    assert 'fix_movies_stage_seconds_bucket{stage="probe",le="0.0025"} 0' in lines
+    assert 'fix_movies_stage_seconds_bucket{stage="probe",le="0.005"} 1' in lines
+    assert 'fix_movies_stage_seconds_bucket{stage="probe",le="+Inf"} 1' in lines
+    assert 'fix_movies_stage_seconds_count{stage="probe"} 1' in lines
+    assert lines[-2:] == ['# TYPE fix_movies_up gauge', 'fix_movies_up 1']
+
+
+def record_in_worker(n: int) -> Metrics:
+    get_metrics().count('probes', n)
+    get_metrics().observe('probe_seconds', 0.01)
+    return take_worker_metrics()
+
+
+def test_worker_metrics_are_shipped_back_and_merged():
+    assert take_worker_metrics() is None
+    parent: Metrics = Metrics()
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for shipped in pool.map(record_in_worker, [1, 2, 3]):
+            parent.merge(pickle.loads(pickle.dumps(shipped)))
+    # each task carried only what was recorded since the one before
+    assert parent.counters[key('probes')] == 6
+    assert parent.histograms[key('probe_seconds')].count == 3
+
+
+def test_drain_starts_over():
+    metrics: Metrics = Metrics()
+    metrics.count('renames')
+    with metrics.timer('move_seconds'):
+        pass
+    drained: Metrics = metrics.drain()
+    assert drained.counters[key('renames')] == 1 and drained.histograms[key('move_seconds')].count == 1
+    assert not metrics.counters and not metrics.histograms
+    metrics.record_task({'parse': 0.2}, {'omdb_cache_hits': 3})
+    assert metrics.counters[key('omdb_cache_hits')] == 3
+    assert metrics.histograms[key('stage_seconds', stage='parse')].count == 1
@@ -0,0 +1,77 @@
+import pytest
+import movie
+from movie import Movie
+from probe_cache import ProbeCache
+
+
+@pytest.fixture
+def probes(tmp_path, monkeypatch) -> list[list[str]]:
+    """The batches of paths probed; every medium probes as 1080 lines high, OMDb knows every title as Alien."""
+    batches: list[list[str]] = []
+
+    def get_heights(paths: list[str]) -> dict[str, int]:
+        batches.append(sorted(paths))
+        return {i: 1080 for i in paths}
+
+    monkeypatch.setattr(Movie, 'get_heights', staticmethod(get_heights))
+    monkeypatch.setattr(Movie, 'get_omdb_details', staticmethod(lambda imdbid: ('Alien', '1979', imdbid)))
+    monkeypatch.setattr(movie, 'get_probe_cache', lambda cache=ProbeCache(str(tmp_path / 'probe.db')): cache)
+    monkeypatch.setattr(movie, 'suggest_imdbid', lambda *args, **kwargs: None)
+    return batches
+
+
+def folder(root, name: str, *media: str) -> str:
+    (root / name).mkdir()
+    for medium in media:
+        (root / name / medium).write_bytes(b'')
+    return str(root / name)
+
+
+def test_media_are_probed_once_fix_renames(tmp_path, probes):
+    path: str = folder(tmp_path, 'alien [imdbid-tt0078748]', 'alien.mkv', 'alien.cd2.mkv')
+    title: Movie = Movie(path)
+    assert title.needs_probe() and probes == []
+    assert title.fix(dry_run=True)
+    assert probes == [[f'{path}/alien.cd2.mkv', f'{path}/alien.mkv']]
+    assert {new for _, new in title.renames[:2]} == {
+        f'{path}/Alien (1979) - [1080p].mkv', f'{path}/Alien (1979) [Part 2] - [1080p].mkv'}
+    assert title.renames[2] == (path, str(tmp_path / 'Alien (1979) [imdbid-tt0078748]'))
+
+
+def test_probing_up_front_is_not_repeated(tmp_path, probes):
+    title: Movie = Movie(folder(tmp_path, 'alien [imdbid-tt0078748]', 'alien.mkv'), probe=True)
+    assert len(probes) == 1 and not title.needs_probe()
+    title.fix(dry_run=True)
+    assert len(probes) == 1
+
+
+def test_refused_or_compliant_folders_are_never_probed(tmp_path, probes):
+    unknown: Movie = Movie(folder(tmp_path, 'alien', 'alien.mkv'))
+    assert not unknown.needs_probe()
+    assert not unknown.fix(dry_run=True)
+    compliant: Movie = Movie(folder(tmp_path, 'Alien (1979) [imdbid-tt0078748]', 'Alien (1979) - [720p].mkv'))
+    assert not compliant.needs_probe()
+    assert compliant.fix(dry_run=True) and compliant.renames == []
+    assert probes == []
+
+
+def test_resolution_tags_spare_the_probe(tmp_path, probes):
+    path: str = folder(tmp_path, 'alien [imdbid-tt0078748]', 'alien.720p.mkv', 'alien.4K.cd2.mkv')
+    title: Movie = Movie(path)
+    assert not title.needs_probe()
+    title.fix(dry_run=True)
+    assert probes == []
+    assert {new for _, new in title.renames[:2]} == {
+        f'{path}/Alien (1979) - [720p].mkv', f'{path}/Alien (1979) [Part 2] - [2160p].mkv'}
+    assert title.resolution_checks == {'resolution_tags': 2}
+
+
+def test_sampled_tags_are_verified_and_corrected(tmp_path, probes):
+    path: str = folder(tmp_path, 'alien [imdbid-tt0078748]', 'alien.720p.mkv', 'alien.1080p.cd2.mkv')
+    title: Movie = Movie(path, verify_sample=1.0)
+    assert title.needs_probe()
+    title.fix(dry_run=True)
+    assert probes == [[f'{path}/alien.1080p.cd2.mkv', f'{path}/alien.720p.mkv']]
+    assert f'{path}/Alien (1979) - [1080p].mkv' in {new for _, new in title.renames}
+    assert title.resolution_checks == {'resolution_tags': 2, 'resolution_tags_verified': 2, 'resolution_tags_wrong': 1}
+    assert '!!! <alien.720p.mkv> says 720p but the video is 1080p' in title.notes
@@ -0,0 +1,132 @@
+import json
+import time
+import asyncio
+import pytest
+from metrics import get_metrics
+from omdb_client import OmdbClient
+
+
+def record(imdbid: str) -> dict:
+    return {'Title': f'Title {imdbid}', 'Year': '1979', 'imdbID': imdbid, 'Response': 'True'}
+
+
+UNAVAILABLE: tuple[str, bytes] = ('503 Service Unavailable', b'{"Response":"False","Error":"Service unavailable"}')
+NOT_JSON: tuple[str, bytes] = ('200 OK', b'<html>Down for maintenance</html>')
+REDIRECT: tuple[str, bytes] = ('302 Found\r\nLocation: http://127.0.0.1/login', b'')
+
+
+class FakeOmdb:
+    """Answers every request with the record of its imdbid after `delay` seconds, over keep-alive HTTP/1.1;
+    the first `failures` requests get the `failure` (status, body) instead."""
+
+    def __init__(self, delay: float = 0.0, failures: int = 0, failure: tuple[str, bytes] = UNAVAILABLE) -> None:
+        self.delay: float = delay
+        self.failures: int = failures
+        self.failure: tuple[str, bytes] = failure
+        self.targets: list[str] = []
+        self.times: list[float] = []
+        self.connections: int = 0
+        self.active: int = 0
+        self.most_active: int = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        while True:
+            request_line: bytes = await reader.readline()
+            if not request_line:
+                break
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            target: str = request_line.split()[1].decode()
+            self.targets.append(target)
+            self.times.append(time.monotonic())
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+            await asyncio.sleep(self.delay)
+            self.active -= 1
+            if len(self.targets) <= self.failures:
+                (status, body) = self.failure
+            else:
+                (status, body) = ('200 OK', json.dumps(record(target.split('i=')[1].split('&')[0])).encode())
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+        writer.close()
+
+
+def run(omdb: FakeOmdb, lookups, **options) -> tuple[object, OmdbClient]:
+    """lookups(client) run against omdb on a fresh event loop; (its result, the client)."""
+    async def main():
+        server: asyncio.Server = await asyncio.start_server(omdb.handle, '127.0.0.1', 0)
+        port: int = server.sockets[0].getsockname()[1]
+        settings: dict = {'rate': 1000, 'burst': 100, 'timeout': 5, 'retries': 0, **options}
+        client: OmdbClient = OmdbClient(f'http://127.0.0.1:{port}/', 'key', **settings)
+        try:
+            return (await lookups(client), client)
+        finally:
+            client.close()
+            server.close()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_lookups_of_one_title_share_a_request():
+    omdb: FakeOmdb = FakeOmdb(delay=0.05)
+    (results, client) = run(omdb, lambda client: asyncio.gather(
+        *[client.lookup('tt0078748', 'movie') for _ in range(5)], client.lookup('tt0078748', 'series')))
+    assert results == [record('tt0078748')] * 6
+    assert sorted(i.split('type=')[1] for i in omdb.targets) == ['movie', 'series']
+    assert client.coalesced == 4
+
+
+def test_requests_keep_to_the_rate_limit():
+    omdb: FakeOmdb = FakeOmdb()
+    started: float = time.monotonic()
+    run(omdb, lambda client: client.lookup_many([(f'tt{i}', None) for i in range(6)]), rate=20, burst=2)
+    # two at once from the burst, then one every 1/20 s
+    assert time.monotonic() - started >= 0.19
+    assert len(omdb.targets) == 6
+
+
+def test_connections_are_reused_and_capped():
+    omdb: FakeOmdb = FakeOmdb()
+
+    async def one_by_one(client: OmdbClient) -> None:
+        for i in range(5):
+            await client.lookup(f'tt{i}')
+
+    (_, client) = run(omdb, one_by_one)
+    assert (omdb.connections, client._pool.opened, client.requests) == (1, 1, 5)
+    omdb = FakeOmdb(delay=0.02)
+    (results, client) = run(omdb, lambda client: client.lookup_many([(f'tt{i}', None) for i in range(8)]),
+                            concurrency=2)
+    assert results == {(f'tt{i}', None): record(f'tt{i}') for i in range(8)}
+    assert omdb.most_active == 2 and omdb.connections == 2
+
+
+def counter(name: str, **labels: str) -> int:
+    return get_metrics().counters[(name, tuple(sorted(labels.items())))]
+
+
+@pytest.mark.parametrize('failure', [UNAVAILABLE, NOT_JSON, REDIRECT], ids=['503', 'not-json', 'redirect'])
+def test_a_failed_request_is_retried(failure, monkeypatch):
+    monkeypatch.setattr(OmdbClient, 'BACKOFF_SECONDS', 0.001)
+    (retries, errors) = (counter('http_retries'), counter('http_errors', error='RetryableError'))
+    omdb: FakeOmdb = FakeOmdb(failures=1, failure=failure)
+    (result, _) = run(omdb, lambda client: client.lookup('tt0078748', 'series'), retries=2)
+    assert result == record('tt0078748')
+    assert len(omdb.targets) == 2
+    assert all('type=series' in i for i in omdb.targets)
+    assert counter('http_retries') == retries + 1
+    assert counter('http_errors', error='RetryableError') == errors + 1
+
+
+@pytest.mark.parametrize('failure', [UNAVAILABLE, NOT_JSON], ids=['503', 'not-json'])
+def test_gives_up_after_the_last_retry(failure, monkeypatch, capsys):
+    monkeypatch.setattr(OmdbClient, 'BACKOFF_SECONDS', 0.001)
+    gave_up: int = counter('http_gave_up')
+    omdb: FakeOmdb = FakeOmdb(failures=5, failure=failure)
+    (result, _) = run(omdb, lambda client: client.lookup('tt0078748'), retries=1)
+    assert result is None
+    assert len(omdb.targets) == 2
+    assert counter('http_gave_up') == gave_up + 1
+    assert '!!! giving up on OMDb details for "tt0078748" after 2 attempts' in capsys.readouterr().out
@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+from pipeline import START_METHOD, Pipeline, Stage, Failed, THREAD, PROCESS, ASYNC
+
+
+def double(item: int) -> int:
+    return item * 2
+
+
+def pid_of(item: int) -> int:
+    return os.getpid()
+
+
+async def add_one(item: int) -> int:
+    return item + 1
+
+
+def test_items_stream_through_every_kind_of_stage():
+    pipeline: Pipeline = Pipeline([
+        Stage('double', double, THREAD, workers=3),
+        Stage('pid', double, PROCESS, workers=2, accepts=lambda i: i % 4 == 0),
+        Stage('add', add_one, ASYNC, workers=4),
+    ], queue_size=2)
+    results: list[int] = sorted(pipeline.run(range(20)))
+    assert results == sorted((i * 4 if i % 2 == 0 else i * 2) + 1 for i in range(20))
+
+
+def test_process_workers_are_not_forked_from_the_threaded_parent():
+    pipeline: Pipeline = Pipeline([Stage('pid', pid_of, PROCESS, workers=1)])
+    (pid,) = set(pipeline.run(range(3)))
+    assert pid != os.getpid()
+    assert START_METHOD != 'fork'
+
+
+def test_a_failing_item_skips_the_remaining_stages():
+    def fragile(item: int) -> int:
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    results: list = list(Pipeline([Stage('fragile', fragile), Stage('double', double)]).run(range(5)))
+    failed: list[Failed] = [i for i in results if isinstance(i, Failed)]
+    assert sorted(i for i in results if not isinstance(i, Failed)) == [0, 2, 4, 8]
+    assert [(i.item, i.stage) for i in failed] == [(3, 'fragile')]
+
+
+def test_a_consumer_stopping_early_does_not_leave_threads_blocked():
+    def slow(item: int) -> int:
+        time.sleep(0.001)
+        return item
+
+    pipeline: Pipeline = Pipeline([Stage('slow', slow, THREAD, workers=2), Stage('double', double)], queue_size=1)
+    results = pipeline.run(range(1000))
+    assert next(results) is not None
+    closing: threading.Thread = threading.Thread(target=results.close, daemon=True)
+    closing.start()
+    closing.join(10)
+    assert not closing.is_alive()
@@ -0,0 +1,64 @@
+import os
+import pytest
+import rename_journal
+from plan import MKDIR, PlanEntry, PlanWriter, apply_plan, planned_steps, read_plan
+from report import FIXED, SKIPPED
+
+
+@pytest.fixture(autouse=True)
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(rename_journal, '_journal', rename_journal.RenameJournal(str(tmp_path / 'journal')))
+    monkeypatch.setattr(rename_journal, '_journal_pid', os.getpid())
+
+
+def planned(tmp_path, *names: str) -> tuple[str, list[str]]:
+    """A plan renaming each named folder and its medium to the fixed names, and the folders it plans for."""
+    plan: str = str(tmp_path / 'plan.jsonl')
+    writer: PlanWriter = PlanWriter(plan, 'fix_movies', [str(tmp_path / 'lib')])
+    folders: list[str] = []
+    for name in names:
+        folder = tmp_path / 'lib' / name
+        folder.mkdir(parents=True)
+        (folder / f'{name}.mkv').write_bytes(b'x')
+        fixed: str = str(tmp_path / 'lib' / f'{name} (1979) [imdbid-tt0078748]')
+        writer.add(PlanEntry(str(folder), 'movie', 'tt0078748', 1, steps=[[MKDIR, None, str(folder / 'Extras'), None]]
+                             + planned_steps([(str(folder / f'{name}.mkv'), str(folder / f'{name} (1979).mkv')),
+                                              (str(folder), fixed)])))
+        folders.append(str(folder))
+    writer.close()
+    return (plan, folders)
+
+
+def test_plan_round_trip_and_apply(tmp_path):
+    (plan, (folder,)) = planned(tmp_path, 'Alien')
+    (entry,) = read_plan(plan, 'fix_movies')
+    assert (entry.path, entry.imdbid) == (folder, 'tt0078748')
+    assert [i[0] for i in entry.steps] == ['mkdir', 'rename', 'rename']
+    (result,) = apply_plan(plan, 'fix_movies')
+    assert result.status == FIXED
+    assert result.new_path == str(tmp_path / 'lib' / 'Alien (1979) [imdbid-tt0078748]')
+    assert sorted(os.listdir(result.new_path)) == ['Alien (1979).mkv', 'Extras']
+    assert not os.path.exists(folder)
+
+
+def test_changed_sources_are_stale(tmp_path):
+    (plan, (changed, gone, taken)) = planned(tmp_path, 'Changed', 'Gone', 'Taken')
+    with open(os.path.join(changed, 'Changed.mkv'), 'ab') as f:
+        f.write(b'more')
+    os.unlink(os.path.join(gone, 'Gone.mkv'))
+    os.mkdir(str(tmp_path / 'lib' / 'Taken (1979) [imdbid-tt0078748]'))
+    results = list(apply_plan(plan, 'fix_movies'))
+    assert [i.status for i in results] == [SKIPPED] * 3
+    assert [i.reason.split('> ')[-1] for i in results] == ['changed since it was planned', 'is gone', 'already exists']
+    assert sorted(os.listdir(changed)) == ['Changed.mkv']
+    assert os.listdir(taken) == ['Taken.mkv']
+
+
+def test_plans_of_other_tools_are_refused(tmp_path):
+    (plan, _) = planned(tmp_path, 'Alien')
+    with pytest.raises(ValueError):
+        list(read_plan(plan, 'fix_series'))
+    with open(plan, 'w') as f:
+        f.write('{"type": "plan", "version": 0}\n')
+    with pytest.raises(ValueError):
+        list(read_plan(plan, 'fix_movies'))
@@ -0,0 +1,48 @@
+import os
+from probe_cache import ProbeCache
+
+
+def test_heights_follow_the_inode_until_the_file_changes(tmp_path):
+    medium = tmp_path / 'a.mkv'
+    medium.write_bytes(b'x' * 10)
+    cache: ProbeCache = ProbeCache(str(tmp_path / 'probe.db'))
+    assert cache.get(os.stat(medium)) is None
+    cache.put_many([(os.stat(medium), 1080)])
+    assert cache.get(os.stat(medium)) == 1080
+    # a rename keeps the entry
+    os.rename(medium, tmp_path / 'b.mkv')
+    medium = tmp_path / 'b.mkv'
+    assert cache.get(os.stat(medium)) == 1080
+    # a new mtime or size makes it stale
+    st: os.stat_result = os.stat(medium)
+    os.utime(medium, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert cache.get(os.stat(medium)) is None
+    cache.put_many([(os.stat(medium), 720)])
+    with open(medium, 'ab') as f:
+        f.write(b'y')
+    assert cache.get(os.stat(medium)) is None
+    assert cache.counters == {'probe_cache_hits': 2, 'probe_cache_misses': 3, 'probe_cache_stale': 2}
+    cache.close()
+
+
+def test_entries_outlive_the_connection(tmp_path):
+    medium = tmp_path / 'a.mkv'
+    medium.write_bytes(b'x')
+    cache: ProbeCache = ProbeCache(str(tmp_path / 'cache' / 'probe.db'))
+    cache.put_many([(os.stat(medium), 2160)])
+    cache.close()
+    cache = ProbeCache(str(tmp_path / 'cache' / 'probe.db'))
+    assert cache.get(os.stat(medium)) == 2160
+    cache.close()
+
+
+def test_a_different_file_on_the_same_path_is_a_miss(tmp_path):
+    medium = tmp_path / 'a.mkv'
+    medium.write_bytes(b'x')
+    cache: ProbeCache = ProbeCache(str(tmp_path / 'probe.db'))
+    cache.put_many([(os.stat(medium), 1080)])
+    # a new inode is taken before the old one is freed
+    (tmp_path / 'new.mkv').write_bytes(b'x')
+    os.replace(tmp_path / 'new.mkv', medium)
+    assert cache.get(os.stat(medium)) is None
+    cache.close()
@@ -0,0 +1,86 @@
+import os
+import errno
+import shutil
+import threading
+import pytest
+import relocate
+import rename_journal
+from relocate import Progress, relocate_tree
+
+OTHER_DEVICE: str = '/dev/shm'
+
+
+@pytest.fixture(autouse=True)
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(rename_journal, '_journal', rename_journal.RenameJournal(str(tmp_path / 'journal')))
+    monkeypatch.setattr(rename_journal, '_journal_pid', os.getpid())
+
+
+def title(root, name: str = 'Alien (1979)') -> str:
+    folder = root / name
+    (folder / 'Subs').mkdir(parents=True)
+    (folder / 'Alien.mkv').write_bytes(os.urandom(3 << 20))
+    (folder / 'Subs' / 'en.srt').write_bytes(b'1\n')
+    os.symlink('Subs', folder / 'Subtitles')
+    os.symlink('Alien.mkv', folder / 'movie.mkv')
+    return str(folder)
+
+
+def test_same_device_is_one_rename(tmp_path):
+    source: str = title(tmp_path / 'in')
+    (tmp_path / 'out' / 'Alien (1979)').mkdir(parents=True)
+    assert relocate_tree(source, str(tmp_path / 'out' / 'Alien (1979)'), Progress()) == 0
+    assert not os.path.exists(source)
+    assert os.path.islink(tmp_path / 'out' / 'Alien (1979)' / 'Subtitles')
+
+
+def test_same_device_refuses_a_taken_target(tmp_path):
+    source: str = title(tmp_path / 'in')
+    (tmp_path / 'out' / 'Alien (1979)').mkdir(parents=True)
+    (tmp_path / 'out' / 'Alien (1979)' / 'other.mkv').write_bytes(b'x')
+    with pytest.raises(FileExistsError):
+        relocate_tree(source, str(tmp_path / 'out' / 'Alien (1979)'), Progress())
+    assert os.path.exists(os.path.join(source, 'Alien.mkv'))
+    assert os.listdir(tmp_path / 'out' / 'Alien (1979)') == ['other.mkv']
+
+
+@pytest.mark.skipif(not os.path.isdir(OTHER_DEVICE) or os.stat(OTHER_DEVICE).st_dev == os.stat('.').st_dev,
+                    reason=f'needs {OTHER_DEVICE} on another filesystem')
+def test_across_devices_files_are_copied_and_links_moved(tmp_path):
+    source: str = title(tmp_path)
+    with open(os.path.join(source, 'Alien.mkv'), 'rb') as f:
+        content: bytes = f.read()
+    target: str = os.path.join(OTHER_DEVICE, f'relocate-test-{os.getpid()}', 'Alien (1979)')
+    try:
+        assert relocate_tree(source, target, Progress()) == len(content) + 2
+        assert not os.path.exists(source)
+        with open(os.path.join(target, 'Alien.mkv'), 'rb') as f:
+            assert f.read() == content
+        assert os.readlink(os.path.join(target, 'Subtitles')) == 'Subs'
+        assert os.readlink(os.path.join(target, 'movie.mkv')) == 'Alien.mkv'
+        assert os.path.isfile(os.path.join(target, 'Subtitles', 'en.srt'))
+    finally:
+        shutil.rmtree(os.path.dirname(target), ignore_errors=True)
+
+
+def test_the_files_of_a_title_are_copied_concurrently(tmp_path, monkeypatch):
+    for name in ('a.mkv', 'b.mkv'):
+        (tmp_path / 'in' / 'Show').mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'in' / 'Show' / name).write_bytes(b'x')
+    # both copies must be in flight at once to get past the barrier
+    barrier: threading.Barrier = threading.Barrier(2, timeout=5)
+
+    def copy_file(source: str, target: str, progress: Progress) -> int:
+        barrier.wait()
+        os.rename(source, target)
+        return 1
+
+    def check_same_device(source: str, target: str) -> None:
+        raise relocate.CrossDeviceError(errno.EXDEV, 'not on the same device')
+
+    monkeypatch.setattr(relocate, 'check_same_device', check_same_device)
+    monkeypatch.setattr(relocate, 'RELOCATE_STREAMS', 2)
+    monkeypatch.setattr(relocate, 'copy_file', copy_file)
+    assert relocate_tree(str(tmp_path / 'in' / 'Show'), str(tmp_path / 'out' / 'Show'), Progress()) == 2
+    assert sorted(os.listdir(tmp_path / 'out' / 'Show')) == ['a.mkv', 'b.mkv']
+    assert not os.path.exists(tmp_path / 'in' / 'Show')
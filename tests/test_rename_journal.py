@@ -0,0 +1,114 @@
+import os
+import rename_journal
+from rename_journal import RenameJournal
+
+
+def test_execute_then_undo(tmp_path):
+    (tmp_path / 'Old').mkdir()
+    (tmp_path / 'Old' / 'a.mkv').write_bytes(b'x')
+    journal: RenameJournal = RenameJournal(str(tmp_path / 'journal'))
+    journal.tool = 'fix_movies'
+    journal.execute([(str(tmp_path / 'Old' / 'a.mkv'), str(tmp_path / 'Old' / 'b.mkv')),
+                     (str(tmp_path / 'Old'), str(tmp_path / 'New'))])
+    assert os.path.exists(tmp_path / 'New' / 'b.mkv')
+    assert journal.recover() == []
+    (renames, errors) = journal.undo()
+    assert errors == []
+    assert len(renames) == 2
+    assert os.path.exists(tmp_path / 'Old' / 'a.mkv')
+    # the undo is journaled, so a second one has nothing left to reverse
+    assert journal.undo() == ([], [])
+
+
+def test_a_failed_transaction_is_rolled_back(tmp_path):
+    (tmp_path / 'a').write_bytes(b'a')
+    (tmp_path / 'taken').write_bytes(b'b')
+    journal: RenameJournal = RenameJournal(str(tmp_path / 'journal'))
+    try:
+        journal.execute([(str(tmp_path / 'a'), str(tmp_path / 'b')), (str(tmp_path / 'b'), str(tmp_path / 'taken'))])
+    except FileExistsError:
+        pass
+    else:
+        raise AssertionError('renaming onto an existing file succeeded')
+    assert sorted(os.listdir(tmp_path)) == ['a', 'journal', 'journal.runs', 'taken']
+
+
+def test_folders_made_for_a_transaction_go_with_it(tmp_path):
+    show = tmp_path / 'Show'
+    (show / 'Season 02').mkdir(parents=True)
+    for name in ('Show S01E01.mkv', 'Show S02E01.mkv'):
+        (show / name).write_bytes(b'x')
+    journal: RenameJournal = RenameJournal(str(tmp_path / 'journal'))
+    journal.tool = 'fix_series'
+    journal.execute([(str(show / 'Show S01E01.mkv'), str(show / 'Season 01' / 'Show S01E01.mkv')),
+                     (str(show / 'Show S02E01.mkv'), str(show / 'Season 02' / 'Show S02E01.mkv')),
+                     (str(show), str(tmp_path / 'Show (2008)'))],
+                    mkdirs=[str(show / 'Season 01'), str(show / 'Season 02')])
+    assert os.path.exists(tmp_path / 'Show (2008)' / 'Season 01' / 'Show S01E01.mkv')
+    (_, errors) = journal.undo()
+    assert errors == []
+    # the season folder the run made is gone again, the one it found stays
+    assert sorted(os.listdir(show)) == ['Season 02', 'Show S01E01.mkv', 'Show S02E01.mkv']
+    # a transaction that fails takes its folders back too
+    (show / 'Season 02' / 'Show S02E01.mkv').write_bytes(b'y')
+    try:
+        journal.execute([(str(show / 'Show S01E01.mkv'), str(show / 'Season 01' / 'Show S01E01.mkv')),
+                         (str(show / 'Show S02E01.mkv'), str(show / 'Season 02' / 'Show S02E01.mkv'))],
+                        mkdirs=[str(show / 'Season 01'), str(show / 'Season 02')])
+    except FileExistsError:
+        pass
+    else:
+        raise AssertionError('renaming onto an existing file succeeded')
+    assert sorted(os.listdir(show)) == ['Season 02', 'Show S01E01.mkv', 'Show S02E01.mkv']
+
+
+def test_recovery_removes_the_folders_of_a_rolled_back_transaction(tmp_path):
+    (tmp_path / 'Show').mkdir()
+    (tmp_path / 'Show' / 'Show S01E01.mkv').write_bytes(b'x')
+    path: str = str(tmp_path / 'journal')
+    (season, episode) = (str(tmp_path / 'Show' / 'Season 01'), str(tmp_path / 'Show' / 'Show S01E01.mkv'))
+    # a run that died between its renames and its commit, and left no run file
+    RenameJournal(path)._append({'t': 'txn', 'id': 'dead:0', 'run': 'dead', 'tool': 'fix_series', 'host': 'h',
+                                 'pid': 1, 'started': 0, 'renames': [[episode, f'{season}/Show S01E01.mkv']],
+                                 'mkdirs': [season]})
+    os.mkdir(season)
+    os.rename(episode, f'{season}/Show S01E01.mkv')
+    assert RenameJournal(path).recover() == [(f'{season}/Show S01E01.mkv', episode)]
+    assert os.listdir(tmp_path / 'Show') == ['Show S01E01.mkv']
+
+
+def test_recovery_leaves_live_runs_alone_and_rolls_back_dead_ones(tmp_path, live_run):
+    (tmp_path / 'Old').mkdir()
+    path: str = str(tmp_path / 'journal')
+    run = live_run(path, str(tmp_path / 'Old'), str(tmp_path / 'New'))
+    try:
+        assert RenameJournal(path).recover() == []
+        assert os.path.isdir(tmp_path / 'New')
+    finally:
+        run.communicate('\n')
+    assert RenameJournal(path).recover() == [(str(tmp_path / 'New'), str(tmp_path / 'Old'))]
+    assert os.path.isdir(tmp_path / 'Old')
+    assert RenameJournal(path).recover() == []
+    assert os.listdir(tmp_path / 'journal.runs') == []
+
+
+def test_appends_follow_a_rotation_by_another_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(rename_journal, 'JOURNAL_ROTATE_BYTES', 1)
+    path: str = str(tmp_path / 'journal')
+    (tmp_path / 'a').write_bytes(b'a')
+    (first, second) = (RenameJournal(path), RenameJournal(path))
+    first.execute([(str(tmp_path / 'a'), str(tmp_path / 'b'))])
+    second.recover()
+    assert os.path.exists(f'{path}.1')
+    first.execute([(str(tmp_path / 'b'), str(tmp_path / 'c'))])
+    with open(path, 'r', encoding='utf-8') as f:
+        assert str(tmp_path / 'c') in f.read()
+
+
+def test_renamed_paths_are_remembered_for_watch(tmp_path):
+    (tmp_path / 'a').write_bytes(b'a')
+    journal: RenameJournal = RenameJournal(str(tmp_path / 'journal'))
+    journal.execute([(str(tmp_path / 'a'), str(tmp_path / 'b'))])
+    assert journal.renamed_recently(str(tmp_path / 'a'))
+    assert journal.renamed_recently(str(tmp_path / 'b'))
+    assert not journal.renamed_recently(str(tmp_path / 'c'))
@@ -0,0 +1,48 @@
+import json
+from types import SimpleNamespace
+from report import COMPLIANT, FAILED, FIXED, PLANNED, SKIPPED, Report, TaskResult, timing
+
+
+def title(renames: list[tuple[str, str]] = (), skip_reason: str = None) -> SimpleNamespace:
+    return SimpleNamespace(imdbid='tt0078748', renames=list(renames), skip_reason=skip_reason, notes=['+++ note'],
+                           relocation=None)
+
+
+def test_status_of_a_fixed_title():
+    renames: list[tuple[str, str]] = [('/lib/alien/a.mkv', '/lib/alien/Alien.mkv'), ('/lib/alien', '/lib/Alien')]
+    assert TaskResult.of('movie', '/lib/alien', title(renames), True, False).status == FIXED
+    planned: TaskResult = TaskResult.of('movie', '/lib/alien', title(renames), True, True)
+    assert (planned.status, planned.new_path, planned.renames) == (PLANNED, '/lib/Alien', renames)
+    assert TaskResult.of('movie', '/lib/alien', title(renames[:1]), True, False).new_path is None
+    assert TaskResult.of('movie', '/lib/Alien', title(), True, False).status == COMPLIANT
+    skipped: TaskResult = TaskResult.of('movie', '/lib/x', title(skip_reason='no imdbid'), False, False)
+    assert (skipped.status, skipped.reason, skipped.notes) == (SKIPPED, 'no imdbid', ['+++ note'])
+    failed: TaskResult = TaskResult.failed('movie', '/lib/x', PermissionError('denied'))
+    assert (failed.status, failed.error, failed.imdbid) == (FAILED, 'PermissionError: denied', None)
+
+
+def test_timing_adds_up():
+    timings: dict[str, float] = {}
+    for _ in range(2):
+        with timing(timings, 'parse'):
+            pass
+    assert set(timings) == {'parse'} and timings['parse'] >= 0
+
+
+def test_report_streams_results_and_sums_them_up(tmp_path):
+    report: Report = Report(str(tmp_path / 'reports' / 'run.jsonl'), 'fix_movies', False)
+    report.add(TaskResult.of('movie', '/lib/alien', title([('/lib/alien', '/lib/Alien')]), True, False,
+                             {'parse': 0.5}, {'probe_cache_hits': 2}))
+    report.add(TaskResult.of('movie', '/lib/x', title(skip_reason='no imdbid'), False, False, {'parse': 0.25}))
+    report.add(TaskResult.failed('movie', '/lib/y', OSError('gone')))
+    summary: dict = report.close()
+    assert summary['directories'] == 3 and summary['renames'] == 1
+    assert summary['statuses'] == {FIXED: 1, PLANNED: 0, COMPLIANT: 0, SKIPPED: 1, FAILED: 1}
+    assert (summary['reasons'], summary['counters']) == ({'no imdbid': 1}, {'probe_cache_hits': 2})
+    assert summary['stage_seconds'] == {'parse': 0.75}
+    records: list[dict] = [json.loads(i) for i in (tmp_path / 'reports' / 'run.jsonl').read_text().splitlines()]
+    assert [i['type'] for i in records] == ['task'] * 3 + ['summary']
+    assert records[0]['renames'] == [['/lib/alien', '/lib/Alien']] and records[2]['error'] == 'OSError: gone'
+    lines: list[str] = report.format_summary(summary)
+    assert '--- skipped 1x: no imdbid' in lines
+    assert '!!! failed </lib/y>: OSError: gone' in lines
@@ -0,0 +1,19 @@
+import time
+from report import COMPLIANT, FAILED, FIXED, PLANNED, SKIPPED
+from run_stats import RunStats, percentile
+
+
+def test_outcomes_follow_the_report_statuses():
+    stats: RunStats = RunStats()
+    for status in (FIXED, PLANNED, COMPLIANT, SKIPPED, SKIPPED, FAILED):
+        stats.record(time.perf_counter(), status)
+    summary: dict = stats.summary(tool='fix_movies')
+    assert (summary['directories'], summary['ok'], summary['skipped'], summary['failed']) == (6, 3, 2, 1)
+    assert summary['tool'] == 'fix_movies'
+    assert summary['latency_max'] is not None
+
+
+def test_nearest_rank_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3.0, 1.0, 2.0, 4.0], 0.5) == 2.0
+    assert percentile([3.0, 1.0, 2.0, 4.0], 0.99) == 4.0
@@ -0,0 +1,43 @@
+import os
+import scan_manifest
+from scan_manifest import COMPLIANT, NO_IMDBID, PENDING, ScanManifest, verdict_for
+from title_resolver import trigram_path
+
+
+def test_untouched_settled_folders_are_skipped(tmp_path):
+    manifest: ScanManifest = ScanManifest(str(tmp_path / 'manifest.db'), str(tmp_path / 'imdb.idx'))
+    (done, todo) = (tmp_path / 'Alien (1979)', tmp_path / 'Heat')
+    done.mkdir()
+    todo.mkdir()
+    manifest.record(str(done), 1, COMPLIANT)
+    manifest.record(str(todo), 1, PENDING)
+    assert manifest.is_unchanged(str(done)) and not manifest.is_unchanged(str(todo))
+    (done / 'sample.mkv').write_bytes(b'')
+    os.utime(done, ns=(0, os.stat(done).st_mtime_ns + 1000))
+    assert not manifest.is_unchanged(str(done))
+
+
+def test_a_folder_without_imdbid_is_retried_once_an_index_comes_or_changes(tmp_path, monkeypatch):
+    index: str = str(tmp_path / 'imdb.idx')
+    manifest: ScanManifest = ScanManifest(str(tmp_path / 'manifest.db'), index)
+    folder: str = str(tmp_path / 'Some Home Video')
+    os.mkdir(folder)
+    monkeypatch.setattr(scan_manifest, 'get_resolver', lambda: None)
+    assert verdict_for(None, False) == NO_IMDBID
+    manifest.record(folder, 1, NO_IMDBID)
+    assert manifest.is_unchanged(folder)
+    for path in (index, trigram_path(index)):
+        with open(path, 'wb') as f:
+            f.write(b'index')
+    assert not manifest.is_unchanged(folder)
+    manifest.record(folder, 1, NO_IMDBID)
+    assert manifest.is_unchanged(folder)
+    with open(trigram_path(index), 'ab') as f:
+        f.write(b'rebuilt')
+    assert not manifest.is_unchanged(folder)
+
+
+def test_a_folder_the_resolver_could_not_match_is_not_settled(monkeypatch):
+    monkeypatch.setattr(scan_manifest, 'get_resolver', lambda: object())
+    assert verdict_for(None, False) == PENDING
+    assert verdict_for('tt0078748', False) == COMPLIANT
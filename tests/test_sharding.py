@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+from collections import Counter
+from sharding import Leases, LeaseLost, in_shard, parse_shard
+
+REPO: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS: str = os.path.join(REPO, 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+
+from synth_library import generate  # noqa: E402
+
+
+def test_every_title_falls_in_exactly_one_shard():
+    names: list[str] = [f'Movie {i} (2000)' for i in range(200)]
+    shards: list[tuple[int, int]] = [parse_shard(f'{i}/3') for i in range(3)]
+    assert all(sum(in_shard(name, shard) for shard in shards) == 1 for name in names)
+    with pytest.raises(ValueError):
+        parse_shard('3/3')
+
+
+def test_a_held_lease_is_refused_and_an_expired_one_taken_over(tmp_path):
+    (first, second) = (Leases(str(tmp_path), ttl=60), Leases(str(tmp_path), ttl=60))
+    second.owner += '-second'
+    assert first.acquire('/library/Alien (1979)')
+    assert not second.acquire('/elsewhere/Alien (1979)')
+    second.ttl = 0
+    time.sleep(0.01)
+    assert second.acquire('/elsewhere/Alien (1979)')
+    with pytest.raises(LeaseLost):
+        first.check('/library/Alien (1979)')
+    second.check('/elsewhere/Alien (1979)')
+
+
+@pytest.fixture
+def omdb():
+    proc: subprocess.Popen = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, 'fake_omdb.py'), '--latency-ms', '20'],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        yield f'http://127.0.0.1:{proc.stdout.readline().split()[-1]}/'
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def journal_records(path: str) -> list[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(i) for i in f]
+
+
+def test_two_processes_share_one_tree(tmp_path, omdb, live_run):
+    """Started while other runs are renaming, neither rolls back their renames, nor renames a title twice."""
+    generate(str(tmp_path), movies=40, messiness=0.8, size=64 << 10)
+    cache: str = str(tmp_path / 'cache')
+    env: dict = dict(os.environ, OMDB_URL=omdb, OMDB_APIKEY='test', OMDB_RATE='1000', OMDB_BURST='1000',
+                     EXIFTOOL=os.path.join(BENCHMARKS, 'stub_exiftool.py'), FIX_MOVIES_CACHE=cache,
+                     IMDB_INDEX=str(tmp_path / 'no.idx'))
+    journal: str = os.path.join(cache, 'renames.journal')
+    # a third run, in the middle of a transaction for as long as the two others run
+    (tmp_path / 'a').write_bytes(b'a')
+    live = live_run(journal, str(tmp_path / 'a'), str(tmp_path / 'b'))
+
+    def start(name: str) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, os.path.join(REPO, 'fix_movies.py'), '--basedir', str(tmp_path / 'movies'),
+             '--leases', str(tmp_path / 'leases'), '--report', str(tmp_path / f'{name}.jsonl'), '--workers', '2'],
+            cwd=REPO, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+
+    first: subprocess.Popen = start('first')
+    deadline: float = time.monotonic() + 30
+    while not (os.path.exists(journal) and any(i['t'] == 'txn' for i in journal_records(journal))):
+        assert time.monotonic() < deadline and first.poll() is None, 'the first run renamed nothing'
+        time.sleep(0.005)
+    second: subprocess.Popen = start('second')
+    outputs: list[str] = [i.communicate(timeout=120)[0] for i in (first, second)]
+    assert [first.returncode, second.returncode] == [0, 0], outputs
+    assert not any('rolled back' in i for i in outputs)
+    assert os.path.exists(tmp_path / 'b')
+
+    records: list[dict] = journal_records(journal)
+    assert not [i for i in records if i['t'] in ('recovered', 'abort')]
+    txns: list[dict] = [i for i in records if i['t'] == 'txn' and i['renames'][0][0] != str(tmp_path / 'a')]
+    assert {i['id'] for i in records if i['t'] == 'commit'} == {i['id'] for i in txns}
+    sources: Counter = Counter(source for txn in txns for source, _ in txn['renames'])
+    assert sources and max(sources.values()) == 1
+
+    fixed: Counter = Counter()
+    for name in ('first', 'second'):
+        for task in (i for i in journal_records(str(tmp_path / f'{name}.jsonl')) if i.get('type') == 'task'):
+            assert task['status'] != 'failed', task
+            if task['status'] == 'fixed':
+                fixed[task['path']] += 1
+    assert fixed and max(fixed.values()) == 1
+    assert len(fixed) == len(txns)
+    live.communicate('\n')
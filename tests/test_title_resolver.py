@@ -0,0 +1,64 @@
+import pytest
+from imdb_index import ImdbIndex, build_index
+from title_resolver import TitleResolver, build_trigrams, normalize
+
+BASICS: list[tuple[str, str, str, str, str]] = [
+    ('tt0133093', 'movie', 'The Matrix', '1999', r'\N'),
+    ('tt0087182', 'movie', 'Dune', '1984', r'\N'),
+    ('tt1160419', 'movie', 'Dune', '2021', r'\N'),
+    ('tt0903747', 'tvSeries', 'Breaking Bad', '2008', '2013'),
+    ('tt0211915', 'movie', 'Amélie', '2001', r'\N'),
+    ('tt0959621', 'tvEpisode', 'Pilot', '2008', r'\N'),
+]
+
+
+@pytest.fixture(scope='module')
+def resolver(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('imdb')
+    dump = folder / 'title.basics.tsv'
+    dump.write_text('tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\n'
+                    + ''.join(f'{i}\t{kind}\t{title}\t{title}\t0\t{start}\t{end}\n'
+                              for i, kind, title, start, end in BASICS), encoding='utf-8')
+    build_index(str(dump), str(folder / 'index'))
+    index: ImdbIndex = ImdbIndex(str(folder / 'index'))
+    build_trigrams(index)
+    resolver: TitleResolver = TitleResolver(index)
+    yield resolver
+    resolver.close()
+
+
+def resolved(resolver: TitleResolver, names: list[str], type: str = None, **kwargs) -> str | None:
+    (chosen, _) = resolver.resolve(names, type, **kwargs)
+    return chosen.imdbid if chosen else None
+
+
+def test_normalize():
+    assert normalize('Amélie & Co’s.Bistro') == 'amelie and cos bistro'
+
+
+def test_exact_titles_resolve(resolver):
+    assert resolved(resolver, ['The.Matrix.1999.1080p.BluRay']) == 'tt0133093'
+    assert resolved(resolver, ['Amelie (2001)']) == 'tt0211915'
+    assert resolved(resolver, ['Breaking.Bad.S01.720p'], 'series') == 'tt0903747'
+
+
+def test_year_tells_remakes_apart(resolver):
+    assert resolved(resolver, ['Dune.2021.2160p']) == 'tt1160419'
+    (chosen, candidates) = resolver.resolve(['Dune 1080p'])
+    assert chosen is None
+    assert sorted(i.imdbid for i in candidates) == ['tt0087182', 'tt1160419']
+
+
+def test_scores_below_the_threshold_are_only_candidates(resolver):
+    (chosen, candidates) = resolver.resolve(['The Matrx 1999'])
+    assert chosen is None and [i.imdbid for i in candidates] == ['tt0133093']
+    assert 0.7 < candidates[0].score < 0.9
+    assert resolved(resolver, ['The Matrx 1999'], threshold=0.7) == 'tt0133093'
+    # the type weighs in: a series is not taken for a movie
+    assert resolved(resolver, ['Breaking.Bad.S01.720p'], 'movie') is None
+
+
+def test_media_names_are_tried_after_the_folder(resolver):
+    assert resolved(resolver, ['Some Folder', 'The.Matrix.1999.mkv']) == 'tt0133093'
+    # episodes are left out of the index unless asked for
+    assert resolver.search('Pilot', '2008') == []
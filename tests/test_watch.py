@@ -0,0 +1,63 @@
+import os
+import time
+import pytest
+import watch
+from watch import Watcher
+
+pytestmark = pytest.mark.skipif(watch._libc is None, reason='needs Linux inotify')
+
+
+def wait_for(condition, seconds: float = 5.0) -> bool:
+    deadline: float = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_a_settled_title_is_handed_out(tmp_path):
+    (tmp_path / 'Alien (1979)').mkdir()
+    watcher: Watcher = Watcher([str(tmp_path)], settle=0.2)
+    try:
+        (tmp_path / 'Alien (1979)' / 'Alien.mkv').write_bytes(b'x')
+        assert next(watcher.settled()) == str(tmp_path / 'Alien (1979)')
+    finally:
+        watcher.close()
+
+
+def test_events_are_read_before_settled_is_called(tmp_path):
+    watcher: Watcher = Watcher([str(tmp_path)], settle=0.2)
+    try:
+        (tmp_path / 'Heat (1995)').mkdir()
+        # taken in by the drain thread while a catch-up pass would run
+        assert wait_for(lambda: str(tmp_path / 'Heat (1995)') in watcher._pending)
+    finally:
+        watcher.close()
+
+
+def test_the_processs_own_renames_are_ignored(tmp_path):
+    (tmp_path / 'Alien (1979)').mkdir()
+    (tmp_path / 'Alien (1979)' / 'a.mkv').write_bytes(b'x')
+    (tmp_path / 'Heat (1995)').mkdir()
+    (tmp_path / 'Heat (1995)' / 'a.mkv').write_bytes(b'x')
+    own: set[str] = {str(tmp_path / 'Alien (1979)' / i) for i in ('a.mkv', 'b.mkv')}
+    watcher: Watcher = Watcher([str(tmp_path)], settle=0.2, ignore=own.__contains__)
+    try:
+        os.rename(tmp_path / 'Alien (1979)' / 'a.mkv', tmp_path / 'Alien (1979)' / 'b.mkv')
+        os.rename(tmp_path / 'Heat (1995)' / 'a.mkv', tmp_path / 'Heat (1995)' / 'b.mkv')
+        assert wait_for(lambda: str(tmp_path / 'Heat (1995)') in watcher._pending)
+        assert str(tmp_path / 'Alien (1979)') not in watcher._pending
+    finally:
+        watcher.close()
+
+
+def test_an_overflow_rescans_for_what_changed(tmp_path):
+    (tmp_path / 'Alien (1979)').mkdir()
+    watcher: Watcher = Watcher([str(tmp_path)], settle=0.2)
+    try:
+        watcher._read_at = time.time() - 5
+        watcher._event(-1, watch.IN_Q_OVERFLOW, '')
+        assert str(tmp_path / 'Alien (1979)') in watcher._pending
+    finally:
+        watcher.close()
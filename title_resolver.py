@@ -0,0 +1,262 @@
+"""Fuzzy folder name -> imdbid resolution against a trigram index of the offline IMDb catalog.
+
+    python title_resolver.py --build                 # after importing imdb_index
+    python title_resolver.py "The.Matrix.1999.1080p.BluRay" [--type movie]
+
+The trigram file sits next to the IMDb index and points into it by position:
+
+    header    8s magic, uint32 byte-order mark, uint32 title count, uint64 index size
+    offsets   (TRIGRAMS + 1) x uint32, where each trigram's postings start
+    postings  uint32 title positions, ascending within a trigram
+
+Titles and queries are folded to lowercase ascii letters, digits and single
+spaces, so a trigram is a number below 37**3 and its postings are found by
+direct addressing. A query counts hits from its rarest trigrams first, up to a
+posting budget, then scores the best-covered titles by trigram Dice similarity
+weighted by year and type agreement.
+"""
+import os
+import re
+import sys
+import mmap
+import array
+import struct
+import argparse
+import unicodedata
+from itertools import compress
+from collections import Counter
+from typing import Callable
+from dataclasses import dataclass
+from classifier import find_title_year
+from imdb_index import ImdbIndex, get_index, omdb_type
+from OSAgnostics import IMDB_INDEX, RESOLVE_THRESHOLD, RESOLVE_MARGIN
+
+MAGIC: bytes = b'TRIGRAM1'
+BYTE_ORDER_MARK: int = 0x01020304
+HEADER: struct.Struct = struct.Struct('=8sIIQ')
+ALPHABET: str = ' abcdefghijklmnopqrstuvwxyz0123456789'
+SYMBOLS: dict[str, int] = {c: i for i, c in enumerate(ALPHABET)}
+TRIGRAMS: int = len(ALPHABET) ** 3
+# postings read per query before scoring; the rarest trigrams are read first, at least MIN_LISTS of them
+POSTING_BUDGET: int = 2000
+MIN_LISTS: int = 3
+CANDIDATES: int = 32
+YEAR_WEIGHTS: dict[int, float] = {0: 1.0, 1: 0.9}
+YEAR_MISMATCH: float = 0.6
+# an exact title without a year to confirm it still clears the default threshold, if no other title is as close
+YEAR_UNKNOWN: float = 0.92
+TYPE_MISMATCH: float = 0.8
+_FOLD: dict[int, str] = {ord('&'): ' and ', ord("'"): None, ord('’'): None}
+NON_WORD: re.Pattern = re.compile(r'[^a-z0-9]+')
+
+
+def trigram_path(index_path: str = IMDB_INDEX) -> str:
+    return f'{index_path}.trigrams'
+
+
+def normalize(text: str) -> str:
+    """Lowercase ascii words of text: accents stripped, apostrophes dropped, `&` spelled out."""
+    text = text.translate(_FOLD)
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+    return NON_WORD.sub(' ', text.lower()).strip()
+
+
+def trigrams(text: str) -> set[int]:
+    """Trigram codes of an already normalized text, padded with a space on each side."""
+    padded: str = f' {text} '
+    codes: list[int] = [SYMBOLS[c] for c in padded]
+
+    return {codes[i] * 1369 + codes[i + 1] * 37 + codes[i + 2] for i in range(len(codes) - 2)}
+
+
+@dataclass
+class Candidate:
+    imdbid: str
+    title: str
+    year: int
+    type: str
+    score: float
+
+
+def build_trigrams(index: ImdbIndex, output: str = None) -> int:
+    """Write the trigram file for index; returns the number of postings."""
+    output = output or trigram_path(index.path)
+    # two passes over the titles (count, then fill) instead of holding every title's trigrams
+    counts: array.array = array.array('I', bytes(4 * (TRIGRAMS + 1)))
+    for position in range(index.count):
+        for code in trigrams(normalize(index.entry(position)[1])):
+            counts[code + 1] += 1
+    for code in range(TRIGRAMS):
+        counts[code + 1] += counts[code]
+    postings: array.array = array.array('I', bytes(4 * counts[TRIGRAMS]))
+    cursor: array.array = array.array('I', counts)
+    for position in range(index.count):
+        for code in trigrams(normalize(index.entry(position)[1])):
+            postings[cursor[code]] = position
+            cursor[code] += 1
+
+    partial: str = f'{output}.{os.getpid()}.tmp'
+    with open(partial, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, index.count, os.path.getsize(index.path)))
+        f.write(counts.tobytes())
+        f.write(postings.tobytes())
+    os.replace(partial, output)
+
+    return len(postings)
+
+
+class TitleResolver:
+    """Ranks catalog titles against messy folder names; read-only and safe to share between threads."""
+
+    def __init__(self, index: ImdbIndex, path: str = None) -> None:
+        self._index: ImdbIndex = index
+        path = path or trigram_path(index.path)
+        with open(path, 'rb') as f:
+            self._mm: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, mark, count, size) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or mark != BYTE_ORDER_MARK or count != index.count or size != os.path.getsize(index.path):
+            self._mm.close()
+            raise ValueError(f'{path} does not match {index.path}; run title_resolver.py --build')
+        offsets_at: int = HEADER.size
+        postings_at: int = offsets_at + 4 * (TRIGRAMS + 1)
+        self._offsets: memoryview = memoryview(self._mm)[offsets_at:postings_at].cast('I')
+        self._postings: memoryview = memoryview(self._mm)[postings_at:].cast('I')
+
+    def _postings_of(self, code: int) -> memoryview:
+        return self._postings[self._offsets[code]:self._offsets[code + 1]]
+
+    def search(self, title: str, year: str = None, type: str = None, limit: int = 5) -> list[Candidate]:
+        """Catalog titles most like `title`, best first, scored 0..1."""
+        text: str = normalize(title)
+        if not text:
+            return []
+        query: set[int] = trigrams(text)
+        lists: list[memoryview] = sorted((self._postings_of(i) for i in query), key=len)
+        hits: Counter = Counter()
+        read: int = 0
+        for seen, postings in enumerate(lists):
+            if seen >= MIN_LISTS and read + len(postings) > POSTING_BUDGET:
+                break
+            hits.update(postings)
+            read += len(postings)
+
+        if not hits:
+            return []
+        # titles covering at least half as many query trigrams as the best one; cheaper than most_common
+        floor: int = (max(hits.values()) + 1) // 2
+        shortlist: list[int] = list(compress(hits.keys(), map(floor.__le__, hits.values())))
+        if len(shortlist) > CANDIDATES:
+            shortlist = sorted(shortlist, key=hits.__getitem__, reverse=True)[:CANDIDATES]
+
+        candidates: list[Candidate] = []
+        for position in shortlist:
+            (imdbid, name, start, end, title_type) = self._index.entry(position)
+            grams: set[int] = trigrams(normalize(name))
+            score: float = 2 * len(query & grams) / (len(query) + len(grams))
+            if year and start:
+                score *= YEAR_WEIGHTS.get(abs(int(year) - start), YEAR_MISMATCH)
+            elif year or start:
+                score *= YEAR_UNKNOWN
+            if type and omdb_type(title_type) != type:
+                score *= TYPE_MISMATCH
+            candidates.append(Candidate(imdbid, name, start, omdb_type(title_type), round(score, 4)))
+        candidates.sort(key=lambda i: -i.score)
+
+        return candidates[:limit]
+
+    def resolve(self, names: list[str], type: str = None,
+                threshold: float = RESOLVE_THRESHOLD) -> tuple[Candidate | None, list[Candidate]]:
+        """(the candidate to apply or None, ranked candidates of the name it came from).
+
+        names are tried in order, typically the folder name then its media files,
+        until one yields a candidate to apply. A candidate is applied only if it
+        scores at least threshold and beats the runner-up by RESOLVE_MARGIN, so
+        remakes sharing a title are left alone. Without one, the candidates of
+        the first name that had any are returned.
+        """
+        shown: list[Candidate] = []
+        for name in names:
+            (title, year) = find_title_year(name)
+            candidates: list[Candidate] = self.search(title, year, type)
+            if not candidates:
+                continue
+            best: Candidate = candidates[0]
+            clear: bool = len(candidates) == 1 or best.score - candidates[1].score >= RESOLVE_MARGIN
+            if best.score >= threshold and clear:
+                return (best, candidates)
+            shown = shown or candidates
+
+        return (None, shown)
+
+    def close(self) -> None:
+        self._offsets.release()
+        self._postings.release()
+        self._mm.close()
+
+
+def suggest_imdbid(names: list[str], type: str = None, threshold: float = RESOLVE_THRESHOLD,
+                   note: Callable[[str], None] = print) -> str | None:
+    """imdbid for a folder that has none, from its name and then its media file names, or None.
+
+    Passes the match it applies, or the candidates a human could pick from, to note.
+    """
+    resolver: TitleResolver = get_resolver()
+    if not resolver:
+        return None
+    (chosen, candidates) = resolver.resolve(names, type, threshold)
+    if chosen:
+        note(f'+++ matched <{names[0]}> to {chosen.imdbid} {chosen.title} ({chosen.year}), score {chosen.score:.2f}')
+        return chosen.imdbid
+    for candidate in candidates:
+        note(f'??? candidate {candidate.imdbid} {candidate.title} ({candidate.year}), score {candidate.score:.2f}')
+
+    return None
+
+
+_resolver: TitleResolver = None
+_resolver_pid: int = None
+
+
+def get_resolver() -> TitleResolver | None:
+    """This process's resolver, or None without an IMDb index and its trigram file."""
+    global _resolver, _resolver_pid
+    if _resolver_pid != os.getpid():
+        _resolver_pid = os.getpid()
+        index: ImdbIndex = get_index()
+        try:
+            _resolver = TitleResolver(index) if index and os.path.exists(trigram_path(index.path)) else None
+        except (OSError, ValueError) as ex:
+            print(f'!!! ignoring the title resolver: {str(ex)}')
+            _resolver = None
+
+    return _resolver
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name", nargs='*', help="folder or file names to resolve")
+    parser.add_argument("--build", action="store_true", help="(re)build the trigram file from the IMDb index")
+    parser.add_argument("--type", dest="type", default=None, choices=['movie', 'series'])
+    parser.add_argument("--threshold", type=float, default=RESOLVE_THRESHOLD)
+    args = parser.parse_args()
+    if args.build:
+        index: ImdbIndex = get_index()
+        if not index:
+            print(f'!!! no IMDb index at {IMDB_INDEX}; run imdb_index.py first')
+            return 1
+        print(f'=== {build_trigrams(index)} postings written to {trigram_path(index.path)}')
+    resolver: TitleResolver = get_resolver() if args.name else None
+    for name in args.name:
+        if not resolver:
+            print('!!! no trigram index; run title_resolver.py --build')
+            return 1
+        (chosen, candidates) = resolver.resolve([name], args.type, args.threshold)
+        print(f'??? {name} -> {chosen.imdbid if chosen else "(ambiguous)"}')
+        for candidate in candidates:
+            print(f'    {candidate.score:.3f} {candidate.imdbid} {candidate.title} ({candidate.year}) {candidate.type}')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""--watch: fixes titles as they land, from Linux inotify events, once their folder has settled.
+
+Every folder under the basedirs is watched, down to --depth and TITLE_LEVELS
+into each title (season folders, subtitles). An event marks the title it falls
+under as pending, and a pending title is handed out once nothing under it has
+changed for WATCH_SETTLE seconds, so a download or copy still in progress is
+left alone. Between events the process sleeps in poll(), its caches, OMDb
+connections and probe daemons kept warm for the next title.
+
+Events are read from a thread while the catch-up pass runs, so the kernel's
+queue does not overflow on a big library; if it overflows anyway, the
+basedirs are rescanned for what changed. Events on paths the run's own
+rename journal just renamed are ignored, so a fixed title is not fixed again.
+"""
+import os
+import re
+import math
+import sys
+import time
+import errno
+import ctypes
+import select
+import struct
+import threading
+from typing import Callable, Iterator
+from OSAgnostics import WATCH_SETTLE
+from discovery import is_title
+from metrics import Metrics, get_metrics
+
+IN_MODIFY: int = 0x00000002
+IN_ATTRIB: int = 0x00000004
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_FROM: int = 0x00000040
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_DELETE: int = 0x00000200
+IN_Q_OVERFLOW: int = 0x00004000
+IN_IGNORED: int = 0x00008000
+IN_ONLYDIR: int = 0x01000000
+IN_DONT_FOLLOW: int = 0x02000000
+IN_ISDIR: int = 0x40000000
+WATCH_MASK: int = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                   | IN_ONLYDIR | IN_DONT_FOLLOW)
+# struct inotify_event: wd, mask, cookie, len, then len bytes of NUL-padded name
+EVENT: struct.Struct = struct.Struct('iIII')
+READ_BYTES: int = 64 << 10
+# folder levels watched inside a title: season folders and the extras or subtitles in them
+TITLE_LEVELS: int = 2
+
+
+def _load_inotify():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_inotify()
+
+
+class Watcher:
+    def __init__(self, roots: list[str], depth: int = 1, filter: re.Pattern = None, nested: bool = False,
+                 settle: float = WATCH_SETTLE, ignore: Callable[[str], bool] = None) -> None:
+        """Watches roots at once, so nothing landing while a catch-up pass runs is missed.
+
+        ignore(path) is true for the paths this process changed itself.
+        """
+        if _libc is None:
+            raise OSError(errno.ENOSYS, '--watch needs Linux inotify')
+        self._fd: int = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            code: int = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self._roots: list[str] = [os.path.abspath(i) for i in roots]
+        self._depth: int = depth
+        self._filter: re.Pattern = filter
+        self._nested: bool = nested
+        self._settle: float = settle
+        self._paths: dict[int, str] = {}
+        # title folder (as deep as --depth allows) => monotonic time of its last event
+        self._pending: dict[str, float] = {}
+        self._read_at: float = time.time()
+        self._full: bool = False
+        self._ignore: Callable[[str], bool] = ignore
+        self._metrics: Metrics = get_metrics()
+        for root in self._roots:
+            self._watch_tree(root)
+        self._draining: threading.Event = threading.Event()
+        self._drainer: threading.Thread = threading.Thread(target=self._drain, name='watch-drain', daemon=True)
+        self._draining.set()
+        self._drainer.start()
+
+    def _drain(self) -> None:
+        """Takes in events until settled() is first called, while the catch-up pass runs."""
+        while self._draining.is_set():
+            self._read(0.5)
+
+    def _root_of(self, path: str) -> str | None:
+        for root in self._roots:
+            if path == root or path.startswith(root + os.sep):
+                return root
+        return None
+
+    def _add_watch(self, folder: str) -> None:
+        wd: int = _libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd >= 0:
+            self._paths[wd] = folder
+            return
+        code: int = ctypes.get_errno()
+        if code == errno.ENOSPC:
+            if not self._full:
+                print(f'!!! out of inotify watches at <{folder}>: raise fs.inotify.max_user_watches')
+            self._full = True
+        elif code not in (errno.ENOENT, errno.ENOTDIR):
+            print(f'!!! cannot watch <{folder}>: {os.strerror(code)}')
+
+    def _watch_tree(self, top: str, since: float = None) -> None:
+        """Watches top and the folders in reach below it; with since, marks the titles changed after it."""
+        root: str = self._root_of(top)
+        stack: list[str] = [top]
+        while stack:
+            folder: str = stack.pop()
+            self._add_watch(folder)
+            level: int = 0 if folder == root else os.path.relpath(folder, root).count(os.sep) + 1
+            try:
+                if since is not None and os.stat(folder).st_mtime >= since:
+                    self._mark(folder)
+                if level >= self._depth + TITLE_LEVELS:
+                    continue
+                with os.scandir(folder) as entries:
+                    stack.extend(i.path for i in entries
+                                 if not i.name.startswith('.') and i.is_dir(follow_symlinks=False))
+            except OSError:
+                # gone again before it could be walked
+                continue
+
+    def _unwatch_tree(self, top: str) -> None:
+        for wd, folder in list(self._paths.items()):
+            if folder == top or folder.startswith(top + os.sep):
+                _libc.inotify_rm_watch(self._fd, wd)
+                del self._paths[wd]
+
+    def _mark(self, path: str) -> None:
+        root: str = self._root_of(path)
+        if root is None or path == root:
+            return
+        parts: list[str] = os.path.relpath(path, root).split(os.sep)
+        if parts[0].startswith('.'):
+            return
+        self._pending[os.path.join(root, *parts[:self._depth])] = time.monotonic()
+
+    def _title_of(self, key: str) -> str | None:
+        """The title folder a pending key falls under, resolved now that it has settled; None if gone or filtered."""
+        root: str = self._root_of(key)
+        parts: list[str] = os.path.relpath(key, root).split(os.sep)
+        for level in range(1, len(parts) + 1):
+            candidate: str = os.path.join(root, *parts[:level])
+            if not os.path.isdir(candidate):
+                return None
+            try:
+                if level == len(parts) or is_title(candidate, self._nested):
+                    break
+            except OSError:
+                break
+        if self._filter and not self._filter.match(os.path.basename(candidate)):
+            return None
+        return candidate
+
+    def _read(self, timeout: float | None) -> None:
+        """Waits up to timeout seconds (None: for ever) for events and takes in all that are queued."""
+        poller: select.poll = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        if not poller.poll(None if timeout is None else max(0, math.ceil(timeout * 1000))):
+            return
+        data: bytes = b''
+        while True:
+            try:
+                chunk: bytes = os.read(self._fd, READ_BYTES)
+            except BlockingIOError:
+                break
+            data += chunk
+        (offset, events) = (0, 0)
+        while offset < len(data):
+            (wd, mask, _, size) = EVENT.unpack_from(data, offset)
+            name: str = os.fsdecode(data[offset + EVENT.size:offset + EVENT.size + size].rstrip(b'\0'))
+            offset += EVENT.size + size
+            self._event(wd, mask, name)
+            events += 1
+        self._metrics.count('watch_events', events)
+        self._read_at = time.time()
+
+    def _event(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # events were lost: rewatch everything and fix whatever changed since the last read
+            print('!!! inotify queue overflowed; rescanning the basedirs')
+            self._metrics.count('watch_overflows')
+            for root in self._roots:
+                self._watch_tree(root, since=self._read_at - 1)
+            return
+        if mask & IN_IGNORED:
+            self._paths.pop(wd, None)
+            return
+        folder: str = self._paths.get(wd)
+        if folder is None:
+            return
+        path: str = os.path.join(folder, name) if name else folder
+        if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+            self._unwatch_tree(path)
+        elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            self._watch_tree(path)
+        if self._ignore and self._ignore(path):
+            # watched all the same, but the change is this process's own rename
+            self._metrics.count('watch_events_ignored')
+            return
+        self._mark(path)
+
+    def settled(self) -> Iterator[str]:
+        """Title folders whose changes have settled, for ever; sleeps while nothing is pending."""
+        self._draining.clear()
+        self._drainer.join()
+        while True:
+            now: float = time.monotonic()
+            ready: list[str] = [k for k, at in self._pending.items() if now - at >= self._settle]
+            for key in ready:
+                del self._pending[key]
+            titles: list[str] = list(dict.fromkeys(i for i in map(self._title_of, ready) if i))
+            yield from titles
+            if titles:
+                continue
+            wait: float | None = min((at + self._settle - now for at in self._pending.values()), default=None)
+            self._read(wait)
+
+    def forget(self, path: str) -> None:
+        """Drops the events queued so far under path: a fixed title's own renames need no second look."""
+        self._read(0)
+        for key in [k for k in self._pending if k == path or k.startswith(path + os.sep)]:
+            del self._pending[key]
+
+    def close(self) -> None:
+        self._draining.clear()
+        self._drainer.join()
+        os.close(self._fd)